@@ -0,0 +1,650 @@
+"""
+Offline stand-ins for the Azure SDK clients used by function_app, backed by a synthetic tenant.
+
+The fakes expose just the operations the analyzers call (list pagers, query.usage, next_link
+POSTs through `_client.send_request`, budgets, Advisor recommendations) and route every request
+through a FakeTransport that counts calls, injects latency and answers a share of them with 429.
+Management list calls retry throttled pages in place, as the SDK pipeline's retry policy would;
+Cost Management 429s are raised to the caller so the app's own rate limiter handles them.
+
+Resources are generated deterministically per subscription while they are listed, so a tenant
+of 500 subscriptions and a million resources per type is never held in memory at once.
+"""
+import json
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from itertools import islice
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from azure.core.exceptions import HttpResponseError
+
+# Module attributes of function_app and the shared_code modules replaced while the fakes are installed
+PATCHED_CLIENTS = ('SubscriptionClient', 'ComputeManagementClient', 'NetworkManagementClient',
+                   'AdvisorManagementClient', 'ResourceManagementClient', 'CostManagementClient')
+
+LOCATIONS = ('eastus', 'westeurope', 'northeurope', 'westus2', 'southeastasia')
+RESOURCE_GROUPS_PER_SUBSCRIPTION = 8
+
+# (disk SKU, daily cost range) - sizes are drawn from DISK_SIZES
+DISK_SKUS = (('Premium_LRS', (0.6, 5.0)), ('StandardSSD_LRS', (0.3, 2.5)), ('Standard_LRS', (0.05, 1.2)))
+DISK_SIZES = (32, 64, 128, 256, 512, 1024)
+VM_SIZES = ('Standard_D2s_v5', 'Standard_D4s_v5', 'Standard_E8s_v5', 'Standard_B2ms')
+
+# Cost Management dimension values per synthetic resource type
+SERVICE_NAMES = {
+    'disks': 'Storage',
+    'snapshots': 'Storage',
+    'public_ips': 'Virtual Network',
+    'nics': 'Virtual Network',
+    'vms': 'Virtual Machines'
+}
+ARM_TYPES = {
+    'disks': 'microsoft.compute/disks',
+    'snapshots': 'microsoft.compute/snapshots',
+    'public_ips': 'microsoft.network/publicipaddresses',
+    'nics': 'microsoft.network/networkinterfaces',
+    'vms': 'microsoft.compute/virtualmachines'
+}
+
+COST_ROW_LIMIT = 5000
+COST_API_VERSION = '2023-03-01'
+
+
+class _Disk:
+    __slots__ = ('id', 'name', 'location', 'disk_size_gb', 'sku', 'tags', 'disk_state')
+
+
+class _Snapshot:
+    __slots__ = ('id', 'name', 'location', 'disk_size_gb', 'sku', 'tags', 'time_created')
+
+
+class _PublicIp:
+    __slots__ = ('id', 'name', 'location', 'sku', 'tags', 'etag', 'ip_configuration', 'nat_gateway',
+                 'load_balancer_frontend_ip_configurations', 'public_ip_allocation_method')
+
+
+class _Nic:
+    __slots__ = ('id', 'name', 'location', 'tags', 'etag', 'virtual_machine')
+
+
+class _Vm:
+    __slots__ = ('id', 'name', 'location', 'tags', 'license_type', 'storage_profile', 'hardware_profile')
+
+
+def _sku(name: str) -> SimpleNamespace:
+    return SimpleNamespace(name=name)
+
+
+def _storage_profile(os_type: str, publisher: str, offer: str, sku: str) -> SimpleNamespace:
+    return SimpleNamespace(
+        os_disk=SimpleNamespace(os_type=os_type),
+        image_reference=SimpleNamespace(publisher=publisher, offer=offer, sku=sku)
+    )
+
+
+# Shared nested objects keep a million synthetic VMs cheap
+AHB_ELIGIBLE_PROFILES = (
+    _storage_profile('Windows', 'MicrosoftWindowsServer', 'WindowsServer', '2022-datacenter'),
+    _storage_profile('Linux', 'RedHat', 'RHEL', '9-lvm-gen2'),
+    _storage_profile('Linux', 'SUSE', 'sles-15-sp5', 'gen2')
+)
+OTHER_PROFILES = (
+    _storage_profile('Linux', 'Canonical', 'ubuntu-24_04-lts', 'server'),
+    _storage_profile('Windows', 'MicrosoftWindowsDesktop', 'windows-11', 'win11-23h2-pro')
+)
+HARDWARE_PROFILES = tuple(SimpleNamespace(vm_size=size) for size in VM_SIZES)
+DISK_SKU_OBJECTS = tuple(_sku(name) for name, _ in DISK_SKUS)
+IP_SKUS = (_sku('Standard'), _sku('Basic'))
+ATTACHED = SimpleNamespace(id='attached')
+
+
+class SyntheticTenant:
+    """Deterministic synthetic tenant: counts are tenant-wide totals spread evenly over subscriptions.
+
+    `orphan_rate` is the share of disks, public IPs and NICs that are unattached and of VMs that
+    are AHB-eligible without a license; every other resource is in use.
+    """
+
+    RESOURCE_TYPES = ('disks', 'snapshots', 'public_ips', 'nics', 'vms')
+
+    def __init__(self, subscriptions: int = 20, disks: int = 2000, snapshots: Optional[int] = None,
+                 public_ips: int = 2000, nics: int = 2000, vms: int = 2000,
+                 advisor_per_subscription: int = 5, orphan_rate: float = 0.1, seed: int = 7):
+        self.subscription_count = max(1, subscriptions)
+        self.counts = {
+            'disks': disks,
+            'snapshots': disks // 5 if snapshots is None else snapshots,
+            'public_ips': public_ips,
+            'nics': nics,
+            'vms': vms
+        }
+        self.advisor_per_subscription = advisor_per_subscription
+        self.orphan_rate = orphan_rate
+        self.seed = seed
+        self.subscription_ids = [f"00000000-0000-4000-8000-{index:012d}" for index in range(self.subscription_count)]
+        self._subscription_index = {sub_id: index for index, sub_id in enumerate(self.subscription_ids)}
+        self.created = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    def describe(self) -> Dict[str, Any]:
+        return {'subscriptions': self.subscription_count, 'orphan_rate': self.orphan_rate,
+                'advisor_per_subscription': self.advisor_per_subscription, 'seed': self.seed, **self.counts}
+
+    def subscription_index(self, subscription_id: str) -> int:
+        return self._subscription_index[subscription_id]
+
+    def resource_groups(self, subscription_id: str) -> List[str]:
+        return [f"rg-{index}" for index in range(RESOURCE_GROUPS_PER_SUBSCRIPTION)]
+
+    def count_in(self, resource_type: str, subscription_id: str) -> int:
+        """Resources of one type in a subscription (the remainder goes to the first subscriptions)"""
+        total = self.counts[resource_type]
+        base, extra = divmod(total, self.subscription_count)
+        return base + (1 if self.subscription_index(subscription_id) < extra else 0)
+
+    def _rng(self, resource_type: str, subscription_id: str) -> random.Random:
+        return random.Random(f"{self.seed}:{resource_type}:{subscription_id}")
+
+    def _placement(self, rng: random.Random, subscription_id: str, provider: str, name: str) -> Tuple[str, str, str]:
+        group = f"rg-{rng.randrange(RESOURCE_GROUPS_PER_SUBSCRIPTION)}"
+        resource_id = f"/subscriptions/{subscription_id}/resourceGroups/{group}/providers/{provider}/{name}"
+        return resource_id, group, LOCATIONS[rng.randrange(len(LOCATIONS))]
+
+    def iter_sdk_objects(self, resource_type: str, subscription_id: str,
+                         resource_group: Optional[str] = None) -> Iterator[Any]:
+        """SDK-shaped objects for one list call, generated on demand"""
+        for item in self._iter_resources(resource_type, subscription_id):
+            if resource_group and item[2].lower() != resource_group.lower():
+                continue
+            yield item[0]
+
+    def iter_cost_resources(self, subscription_id: str) -> Iterator[Tuple[str, str, str, str, str, float]]:
+        """(resource id, service, location, resource group, ARM type, daily cost) for billable resources"""
+        for resource_type in self.RESOURCE_TYPES:
+            for _, resource_id, group, location, daily_cost in self._iter_resources(resource_type, subscription_id):
+                if daily_cost > 0:
+                    yield (resource_id.lower(), SERVICE_NAMES[resource_type], location, group.lower(),
+                           ARM_TYPES[resource_type], daily_cost)
+
+    def _iter_resources(self, resource_type: str, subscription_id: str) -> Iterator[Tuple[Any, str, str, str, float]]:
+        """(SDK object, resource id, resource group, location, daily cost) for one type in one subscription"""
+        rng = self._rng(resource_type, subscription_id)
+        build = getattr(self, f"_build_{resource_type}")
+        for index in range(self.count_in(resource_type, subscription_id)):
+            orphaned = rng.random() < self.orphan_rate
+            yield build(rng, subscription_id, index, orphaned)
+
+    def _build_disks(self, rng, subscription_id, index, orphaned):
+        resource_id, group, location = self._placement(rng, subscription_id, 'Microsoft.Compute/disks', f"disk-{index}")
+        sku_index = rng.randrange(len(DISK_SKUS))
+        disk = _Disk()
+        disk.id, disk.name, disk.location, disk.tags = resource_id, f"disk-{index}", location, {}
+        disk.disk_size_gb = DISK_SIZES[rng.randrange(len(DISK_SIZES))]
+        disk.sku = DISK_SKU_OBJECTS[sku_index]
+        disk.disk_state = 'Unattached' if orphaned else 'Attached'
+        low, high = DISK_SKUS[sku_index][1]
+        return disk, resource_id, group, location, round(rng.uniform(low, high), 4)
+
+    def _build_snapshots(self, rng, subscription_id, index, orphaned):
+        resource_id, group, location = self._placement(rng, subscription_id, 'Microsoft.Compute/snapshots', f"snap-{index}")
+        snapshot = _Snapshot()
+        snapshot.id, snapshot.name, snapshot.location, snapshot.tags = resource_id, f"snap-{index}", location, {}
+        snapshot.disk_size_gb = DISK_SIZES[rng.randrange(len(DISK_SIZES))]
+        snapshot.sku = DISK_SKU_OBJECTS[2]
+        snapshot.time_created = self.created - timedelta(days=rng.randrange(400))
+        return snapshot, resource_id, group, location, round(snapshot.disk_size_gb * 0.05 / 30, 4)
+
+    def _build_public_ips(self, rng, subscription_id, index, orphaned):
+        resource_id, group, location = self._placement(rng, subscription_id, 'Microsoft.Network/publicIPAddresses', f"pip-{index}")
+        ip = _PublicIp()
+        ip.id, ip.name, ip.location, ip.tags, ip.etag = resource_id, f"pip-{index}", location, {}, f'W/"{index}"'
+        ip.sku = IP_SKUS[rng.randrange(len(IP_SKUS))]
+        ip.public_ip_allocation_method = 'Static' if ip.sku is IP_SKUS[0] or rng.random() < 0.5 else 'Dynamic'
+        ip.ip_configuration = None if orphaned else ATTACHED
+        ip.nat_gateway = None
+        ip.load_balancer_frontend_ip_configurations = None
+        daily_cost = 0.12 if ip.public_ip_allocation_method == 'Static' else 0.0
+        return ip, resource_id, group, location, daily_cost
+
+    def _build_nics(self, rng, subscription_id, index, orphaned):
+        resource_id, group, location = self._placement(rng, subscription_id, 'Microsoft.Network/networkInterfaces', f"nic-{index}")
+        nic = _Nic()
+        nic.id, nic.name, nic.location, nic.tags, nic.etag = resource_id, f"nic-{index}", location, {}, f'W/"{index}"'
+        nic.virtual_machine = None if orphaned else ATTACHED
+        return nic, resource_id, group, location, 0.0
+
+    def _build_vms(self, rng, subscription_id, index, orphaned):
+        resource_id, group, location = self._placement(rng, subscription_id, 'Microsoft.Compute/virtualMachines', f"vm-{index}")
+        vm = _Vm()
+        vm.id, vm.name, vm.location, vm.tags = resource_id, f"vm-{index}", location, {}
+        vm.hardware_profile = HARDWARE_PROFILES[rng.randrange(len(HARDWARE_PROFILES))]
+        if orphaned:
+            vm.storage_profile, vm.license_type = AHB_ELIGIBLE_PROFILES[rng.randrange(len(AHB_ELIGIBLE_PROFILES))], None
+        else:
+            vm.storage_profile = OTHER_PROFILES[rng.randrange(len(OTHER_PROFILES))]
+            vm.license_type = None
+        return vm, resource_id, group, location, round(rng.uniform(2.0, 20.0), 4)
+
+    def advisor_recommendations(self, subscription_id: str) -> Iterator[SimpleNamespace]:
+        rng = self._rng('advisor', subscription_id)
+        for index in range(self.advisor_per_subscription):
+            resource_id = f"/subscriptions/{subscription_id}/resourceGroups/rg-0/providers/Microsoft.Compute/virtualMachines/vm-{index}"
+            yield SimpleNamespace(
+                id=f"{resource_id}/providers/Microsoft.Advisor/recommendations/rec-{index}",
+                name=f"rec-{index}",
+                category='Cost',
+                impact='Medium',
+                risk=None,
+                short_description=SimpleNamespace(problem='Right-size or shutdown underutilized virtual machines',
+                                                  solution='Right-size or shutdown underutilized virtual machines'),
+                impacted_value=f"vm-{index}",
+                resource_metadata=SimpleNamespace(resource_id=resource_id),
+                extended_properties={'annualSavingsAmount': str(round(rng.uniform(50, 2000), 2))},
+                last_updated=self.created
+            )
+
+
+class FakeTransport:
+    """Shared request accounting: call counts per operation, injected latency and 429 answers"""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, throttle_rate: float = 0.0,
+                 retry_after: float = 0.1, page_size: int = 1000, seed: int = 7):
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.page_size = max(1, page_size)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = Counter()
+        self.throttled = Counter()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.calls.clear()
+            self.throttled.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'api_calls': sum(self.calls.values()),
+                'throttled': sum(self.throttled.values()),
+                'by_operation': dict(sorted(self.calls.items()))
+            }
+
+    def request(self, operation: str) -> bool:
+        """One round trip; returns True when the service answered 429"""
+        with self._lock:
+            self.calls[operation] += 1
+            delay = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0)
+            throttled = self.throttle_rate > 0 and self._rng.random() < self.throttle_rate
+            if throttled:
+                self.throttled[operation] += 1
+        if delay:
+            time.sleep(delay)
+        return throttled
+
+    def request_with_retry(self, operation: str) -> None:
+        """A request whose 429s are retried after Retry-After, like the SDK pipeline's retry policy"""
+        while self.request(operation):
+            time.sleep(self.retry_after)
+
+    def pager(self, operation: str, items: Iterable[Any], raw_response_hook=None) -> Iterator[Any]:
+        """Yield items a page at a time, one request per page (an empty listing is still one request)"""
+        iterator = iter(items)
+        while True:
+            self.request_with_retry(operation)
+            if raw_response_hook:
+                raw_response_hook(SimpleNamespace(http_response=SimpleNamespace(headers={})))
+            page = list(islice(iterator, self.page_size))
+            yield from page
+            if len(page) < self.page_size:
+                return
+
+    def throttle_error(self) -> HttpResponseError:
+        error = HttpResponseError(message='Too many requests. Please retry.')
+        error.status_code = 429
+        error.response = SimpleNamespace(status_code=429, headers={'Retry-After': str(self.retry_after)})
+        return error
+
+    @staticmethod
+    def response_headers() -> Dict[str, str]:
+        return {'x-ms-ratelimit-microsoft.costmanagement-qpu-remaining': 'QueryResource:100'}
+
+
+class _Operations:
+    """Operation group bound to one subscription"""
+
+    def __init__(self, client: '_FakeClient'):
+        self.tenant = client.tenant
+        self.transport = client.transport
+        self.subscription_id = client.subscription_id
+
+
+class _ResourceList(_Operations):
+    RESOURCE_TYPE = ''
+    OPERATION = ''
+
+    def _list(self, resource_group: Optional[str] = None, raw_response_hook=None):
+        return self.transport.pager(self.OPERATION, self.tenant.iter_sdk_objects(
+            self.RESOURCE_TYPE, self.subscription_id, resource_group), raw_response_hook)
+
+    def list(self, resource_group_name: Optional[str] = None, **kwargs):
+        return self._list(resource_group_name, kwargs.get('raw_response_hook'))
+
+    def list_all(self, **kwargs):
+        return self._list(raw_response_hook=kwargs.get('raw_response_hook'))
+
+    def list_by_resource_group(self, resource_group_name: str, **kwargs):
+        return self._list(resource_group_name, kwargs.get('raw_response_hook'))
+
+
+class _Disks(_ResourceList):
+    RESOURCE_TYPE, OPERATION = 'disks', 'compute.disks.list'
+
+
+class _Snapshots(_ResourceList):
+    RESOURCE_TYPE, OPERATION = 'snapshots', 'compute.snapshots.list'
+
+
+class _VirtualMachines(_ResourceList):
+    RESOURCE_TYPE, OPERATION = 'vms', 'compute.virtual_machines.list'
+
+
+class _PublicIps(_ResourceList):
+    RESOURCE_TYPE, OPERATION = 'public_ips', 'network.public_ip_addresses.list'
+
+
+class _NetworkInterfaces(_ResourceList):
+    RESOURCE_TYPE, OPERATION = 'nics', 'network.network_interfaces.list'
+
+
+class _Recommendations(_Operations):
+    def list(self, filter: Optional[str] = None, **kwargs):
+        return self.transport.pager('advisor.recommendations.list',
+                                    self.tenant.advisor_recommendations(self.subscription_id),
+                                    kwargs.get('raw_response_hook'))
+
+
+class _ResourceGroups(_Operations):
+    def check_existence(self, resource_group_name: str, **kwargs) -> bool:
+        self.transport.request_with_retry('resource.resource_groups.check_existence')
+        return resource_group_name in self.tenant.resource_groups(self.subscription_id)
+
+
+class _Subscriptions:
+    def __init__(self, client: '_FakeClient'):
+        self.tenant = client.tenant
+        self.transport = client.transport
+
+    def list(self, **kwargs):
+        return self.transport.pager('subscription.subscriptions.list', (
+            SimpleNamespace(subscription_id=sub_id, display_name=f"Synthetic {index}", state='Enabled',
+                            tenant_id='00000000-0000-4000-8000-000000000000')
+            for index, sub_id in enumerate(self.tenant.subscription_ids)
+        ))
+
+
+class _FakeClient:
+    """Base for the fake management clients; `tenant` and `transport` are bound by install()"""
+
+    tenant: SyntheticTenant = None
+    transport: FakeTransport = None
+
+    def __init__(self, credential=None, subscription_id: Optional[str] = None, **kwargs):
+        self.subscription_id = subscription_id
+        self._client = SimpleNamespace(_config=SimpleNamespace(headers={}))
+
+    def close(self):
+        pass
+
+
+class FakeSubscriptionClient(_FakeClient):
+    def __init__(self, credential=None, **kwargs):
+        super().__init__(credential, **kwargs)
+        self.subscriptions = _Subscriptions(self)
+
+
+class FakeComputeManagementClient(_FakeClient):
+    def __init__(self, credential=None, subscription_id: Optional[str] = None, **kwargs):
+        super().__init__(credential, subscription_id, **kwargs)
+        self.disks = _Disks(self)
+        self.snapshots = _Snapshots(self)
+        self.virtual_machines = _VirtualMachines(self)
+
+
+class FakeNetworkManagementClient(_FakeClient):
+    def __init__(self, credential=None, subscription_id: Optional[str] = None, **kwargs):
+        super().__init__(credential, subscription_id, **kwargs)
+        self.public_ip_addresses = _PublicIps(self)
+        self.network_interfaces = _NetworkInterfaces(self)
+
+
+class FakeAdvisorManagementClient(_FakeClient):
+    def __init__(self, credential=None, subscription_id: Optional[str] = None, **kwargs):
+        super().__init__(credential, subscription_id, **kwargs)
+        self.recommendations = _Recommendations(self)
+
+
+class FakeResourceManagementClient(_FakeClient):
+    def __init__(self, credential=None, subscription_id: Optional[str] = None, **kwargs):
+        super().__init__(credential, subscription_id, **kwargs)
+        self.resource_groups = _ResourceGroups(self)
+
+
+class _CostPipeline:
+    """The `_client` of the fake CostManagementClient: config headers and raw next_link POSTs"""
+
+    def __init__(self, cost_client: 'FakeCostManagementClient'):
+        self.cost_client = cost_client
+        self._config = SimpleNamespace(headers={})
+
+    def send_request(self, request, **kwargs):
+        transport = self.cost_client.transport
+        if transport.request('cost.query.next_link'):
+            return _FakeHttpResponse(429, {}, transport.throttle_error())
+
+        url = urlparse(request.url)
+        scope = url.path.split('/providers/Microsoft.CostManagement/')[0]
+        offset = int(parse_qs(url.query).get('$skiptoken', ['0'])[0])
+        columns, rows, next_link = self.cost_client.page(scope, json.loads(request.content), offset)
+        hook = kwargs.get('raw_response_hook')
+        if hook:
+            hook(SimpleNamespace(http_response=SimpleNamespace(headers=transport.response_headers())))
+        return _FakeHttpResponse(200, {'properties': {'columns': columns, 'rows': rows, 'nextLink': next_link}})
+
+
+class _FakeHttpResponse:
+    def __init__(self, status_code: int, payload: Dict[str, Any], error: Optional[HttpResponseError] = None):
+        self.status_code = status_code
+        self._payload = payload
+        self._error = error
+
+    def raise_for_status(self) -> None:
+        if self._error is not None:
+            raise self._error
+
+    def json(self) -> Dict[str, Any]:
+        return self._payload
+
+
+class _Query:
+    def __init__(self, cost_client: 'FakeCostManagementClient'):
+        self.cost_client = cost_client
+
+    def usage(self, scope: str, parameters, raw_response_hook=None, **kwargs):
+        transport = self.cost_client.transport
+        if transport.request('cost.query.usage'):
+            raise transport.throttle_error()
+        if raw_response_hook:
+            raw_response_hook(SimpleNamespace(http_response=SimpleNamespace(headers=transport.response_headers())))
+
+        body = parameters.serialize() if hasattr(parameters, 'serialize') else parameters
+        columns, rows, next_link = self.cost_client.page(scope, body, 0)
+        return SimpleNamespace(
+            columns=[SimpleNamespace(name=column['name'], type=column['type']) for column in columns],
+            rows=rows,
+            next_link=next_link
+        )
+
+
+class _Budgets:
+    def __init__(self, cost_client: 'FakeCostManagementClient'):
+        self.cost_client = cost_client
+
+    def list(self, scope: str, raw_response_hook=None, **kwargs):
+        transport = self.cost_client.transport
+        if transport.request('cost.budgets.list'):
+            raise transport.throttle_error()
+        return iter([SimpleNamespace(
+            name='monthly-budget', amount=10000.0, time_grain='Monthly', category='Cost',
+            current_spend=SimpleNamespace(amount=6400.0), forecasted_spend=SimpleNamespace(amount=9100.0)
+        )])
+
+
+class FakeCostManagementClient(_FakeClient):
+    """Answers usage queries by aggregating the synthetic tenant's daily costs like the Query API.
+
+    Supports the parts of a query body the app sends: ActualCost aggregations, Daily/Monthly/None
+    granularity, Dimension grouping, `In` dimension filters, Cost sorting and top. Results are
+    split into pages of COST_ROW_LIMIT rows linked by next_link.
+    """
+
+    DIMENSION_FIELDS = {'resourceid': 0, 'servicename': 1, 'resourcelocation': 2,
+                        'resourcegroupname': 3, 'resourcetype': 4}
+
+    def __init__(self, credential=None, subscription_id: Optional[str] = None, **kwargs):
+        super().__init__(credential, subscription_id, **kwargs)
+        self._client = _CostPipeline(self)
+        self.query = _Query(self)
+        self.budgets = _Budgets(self)
+
+    def page(self, scope: str, body: Dict[str, Any], offset: int) -> Tuple[List[Dict[str, str]], List[list], Optional[str]]:
+        columns, rows = self.evaluate(scope, body)
+        page_rows = rows[offset:offset + COST_ROW_LIMIT]
+        next_link = None
+        if offset + COST_ROW_LIMIT < len(rows):
+            next_link = (f"https://management.azure.com{scope}/providers/Microsoft.CostManagement/query"
+                         f"?api-version={COST_API_VERSION}&$skiptoken={offset + COST_ROW_LIMIT}")
+        return columns, page_rows, next_link
+
+    def evaluate(self, scope: str, body: Dict[str, Any]) -> Tuple[List[Dict[str, str]], List[list]]:
+        """Columns and all rows of a query over the scope (deterministic, so paging is stable)"""
+        dataset = body.get('dataset') or {}
+        granularity = dataset.get('granularity') or 'None'
+        aggregations = [agg['name'] for agg in (dataset.get('aggregation') or {}).values()]
+        dimensions = [group['name'] for group in dataset.get('grouping') or []]
+        fields = [self.DIMENSION_FIELDS.get(name.lower()) for name in dimensions]
+        matches = self._filter(dataset.get('filter'))
+
+        # Daily cost per group, then spread over the days of the period
+        totals = {}
+        for resource in self._scope_resources(scope):
+            if matches and not matches(resource):
+                continue
+            key = tuple(resource[field] if field is not None else '' for field in fields)
+            totals[key] = totals.get(key, 0.0) + resource[5]
+
+        days = self._days(body.get('timePeriod') or {})
+        rows = []
+        for key, daily_cost in totals.items():
+            for bucket, day_count, factor in self._buckets(days, granularity):
+                cost = round(daily_cost * day_count * factor, 6)
+                values = [cost] * len(aggregations)
+                if bucket is not None:
+                    values.append(bucket)
+                rows.append(values + list(key) + ['USD'])
+
+        sorting = dataset.get('sorting') or []
+        if sorting and aggregations:
+            rows.sort(key=lambda row: row[0], reverse=sorting[0].get('direction', 'Ascending') == 'Descending')
+        if body.get('top'):
+            rows = rows[:int(body['top'])]
+
+        columns = [{'name': name, 'type': 'Number'} for name in aggregations]
+        if granularity == 'Daily':
+            columns.append({'name': 'UsageDate', 'type': 'Number'})
+        elif granularity == 'Monthly':
+            columns.append({'name': 'BillingMonth', 'type': 'Datetime'})
+        columns += [{'name': name, 'type': 'String'} for name in dimensions]
+        columns.append({'name': 'Currency', 'type': 'String'})
+        return columns, rows
+
+    def _scope_resources(self, scope: str) -> Iterator[Tuple[str, str, str, str, str, float]]:
+        parts = scope.strip('/').split('/')
+        if parts[0].lower() == 'subscriptions':
+            resource_group = parts[3].lower() if len(parts) > 3 and parts[2].lower() == 'resourcegroups' else None
+            for resource in self.tenant.iter_cost_resources(parts[1]):
+                if resource_group is None or resource[3] == resource_group:
+                    yield resource
+        else:
+            # Management group and billing scopes cover the whole synthetic tenant
+            for subscription_id in self.tenant.subscription_ids:
+                yield from self.tenant.iter_cost_resources(subscription_id)
+
+    def _filter(self, query_filter: Optional[Dict[str, Any]]):
+        dimension = (query_filter or {}).get('dimensions')
+        if not dimension:
+            return None
+        field = self.DIMENSION_FIELDS.get(dimension['name'].lower())
+        if field is None:
+            return None
+        values = {str(value).lower() for value in dimension.get('values') or []}
+        return lambda resource: resource[field].lower() in values
+
+    @staticmethod
+    def _days(time_period: Dict[str, Any]) -> List[date]:
+        start = datetime.fromisoformat(str(time_period.get('from', '2025-01-01'))).date()
+        end = datetime.fromisoformat(str(time_period.get('to', '2025-01-31'))).date()
+        return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+    @staticmethod
+    def _buckets(days: List[date], granularity: str) -> Iterator[Tuple[Any, int, float]]:
+        """(date column value, days in bucket, cost factor) per result bucket"""
+        if granularity == 'Daily':
+            for day in days:
+                # Weekday usage runs a little hotter than weekends
+                yield int(day.strftime('%Y%m%d')), 1, 1.05 if day.weekday() < 5 else 0.88
+        elif granularity == 'Monthly':
+            months = Counter(day.replace(day=1) for day in days)
+            for month, day_count in sorted(months.items()):
+                yield f"{month.isoformat()}T00:00:00", day_count, 1.0
+        else:
+            yield None, len(days), 1.0
+
+
+CLIENT_FAKES = {
+    'SubscriptionClient': FakeSubscriptionClient,
+    'ComputeManagementClient': FakeComputeManagementClient,
+    'NetworkManagementClient': FakeNetworkManagementClient,
+    'AdvisorManagementClient': FakeAdvisorManagementClient,
+    'ResourceManagementClient': FakeResourceManagementClient,
+    'CostManagementClient': FakeCostManagementClient
+}
+
+
+@contextmanager
+def installed(function_app, tenant: SyntheticTenant, transport: FakeTransport):
+    """Swap the fake clients into the app modules (and drop cached real clients) for the duration"""
+    from shared_code import azure_clients
+    modules = [function_app] + [module for name, module in sorted(sys.modules.items())
+                                if name.startswith('shared_code.')]
+    originals = [(module, name, getattr(module, name)) for module in modules for name in PATCHED_CLIENTS
+                 if hasattr(module, name)]
+    fakes = {name: type(fake.__name__, (fake,), {'tenant': tenant, 'transport': transport})
+             for name, fake in CLIENT_FAKES.items()}
+    for module, name, _ in originals:
+        setattr(module, name, fakes[name])
+    azure_clients._client_cache.clear()
+    try:
+        yield
+    finally:
+        for module, name, original in originals:
+            setattr(module, name, original)
+        azure_clients._client_cache.clear()
@@ -0,0 +1,185 @@
+"""
+Offline benchmarks for the /analyze and cost query paths against a synthetic tenant.
+
+Each scenario calls query_resources or query_cost_management_direct with fake SDK clients
+installed (see fake_azure.py) and reports wall time, API calls (and 429s) and peak traced
+memory. Every repetition starts cold: client cache, cost query cache and rate limiter are reset.
+
+Usage (from the repository root, with requirements.txt installed):
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --preset large --scenario resources
+    python benchmarks/run_benchmarks.py --latency-ms 40 --throttle-rate 0.05 --json results.json
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+# Keep the cost query cache in memory and out of the real temp directory
+os.environ.setdefault('COST_CACHE_DIR', '')
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import function_app  # noqa: E402
+from shared_code import azure_clients, cost_analysis, resilience  # noqa: E402
+from fake_azure import FakeTransport, SyntheticTenant, installed  # noqa: E402
+
+# Tenant sizes: subscriptions and resources per type (tenant-wide totals)
+PRESETS = {
+    'small': {'subscriptions': 20, 'resources': 2000},
+    'medium': {'subscriptions': 100, 'resources': 100000},
+    'large': {'subscriptions': 500, 'resources': 1000000}
+}
+
+COST_PERIOD = {'start_date': '2025-01-01', 'end_date': '2025-03-31'}
+
+
+def scenarios(tenant: SyntheticTenant, args) -> Dict[str, Callable[[], Dict[str, Any]]]:
+    """Scenario name -> call under test"""
+    first = tenant.subscription_ids[0]
+    fanout = tenant.subscription_ids[:args.fanout_subscriptions]
+    scan = {'max_workers': args.scan_workers} if args.scan_workers else {}
+    return {
+        'resources': lambda: function_app.query_resources(dict(scan)),
+        'resources_with_cost': lambda: function_app.query_resources(dict(scan, include_cost=True)),
+        'cost_subscription': lambda: function_app.query_cost_management_direct(
+            dict(COST_PERIOD, subscription_id=first, query_type='subscription')),
+        'cost_top_resources': lambda: function_app.query_cost_management_direct(
+            dict(COST_PERIOD, subscription_id=first, query_type='top_resources', top_n=25)),
+        'cost_rollup': lambda: function_app.query_cost_management_direct(
+            dict(COST_PERIOD, subscription_id=first, query_type='rollup',
+                 group_by=['service', 'location'], time_grains=['daily', 'weekly', 'monthly'])),
+        'cost_multi_subscription': lambda: function_app.query_cost_management_direct(
+            dict(COST_PERIOD, subscription_ids=fanout, query_type='subscription'))
+    }
+
+
+def reset_state(args) -> None:
+    """Cold start for one repetition: no cached clients or results, closed circuit breakers, a fresh rate limiter"""
+    azure_clients._client_cache.clear()
+    cost_analysis._cost_query_cache.clear()
+    resilience._circuit_breakers.clear()
+    cost_analysis._cost_rate_limiter = resilience.CostRateLimiter(args.cost_rate, args.cost_rate, args.cost_burst)
+
+
+def describe_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Size of a result, to check that scenarios did the work they claim to"""
+    if 'error' in result:
+        return {'error': result['error']}
+    if 'resources' in result and isinstance(result['resources'], list):
+        return {'resources': len(result['resources']), 'errors': len(result.get('errors') or [])}
+    summary = {key: result[key] for key in ('complete', 'pages', 'windows') if key in result}
+    summary['bytes'] = len(json.dumps(result, default=str))
+    return summary
+
+
+def run_scenario(name: str, call: Callable[[], Dict[str, Any]], transport: FakeTransport, args) -> Dict[str, Any]:
+    wall_times = []
+    for _ in range(args.repeat):
+        reset_state(args)
+        transport.reset()
+        started = time.perf_counter()
+        result = call()
+        wall_times.append(time.perf_counter() - started)
+    calls = transport.stats()
+    report = {
+        'wall_seconds': {
+            'min': round(min(wall_times), 4),
+            'median': round(statistics.median(wall_times), 4),
+            'max': round(max(wall_times), 4)
+        },
+        **calls,
+        'rate_limiter': cost_analysis._cost_rate_limiter.stats(),
+        'result': describe_result(result)
+    }
+
+    # Peak memory comes from a separate traced run; tracing slows the code down too much to time it
+    if not args.no_memory:
+        reset_state(args)
+        transport.reset()
+        tracemalloc.start()
+        try:
+            call()
+            report['peak_memory_mb'] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 2)
+        finally:
+            tracemalloc.stop()
+
+    return report
+
+
+def print_report(reports: Dict[str, Dict[str, Any]]) -> None:
+    print(f"{'scenario':<26}{'median s':>10}{'min s':>10}{'api calls':>11}{'429s':>7}{'peak MB':>10}  result")
+    for name, report in reports.items():
+        wall = report['wall_seconds']
+        print(f"{name:<26}{wall['median']:>10.3f}{wall['min']:>10.3f}{report['api_calls']:>11}"
+              f"{report['throttled']:>7}{report.get('peak_memory_mb', float('nan')):>10.1f}  {report['result']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small', help='Tenant size (default: small)')
+    parser.add_argument('--subscriptions', type=int, help='Override the preset subscription count')
+    parser.add_argument('--resources', type=int, help='Override the preset disks, public IPs, NICs and VMs (each)')
+    parser.add_argument('--orphan-rate', type=float, default=0.1, help='Share of resources that are orphaned (default: 0.1)')
+    parser.add_argument('--scenario', action='append', help='Scenario to run (repeatable; default: all)')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed repetitions per scenario (default: 3)')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Latency added to every API call')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='Random extra latency per API call')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Share of API calls answered with 429')
+    parser.add_argument('--retry-after', type=float, default=0.1, help='Retry-After seconds sent with each 429')
+    parser.add_argument('--page-size', type=int, default=1000, help='Items per management list page (default: 1000)')
+    parser.add_argument('--scan-workers', type=int, help='max_workers passed to query_resources')
+    parser.add_argument('--fanout-subscriptions', type=int, default=20,
+                        help='Subscriptions in the cost_multi_subscription scenario (default: 20)')
+    parser.add_argument('--cost-rate', type=float, default=200.0,
+                        help='Cost Management requests/second allowed by the rate limiter (default: 200; '
+                             'the production default of 1/s would make cost scenarios measure pacing only)')
+    parser.add_argument('--cost-burst', type=int, default=20, help='Rate limiter burst (default: 20)')
+    parser.add_argument('--no-memory', action='store_true', help='Skip the traced run that measures peak memory')
+    parser.add_argument('--json', dest='json_path', help='Also write the full report to this file')
+    parser.add_argument('--verbose', action='store_true', help='Show the function app log output')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.ERROR)
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.ERROR)
+
+    preset = PRESETS[args.preset]
+    resources = args.resources if args.resources is not None else preset['resources']
+    tenant = SyntheticTenant(subscriptions=args.subscriptions or preset['subscriptions'], disks=resources,
+                             public_ips=resources, nics=resources, vms=resources, orphan_rate=args.orphan_rate)
+    transport = FakeTransport(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, throttle_rate=args.throttle_rate,
+                              retry_after=args.retry_after, page_size=args.page_size)
+
+    available = scenarios(tenant, args)
+    selected: List[str] = args.scenario or list(available)
+    unknown = [name for name in selected if name not in available]
+    if unknown:
+        parser.error(f"Unknown scenario(s): {', '.join(unknown)}. Valid scenarios: {', '.join(available)}")
+
+    # Load the price table and credential up front so the first scenario is not charged for them
+    # (benchmarks/startup_benchmark.py measures those cold-start costs)
+    function_app.get_default_price_table()
+    function_app.get_credential()
+
+    reports = {}
+    with installed(function_app, tenant, transport):
+        for name in selected:
+            reports[name] = run_scenario(name, available[name], transport, args)
+
+    print(f"Synthetic tenant: {tenant.describe()}")
+    print_report(reports)
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as report_file:
+            json.dump({'tenant': tenant.describe(), 'options': vars(args), 'scenarios': reports},
+                      report_file, indent=2, default=str)
+
+
+if __name__ == '__main__':
+    main()
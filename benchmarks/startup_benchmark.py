@@ -0,0 +1,127 @@
+"""
+Cold-start benchmark: module import time plus the SDK imports each endpoint triggers on first use.
+
+Every sample runs in a fresh interpreter, like a consumption-plan cold start. A sample imports
+function_app, then does what the endpoint's first request loads: static endpoints are invoked,
+SDK endpoints resolve the lazily imported clients they use and build their credential (no calls
+are made to Azure). The 'all' row loads every SDK, i.e. what importing the module used to cost.
+
+Usage (from the repository root, with requirements.txt installed):
+    python benchmarks/startup_benchmark.py
+    python benchmarks/startup_benchmark.py --endpoint example --endpoint cost-analysis --repeat 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SYNC_ANALYZE = ['SubscriptionClient', 'ComputeManagementClient', 'NetworkManagementClient',
+                'AdvisorManagementClient', 'ResourceManagementClient']
+ASYNC_ANALYZE = ['AsyncDefaultAzureCredential', 'AsyncSubscriptionClient', 'AsyncComputeManagementClient',
+                 'AsyncNetworkManagementClient', 'AsyncAdvisorManagementClient', 'AsyncResourceManagementClient']
+
+# Endpoint -> what its first request loads: 'route' is invoked, 'sdk' names are resolved,
+# and 'credential' builds the shared sync credential
+ENDPOINTS = {
+    'example': {'route': 'example'},
+    'cost-example': {'route': 'cost-example'},
+    'analyze': {'sdk': SYNC_ANALYZE, 'credential': True},
+    'analyze/async': {'sdk': ASYNC_ANALYZE},
+    'analyze/resource_graph': {'sdk': ['SubscriptionClient', 'ResourceGraphClient', 'QueryRequest'], 'credential': True},
+    'cost-analysis': {'sdk': ['CostManagementClient', 'ResourceManagementClient'], 'credential': True},
+    'cost-analysis/async': {'sdk': ['AsyncDefaultAzureCredential', 'AsyncCostManagementClient']},
+    'all': {'sdk': 'all', 'credential': True}
+}
+
+
+def measure_endpoint(endpoint: str) -> Dict[str, Any]:
+    """One cold sample, run inside a fresh interpreter"""
+    sys.path.insert(0, REPO_ROOT)
+    modules_before = len(sys.modules)
+    started = time.perf_counter()
+    import function_app
+    from shared_code import azure_clients
+    imported = time.perf_counter()
+    modules_after_import = len(sys.modules)
+
+    plan = ENDPOINTS[endpoint]
+    if plan.get('route'):
+        import azure.functions as func
+        handlers = {function.get_trigger().route: function.get_user_function()
+                    for function in function_app.app.get_functions()}
+        request = func.HttpRequest('GET', f"http://localhost/api/{plan['route']}", body=b'')
+        handlers[plan['route']](request)
+
+    names = plan.get('sdk') or []
+    if names == 'all':
+        names = [name for name, value in vars(azure_clients).items() if isinstance(value, azure_clients.LazyImport)]
+    for name in names:
+        getattr(azure_clients, name).resolve()
+    if plan.get('credential'):
+        function_app.get_credential()
+    first_use = time.perf_counter()
+
+    return {
+        'import_ms': (imported - started) * 1000,
+        'first_use_ms': (first_use - imported) * 1000,
+        'total_ms': (first_use - started) * 1000,
+        'modules_on_import': modules_after_import - modules_before,
+        'modules_on_first_use': len(sys.modules) - modules_after_import
+    }
+
+
+def sample(endpoint: str) -> Dict[str, Any]:
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', endpoint],
+        check=True, capture_output=True, text=True, cwd=REPO_ROOT
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def summarize(samples: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        'import_ms': round(statistics.median(entry['import_ms'] for entry in samples), 1),
+        'first_use_ms': round(statistics.median(entry['first_use_ms'] for entry in samples), 1),
+        'total_ms': round(statistics.median(entry['total_ms'] for entry in samples), 1),
+        'total_ms_max': round(max(entry['total_ms'] for entry in samples), 1),
+        'modules_on_import': samples[-1]['modules_on_import'],
+        'modules_on_first_use': samples[-1]['modules_on_first_use']
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--endpoint', action='append', choices=list(ENDPOINTS),
+                        help='Endpoint to measure (repeatable; default: all of them)')
+    parser.add_argument('--repeat', type=int, default=5, help='Cold samples per endpoint (default: 5)')
+    parser.add_argument('--json', dest='json_path', help='Also write the report to this file')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure_endpoint(args.child)))
+        return
+
+    reports = {}
+    for endpoint in args.endpoint or list(ENDPOINTS):
+        reports[endpoint] = summarize([sample(endpoint) for _ in range(args.repeat)])
+
+    print(f"{'endpoint':<24}{'import ms':>11}{'first use ms':>14}{'total ms':>10}{'max ms':>9}{'modules':>14}")
+    for endpoint, report in reports.items():
+        modules = f"{report['modules_on_import']}+{report['modules_on_first_use']}"
+        print(f"{endpoint:<24}{report['import_ms']:>11.1f}{report['first_use_ms']:>14.1f}"
+              f"{report['total_ms']:>10.1f}{report['total_ms_max']:>9.1f}{modules:>14}")
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as report_file:
+            json.dump({'repeat': args.repeat, 'endpoints': reports}, report_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,93 +2,480 @@ import azure.functions as func
 import logging
 import json
 import time
-import random
-from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
-from azure.identity import DefaultAzureCredential
-from azure.core.exceptions import HttpResponseError
-from azure.mgmt.compute import ComputeManagementClient
-from azure.mgmt.network import NetworkManagementClient
-from azure.mgmt.advisor import AdvisorManagementClient
-from azure.mgmt.costmanagement import CostManagementClient
-from azure.mgmt.resource import ResourceManagementClient, SubscriptionClient
-from azure.monitor.query import LogsQueryClient
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Any, Optional, Tuple, Iterator
 import os
+import asyncio
+import uuid
+import queue
+import base64
+import hashlib
+import socket
+import sqlite3
+import tempfile
+import threading
+import contextvars
+from abc import ABC, abstractmethod
+from types import SimpleNamespace
+
+from shared_code.azure_clients import (
+    AdvisorManagementClient, AsyncAdvisorManagementClient, AsyncComputeManagementClient, AsyncCostManagementClient,
+    AsyncDefaultAzureCredential, AsyncNetworkManagementClient, AsyncResourceManagementClient, AsyncSubscriptionClient,
+    ComputeManagementClient, NetworkManagementClient, QueryRequest, QueryRequestOptions, ResourceGraphClient,
+    ResourceManagementClient, SubscriptionClient, get_credential, get_management_client)
+from shared_code.caching import InventorySnapshotStore, ScanResultStore, get_default_snapshot_store
+from shared_code.cost_analysis import (AsyncCostManagementAnalyzer, COST_SCOPE_FANOUT_WORKERS, CostManagementAnalyzer,
+                                       query_cost_management_direct, query_cost_management_direct_async)
+from shared_code.diagnostics import (ContextThreadPoolExecutor, attach_diagnostics, count_diagnostic,
+                                     diagnostic_response_hook, diagnostic_span, request_diagnostics)
+from shared_code.resilience import async_client_policies, circuit_marker
+from shared_code.settings import env_number
 
 app = func.FunctionApp()
 
-# Initialize clients globally
-credential = DefaultAzureCredential()
+# Streaming /analyze: bounded hand-off between collector threads and the response writer
+STREAM_QUEUE_SIZE = env_number('ORPHAN_STREAM_QUEUE_SIZE', 1000)
+# HTTP streaming needs the azurefunctions-extensions-http-fastapi extension; opt in per app
+HTTP_STREAMING_ENABLED = os.environ.get('ORPHAN_HTTP_STREAMING_ENABLED', 'false').lower() == 'true'
+
+# Paged /analyze: how long (and how many) materialized scans stay available to cursors
+SCAN_RESULT_TTL_SECONDS = env_number('SCAN_RESULT_TTL_SECONDS', 1800)
+SCAN_RESULT_MAX_ENTRIES = env_number('SCAN_RESULT_MAX_ENTRIES', 32)
+
+# Async /analyze jobs: where job state lives, how many scans run at once, and when a silent job is abandoned.
+# The default SQLite file is local to each instance; when scaled out, point ORPHAN_JOB_DB at storage every
+# instance mounts (e.g. under /home) and set ORPHAN_JOB_DB_SHARED=true, or polls that land on another
+# instance are answered with a 'job belongs to another instance' error
+ORPHAN_JOB_STORE = os.environ.get('ORPHAN_JOB_STORE', 'sqlite').lower()
+ORPHAN_JOB_DB = os.environ.get('ORPHAN_JOB_DB', os.path.join(tempfile.gettempdir(), 'orphan-jobs.sqlite3'))
+ORPHAN_JOB_DB_SHARED = os.environ.get('ORPHAN_JOB_DB_SHARED', 'false').lower() == 'true'
+ORPHAN_JOB_WORKERS = env_number('ORPHAN_JOB_WORKERS', 2)
+ORPHAN_JOB_STALE_SECONDS = env_number('ORPHAN_JOB_STALE_SECONDS', 900)
+ORPHAN_JOB_PERSIST_INTERVAL_SECONDS = env_number('ORPHAN_JOB_PERSIST_INTERVAL_SECONDS', 1.0, float)
+
+# Subscriptions scanned concurrently by the aio path (one event loop, no thread per call)
+DEFAULT_ASYNC_SCAN_CONCURRENCY = env_number('ORPHAN_ASYNC_MAX_CONCURRENCY', 32)
+
+# Upper bound on subscriptions scanned in parallel during tenant-wide analysis
+DEFAULT_SUBSCRIPTION_SCAN_WORKERS = env_number('ORPHAN_SCAN_MAX_WORKERS', 8)
+
+# Seconds a single collector may run before its subscription result is returned without it
+DEFAULT_COLLECTOR_TIMEOUT_SECONDS = env_number('ORPHAN_COLLECTOR_TIMEOUT_SECONDS', 240.0, float)
+
+# Orphan detection backend: 'sdk' (per-subscription list calls) or 'resource_graph' (server-side queries)
+DEFAULT_ORPHAN_SCAN_BACKEND = os.environ.get('ORPHAN_SCAN_BACKEND', 'sdk')
+
+# Trailing days of actual spend joined into orphan records when a request sets include_cost
+DEFAULT_ORPHAN_COST_DAYS = env_number('ORPHAN_COST_DAYS', 30)
+
+# Offline price table used to estimate orphan waste at scan time (rebuilt by tools/refresh_price_table.py)
+ORPHAN_PRICE_TABLE = os.environ.get('ORPHAN_PRICE_TABLE',
+                                    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pricing', 'price_table.json'))
+
+# Incremental orphan scans: how long an unchanged inventory snapshot may be reused (stored at ORPHAN_SNAPSHOT_DB)
+ORPHAN_SNAPSHOT_MAX_AGE_HOURS = env_number('ORPHAN_SNAPSHOT_MAX_AGE_HOURS', 24.0, float)
+
+
+class SummaryAccumulator:
+    """Orphan summary maintained record by record, so it can be built while results stream out"""
+    
+    def __init__(self):
+        self.total_resources = 0
+        self.by_type = {}
+        self.advisor_savings = 0.0
+        self.estimated_monthly_cost = 0.0
+        self.orphan_cost = None
+        # Costed orphans' savings by resource ID, and the resource IDs Advisor already covers
+        self.orphan_savings = {}
+        self.advised_resources = set()
+    
+    def add(self, resource: Dict[str, Any]) -> None:
+        res_type = resource.get('resource_type', 'Unknown')
+        self.total_resources += 1
+        self.by_type[res_type] = self.by_type.get(res_type, 0) + 1
+        
+        self.estimated_monthly_cost += resource.get('estimated_monthly_cost') or 0.0
+        
+        # Advisor recommendations carry their own savings; orphans only once actual costs were joined in
+        resource_key = (resource.get('resource_id') or '').lower()
+        if res_type == 'Advisor Recommendation':
+            self.advisor_savings += resource.get('potential_savings', 0.0)
+            if resource_key:
+                self.advised_resources.add(resource_key)
+        elif 'cost' in resource:
+            self.orphan_savings[resource_key] = self.orphan_savings.get(resource_key, 0.0) + \
+                resource.get('potential_savings', 0.0)
+        if 'cost' in resource and 'potential_savings' in resource:
+            self.orphan_cost = (self.orphan_cost or 0.0) + resource['cost']
+    
+    @property
+    def total_potential_savings(self) -> float:
+        """Advisor savings plus costed orphans Advisor has no recommendation for, so none is counted twice"""
+        return self.advisor_savings + sum(savings for resource_key, savings in self.orphan_savings.items()
+                                          if not resource_key or resource_key not in self.advised_resources)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        summary = {
+            'total_resources': self.total_resources,
+            'by_type': dict(self.by_type),
+            'total_potential_savings': self.total_potential_savings,
+            'estimated_monthly_cost': round(self.estimated_monthly_cost, 2)
+        }
+        if self.orphan_cost is not None:
+            summary['orphan_cost'] = self.orphan_cost
+        return summary
+
+
+_scan_result_store = ScanResultStore(SCAN_RESULT_TTL_SECONDS, SCAN_RESULT_MAX_ENTRIES)
+
+
+class JobStore(ABC):
+    """Persists async /analyze job state (status, per-subscription progress, result) by job ID.
+
+    Resources found per subscription are kept apart from the job record, so progress updates
+    rewrite only the small job record and each subscription's resources are written once.
+    A store is 'shared' when every instance of the app reads and writes the same jobs.
+    """
+    
+    shared = False
+    
+    @abstractmethod
+    def load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        ...
+    
+    @abstractmethod
+    def save(self, job: Dict[str, Any]) -> None:
+        ...
+    
+    @abstractmethod
+    def save_partial(self, job_id: str, subscription_id: str, resources: List[Dict[str, Any]]) -> None:
+        ...
+    
+    @abstractmethod
+    def load_partials(self, job_id: str) -> Dict[str, List[Dict[str, Any]]]:
+        ...
+    
+    @abstractmethod
+    def delete_partials(self, job_id: str) -> None:
+        ...
+
+
+class InMemoryJobStore(JobStore):
+    """Process-local job store (useful for tests and single-instance runs)"""
+    
+    def __init__(self):
+        self._jobs = {}
+        self._partials = {}
+        self._lock = threading.Lock()
+    
+    def load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return json.loads(job) if job else None
+    
+    def save(self, job: Dict[str, Any]) -> None:
+        payload = json.dumps(job, default=str)
+        with self._lock:
+            self._jobs[job['job_id']] = payload
+    
+    def save_partial(self, job_id: str, subscription_id: str, resources: List[Dict[str, Any]]) -> None:
+        payload = json.dumps(resources, default=str)
+        with self._lock:
+            self._partials.setdefault(job_id, {})[subscription_id] = payload
+    
+    def load_partials(self, job_id: str) -> Dict[str, List[Dict[str, Any]]]:
+        with self._lock:
+            partials = dict(self._partials.get(job_id, {}))
+        return {subscription_id: json.loads(payload) for subscription_id, payload in partials.items()}
+    
+    def delete_partials(self, job_id: str) -> None:
+        with self._lock:
+            self._partials.pop(job_id, None)
+
+
+class SQLiteJobStore(JobStore):
+    """Job store backed by a SQLite file (shared when every instance mounts the same file)"""
+    
+    def __init__(self, path: str, shared: bool = False):
+        self.path = path
+        self.shared = shared
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS orphan_jobs "
+                "(job_id TEXT PRIMARY KEY, status TEXT NOT NULL, updated_at TEXT NOT NULL, payload TEXT NOT NULL)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS orphan_job_partials "
+                "(job_id TEXT NOT NULL, subscription_id TEXT NOT NULL, payload TEXT NOT NULL, "
+                "PRIMARY KEY (job_id, subscription_id))"
+            )
+    
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+    
+    def load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as connection:
+            row = connection.execute("SELECT payload FROM orphan_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+    
+    def save(self, job: Dict[str, Any]) -> None:
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO orphan_jobs (job_id, status, updated_at, payload) VALUES (?, ?, ?, ?)",
+                (job['job_id'], job['status'], job['updated_at'], json.dumps(job, default=str))
+            )
+    
+    def save_partial(self, job_id: str, subscription_id: str, resources: List[Dict[str, Any]]) -> None:
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO orphan_job_partials (job_id, subscription_id, payload) VALUES (?, ?, ?)",
+                (job_id, subscription_id, json.dumps(resources, default=str))
+            )
+    
+    def load_partials(self, job_id: str) -> Dict[str, List[Dict[str, Any]]]:
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT subscription_id, payload FROM orphan_job_partials WHERE job_id = ?", (job_id,)
+            ).fetchall()
+        return {subscription_id: json.loads(payload) for subscription_id, payload in rows}
+    
+    def delete_partials(self, job_id: str) -> None:
+        with self._connect() as connection:
+            connection.execute("DELETE FROM orphan_job_partials WHERE job_id = ?", (job_id,))
+
+
+_default_job_store = None
+_default_job_store_lock = threading.Lock()
+
+
+def get_default_job_store() -> JobStore:
+    """Job store selected by ORPHAN_JOB_STORE ('sqlite' at ORPHAN_JOB_DB, or 'memory')"""
+    global _default_job_store
+    with _default_job_store_lock:
+        if _default_job_store is None:
+            if ORPHAN_JOB_STORE == 'memory':
+                _default_job_store = InMemoryJobStore()
+            else:
+                _default_job_store = SQLiteJobStore(ORPHAN_JOB_DB, shared=ORPHAN_JOB_DB_SHARED)
+        return _default_job_store
+
+
+# Short, stable tag for this instance; job IDs carry it so a poll on another instance can say so
+_INSTANCE_TAG = hashlib.sha256(
+    (os.environ.get('WEBSITE_INSTANCE_ID') or socket.gethostname()).encode('utf-8')
+).hexdigest()[:8]
+
+
+class JobNotOnThisInstanceError(Exception):
+    """Raised when a job ID from another instance is looked up in this instance's local job store"""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        super().__init__(
+            f"Job {job_id} belongs to another instance and its state is not shared with this one; "
+            "configure a shared job store (ORPHAN_JOB_DB on shared storage with ORPHAN_JOB_DB_SHARED=true) "
+            "when running scaled out"
+        )
+
 
-def retry_with_backoff(max_retries: int = 3, base_delay: float = 1.0, max_delay: float = 60.0):
+class PriceTable:
+    """Versioned offline price index for estimating what orphaned resources cost per month.
+
+    Prices are indexed by (service, region, sku, tier) when the table is loaded, so each estimate
+    is a dict lookup and scans add no Cost Management calls. Regions missing from the table fall
+    back to the '*' entries; unknown SKUs (e.g. Ultra or Premium SSD v2 disks) are not estimated.
     """
-    Decorator for implementing exponential backoff retry logic for Azure API calls
-    Handles 429 (Too Many Requests) and transient errors
+    
+    HOURS_PER_MONTH = 730
+    
+    # Managed disks are billed by size tier: (largest size in GiB, tier number), e.g. 100 GiB on Premium_LRS -> P10
+    DISK_TIERS = [(4, 1), (8, 2), (16, 3), (32, 4), (64, 6), (128, 10), (256, 15), (512, 20),
+                  (1024, 30), (2048, 40), (4096, 50), (8192, 60), (16384, 70), (32767, 80)]
+    DISK_TIER_PREFIXES = {'premium': 'P', 'standardssd': 'E', 'standard': 'S'}
+    
+    def __init__(self, prices: List[Dict[str, Any]], version: str = 'empty', currency: str = 'USD'):
+        self.version = version
+        self.currency = currency
+        self._index = {
+            (entry['service'], entry['region'].lower(), entry['sku'].lower(), str(entry['tier']).lower()): float(entry['monthly'])
+            for entry in prices
+        }
+    
+    @classmethod
+    def load(cls, path: str) -> 'PriceTable':
+        with open(path, 'r', encoding='utf-8') as table_file:
+            table = json.load(table_file)
+        return cls(table['prices'], table.get('version', 'unknown'), table.get('currency', 'USD'))
+    
+    def __len__(self) -> int:
+        return len(self._index)
+    
+    def info(self) -> Dict[str, Any]:
+        return {'version': self.version, 'currency': self.currency, 'entries': len(self._index)}
+    
+    def price(self, service: str, region: Optional[str], sku: Optional[str], tier: str) -> Optional[float]:
+        """Monthly price for one table key, falling back to the region-independent '*' entry"""
+        sku_key = (sku or '').lower()
+        monthly = self._index.get((service, (region or '').lower(), sku_key, tier.lower()))
+        if monthly is None:
+            monthly = self._index.get((service, '*', sku_key, tier.lower()))
+        return monthly
+    
+    def disk_monthly_cost(self, region: Optional[str], sku: Optional[str], size_gb: Optional[int]) -> Optional[float]:
+        tier = self.disk_tier(sku, size_gb)
+        if tier is None:
+            return None
+        return self.price('disk', region, sku, tier)
+    
+    @classmethod
+    def disk_tier(cls, sku: Optional[str], size_gb: Optional[int]) -> Optional[str]:
+        """Billing tier name for a disk SKU and size, e.g. ('StandardSSD_LRS', 200) -> 'E15'"""
+        if not sku or not size_gb:
+            return None
+        prefix = cls.DISK_TIER_PREFIXES.get(sku.split('_')[0].lower())
+        if prefix is None:
+            return None
+        for max_gb, number in cls.DISK_TIERS:
+            if size_gb <= max_gb:
+                # Standard HDD starts at S4
+                return f"{prefix}{max(number, 4) if prefix == 'S' else number}"
+        return None
+    
+    def public_ip_monthly_cost(self, region: Optional[str], sku: Optional[str],
+                               allocation_method: Optional[str]) -> Optional[float]:
+        # An unassociated dynamic IP holds no address and is not billed
+        if (allocation_method or 'Dynamic').lower() == 'dynamic':
+            return 0.0
+        return self.price('public_ip', region, sku or 'Basic', allocation_method)
+    
+    def snapshot_monthly_cost(self, region: Optional[str], sku: Optional[str], size_gb: Optional[int]) -> Optional[float]:
+        # Snapshots bill the used size per GiB; the provisioned size makes this an upper bound
+        per_gb = self.price('snapshot', region, sku or 'Standard_LRS', 'per_gb')
+        if per_gb is None or not size_gb:
+            return None
+        return per_gb * size_gb
+    
+    def estimate(self, record: Dict[str, Any]) -> Optional[float]:
+        """Estimated monthly cost of an orphan record (None when the table has no matching price)"""
+        resource_type = record.get('resource_type')
+        if resource_type == 'Managed Disk':
+            monthly = self.disk_monthly_cost(record.get('location'), record.get('sku'), record.get('disk_size_gb'))
+        elif resource_type == 'Public IP':
+            monthly = self.public_ip_monthly_cost(record.get('location'), record.get('sku'), record.get('allocation_method'))
+        elif resource_type == 'Snapshot':
+            monthly = self.snapshot_monthly_cost(record.get('location'), record.get('sku'), record.get('disk_size_gb'))
+        elif resource_type == 'Network Interface':
+            # NICs are free; they only keep other resources around
+            monthly = 0.0
+        else:
+            return None
+        return round(monthly, 2) if monthly is not None else None
+
+
+_default_price_table = None
+_default_price_table_lock = threading.Lock()
+
+
+def get_default_price_table() -> PriceTable:
+    """Shared price table loaded once from ORPHAN_PRICE_TABLE (empty, with a warning, if it cannot be read)"""
+    global _default_price_table
+    with _default_price_table_lock:
+        if _default_price_table is None:
+            try:
+                _default_price_table = PriceTable.load(ORPHAN_PRICE_TABLE)
+                logging.info(f"Loaded price table {_default_price_table.version} ({len(_default_price_table)} prices)")
+            except (OSError, ValueError, KeyError) as e:
+                logging.warning(f"Price table unavailable ({ORPHAN_PRICE_TABLE}), orphan cost estimates disabled: {str(e)}")
+                _default_price_table = PriceTable([])
+        return _default_price_table
+
+
+class SubscriptionClients:
+    """Management clients bound to a single subscription.
+
+    Each subscription scanned during tenant-wide analysis gets its own instance, so
+    parallel workers never overwrite each other's clients. The clients themselves come
+    from the process-wide client cache and are reused across invocations.
     """
-    def decorator(func):
-        def wrapper(*args, **kwargs):
-            last_exception = None
-            
-            for attempt in range(max_retries + 1):
-                try:
-                    return func(*args, **kwargs)
-                    
-                except HttpResponseError as e:
-                    last_exception = e
-                    
-                    # Handle rate limiting (429) and server errors (5xx)
-                    if e.status_code in [429, 500, 502, 503, 504]:
-                        if attempt < max_retries:
-                            # Calculate exponential backoff with jitter
-                            delay = min(base_delay * (2 ** attempt) + random.uniform(0, 1), max_delay)
-                            
-                            logging.warning(
-                                f"API call failed (attempt {attempt + 1}/{max_retries + 1}): "
-                                f"HTTP {e.status_code} - {e.message}. Retrying in {delay:.2f}s"
-                            )
-                            
-                            time.sleep(delay)
-                            continue
-                        else:
-                            logging.error(
-                                f"Max retries ({max_retries}) exceeded for API call. "
-                                f"Final error: HTTP {e.status_code} - {e.message}"
-                            )
-                    else:
-                        # Non-retryable error, fail immediately
-                        logging.error(f"Non-retryable error: HTTP {e.status_code} - {e.message}")
-                        break
-                        
-                except Exception as e:
-                    last_exception = e
-                    if attempt < max_retries:
-                        delay = min(base_delay * (2 ** attempt), max_delay)
-                        logging.warning(f"Unexpected error (attempt {attempt + 1}): {e}. Retrying in {delay:.2f}s")
-                        time.sleep(delay)
-                    else:
-                        logging.error(f"Max retries exceeded. Final error: {e}")
-                        break
-            
-            # Re-raise the last exception if all retries failed
-            raise last_exception
-            
-        return wrapper
-    return decorator
+    
+    def __init__(self, subscription_id: str):
+        self.subscription_id = subscription_id
+        self.compute_client = get_management_client(ComputeManagementClient, subscription_id)
+        self.network_client = get_management_client(NetworkManagementClient, subscription_id)
+        self.advisor_client = get_management_client(AdvisorManagementClient, subscription_id)
+        self.resource_client = get_management_client(ResourceManagementClient, subscription_id)
+
 
 class OrphanedResourceAnalyzer:
     """Analyzes orphaned resources across Azure subscriptions (single or tenant-wide)"""
     
-    def __init__(self, subscription_id: Optional[str] = None):
+    # (collector name, resource type produced, collector method) - independent list calls run concurrently
+    COLLECTORS = [
+        ('public_ips', 'Public IP', 'get_orphaned_public_ips'),
+        ('disks', 'Managed Disk', 'get_orphaned_disks'),
+        ('snapshots', 'Snapshot', 'get_orphaned_snapshots'),
+        ('nics', 'Network Interface', 'get_orphaned_nics'),
+        ('vms_without_ahb', 'VM without AHB', 'get_vms_without_ahb'),
+        ('advisor', 'Advisor Recommendation', 'get_advisor_cost_recommendations'),
+    ]
+    
+    # Record types that include_cost prices; deleting the orphan types saves their whole spend
+    SAVINGS_RESOURCE_TYPES = ('Public IP', 'Managed Disk', 'Snapshot', 'Network Interface')
+    COSTED_RESOURCE_TYPES = SAVINGS_RESOURCE_TYPES + ('VM without AHB',)
+    
+    # Collector name -> per-item mapper shared by the sync and aio scan paths
+    RECORD_MAPPERS = {
+        'public_ips': '_public_ip_record',
+        'disks': '_disk_record',
+        'snapshots': '_snapshot_record',
+        'nics': '_nic_record',
+        'vms_without_ahb': '_vm_record',
+        'advisor': '_advisor_record',
+    }
+    
+    def __init__(self, subscription_id: Optional[str] = None, max_workers: Optional[int] = None,
+                 collector_timeout: Optional[float] = None, backend: Optional[str] = None,
+                 graph_client=None, resource_types: Optional[List[str]] = None,
+                 resource_group: Optional[str] = None, location: Optional[str] = None,
+                 subscription_name: Optional[str] = None,
+                 snapshot_store: Optional[InventorySnapshotStore] = None, progress=None,
+                 price_table: Optional[PriceTable] = None):
         self.subscription_id = subscription_id
-        self.credential = credential
-        self.subscription_client = SubscriptionClient(credential)
+        self.max_workers = _positive_param(max_workers, 'max_workers', DEFAULT_SUBSCRIPTION_SCAN_WORKERS)
+        self.collector_timeout = _positive_param(collector_timeout, 'collector_timeout',
+                                                 DEFAULT_COLLECTOR_TIMEOUT_SECONDS, float)
+        self.backend = (backend or DEFAULT_ORPHAN_SCAN_BACKEND).lower()
+        self.graph_client = graph_client
+        
+        # Query plan: scope pushed down into the collectors so scan cost follows query selectivity
+        self.resource_types = resource_types
+        self.resource_group = resource_group
+        self.location = location.lower() if location else None
+        self.subscription_name = subscription_name
+        
+        # Incremental scans: unchanged subscriptions are served from their last snapshot
+        self.snapshot_store = snapshot_store
+        self._reusable_snapshots = {}
+        self._change_detection = None
+        
+        # Optional callable(event, **details) notified as subscriptions are planned, started and finished
+        self.progress = progress
+        self.price_table = price_table if price_table is not None else get_default_price_table()
+        self._init_clients()
+    
+    def _init_clients(self) -> None:
+        """Sync SDK clients: the shared credential and subscription client, plus the per-subscription
+        clients when a single subscription is analyzed"""
+        self.credential = get_credential()
+        self.subscription_client = get_management_client(SubscriptionClient)
         
         # Initialize subscription-specific clients only if subscription_id is provided
-        if subscription_id:
-            self.compute_client = ComputeManagementClient(credential, subscription_id)
-            self.network_client = NetworkManagementClient(credential, subscription_id)
-            self.advisor_client = AdvisorManagementClient(credential, subscription_id)
-            self.resource_client = ResourceManagementClient(credential, subscription_id)
+        if self.subscription_id:
+            self.compute_client = get_management_client(ComputeManagementClient, self.subscription_id)
+            self.network_client = get_management_client(NetworkManagementClient, self.subscription_id)
+            self.advisor_client = get_management_client(AdvisorManagementClient, self.subscription_id)
+            self.resource_client = get_management_client(ResourceManagementClient, self.subscription_id)
         else:
             # These will be initialized per subscription during tenant-wide analysis
             self.compute_client = None
@@ -101,160 +488,285 @@ class OrphanedResourceAnalyzer:
         subscriptions = []
         try:
             for subscription in self.subscription_client.subscriptions.list():
-                subscriptions.append({
-                    'subscription_id': subscription.subscription_id,
-                    'display_name': subscription.display_name,
-                    'state': subscription.state,
-                    'tenant_id': subscription.tenant_id if hasattr(subscription, 'tenant_id') else 'Unknown'
-                })
+                subscriptions.append(self._subscription_record(subscription))
             logging.info(f"Found {len(subscriptions)} accessible subscriptions")
         except Exception as e:
             logging.error(f"Error fetching subscriptions: {str(e)}")
         
         return subscriptions
     
-    def _initialize_clients_for_subscription(self, subscription_id: str):
-        """Initialize Azure clients for a specific subscription"""
+    @staticmethod
+    def _subscription_record(subscription) -> Dict[str, str]:
+        return {
+            'subscription_id': subscription.subscription_id,
+            'display_name': subscription.display_name,
+            'state': subscription.state,
+            'tenant_id': subscription.tenant_id if hasattr(subscription, 'tenant_id') else 'Unknown'
+        }
+    
+    def _initialize_clients_for_subscription(self, subscription_id: str) -> Optional[SubscriptionClients]:
+        """Create a dedicated set of Azure clients for a specific subscription"""
         try:
-            self.compute_client = ComputeManagementClient(self.credential, subscription_id)
-            self.network_client = NetworkManagementClient(self.credential, subscription_id)
-            self.advisor_client = AdvisorManagementClient(self.credential, subscription_id)
-            self.resource_client = ResourceManagementClient(self.credential, subscription_id)
-            return True
+            return SubscriptionClients(subscription_id)
         except Exception as e:
             logging.error(f"Error initializing clients for subscription {subscription_id}: {str(e)}")
-            return False
-        
-    def get_orphaned_public_ips(self, subscription_id: Optional[str] = None) -> List[Dict[str, Any]]:
-        """Find unattached public IP addresses"""
-        orphaned_ips = []
+            return None
         
+    def iter_orphaned_public_ips(self, subscription_id: Optional[str] = None,
+                                 clients: Optional[SubscriptionClients] = None) -> Iterator[Dict[str, Any]]:
+        """Find unattached public IP addresses (yielded as they are listed)"""
         # Use the provided subscription_id or fall back to instance subscription_id
         current_subscription_id = subscription_id or self.subscription_id
         
-        for ip in self.network_client.public_ip_addresses.list_all():
-            # Check all possible attachment types
-            is_attached = (
-                ip.ip_configuration is not None or  # Attached to Network Interface
-                (hasattr(ip, 'nat_gateway') and ip.nat_gateway is not None) or  # Attached to NAT Gateway
-                (hasattr(ip, 'load_balancer_frontend_ip_configurations') and 
-                 ip.load_balancer_frontend_ip_configurations)  # Attached to Load Balancer
-            )
-            
-            if not is_attached:
-                orphaned_ips.append({
-                    'resource_type': 'Public IP',
-                    'resource_id': ip.id,
-                    'name': ip.name,
-                    'location': ip.location,
-                    'resource_group': ip.id.split('/')[4],
-                    'subscription_id': current_subscription_id,
-                    'sku': ip.sku.name if ip.sku else 'Basic',
-                    'allocation_method': ip.public_ip_allocation_method,
-                    'tags': ip.tags or {}
-                })
+        for ip in self._list_operation('public_ips', clients or self):
+            record = self._public_ip_record(ip, current_subscription_id)
+            if record:
+                yield record
+    
+    def get_orphaned_public_ips(self, subscription_id: Optional[str] = None,
+                                clients: Optional[SubscriptionClients] = None) -> List[Dict[str, Any]]:
+        """Find unattached public IP addresses"""
+        return list(self.iter_orphaned_public_ips(subscription_id, clients))
+    
+    def iter_orphaned_disks(self, subscription_id: Optional[str] = None,
+                            clients: Optional[SubscriptionClients] = None) -> Iterator[Dict[str, Any]]:
+        """Find unattached managed disks (yielded as they are listed)"""
+        # Use the provided subscription_id or fall back to instance subscription_id
+        current_subscription_id = subscription_id or self.subscription_id
         
-        return orphaned_ips
+        for disk in self._list_operation('disks', clients or self):
+            record = self._disk_record(disk, current_subscription_id)
+            if record:
+                yield record
     
-    def get_orphaned_disks(self, subscription_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    def get_orphaned_disks(self, subscription_id: Optional[str] = None,
+                           clients: Optional[SubscriptionClients] = None) -> List[Dict[str, Any]]:
         """Find unattached managed disks"""
-        orphaned_disks = []
-        
+        return list(self.iter_orphaned_disks(subscription_id, clients))
+    
+    def iter_orphaned_snapshots(self, subscription_id: Optional[str] = None,
+                                clients: Optional[SubscriptionClients] = None) -> Iterator[Dict[str, Any]]:
+        """Find old snapshots (older than specified days) (yielded as they are listed)"""
         # Use the provided subscription_id or fall back to instance subscription_id
         current_subscription_id = subscription_id or self.subscription_id
         
-        for disk in self.compute_client.disks.list():
-            if disk.disk_state == 'Unattached':
-                orphaned_disks.append({
-                    'resource_type': 'Managed Disk',
-                    'resource_id': disk.id,
-                    'name': disk.name,
-                    'location': disk.location,
-                    'resource_group': disk.id.split('/')[4],
-                    'subscription_id': current_subscription_id,
-                    'disk_size_gb': disk.disk_size_gb,
-                    'sku': disk.sku.name if disk.sku else 'Unknown',
-                    'tags': disk.tags or {}
-                })
-        
-        return orphaned_disks
+        for snapshot in self._list_operation('snapshots', clients or self):
+            record = self._snapshot_record(snapshot, current_subscription_id)
+            if record:
+                yield record
     
-    def get_orphaned_snapshots(self, subscription_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    def get_orphaned_snapshots(self, subscription_id: Optional[str] = None,
+                               clients: Optional[SubscriptionClients] = None) -> List[Dict[str, Any]]:
         """Find old snapshots (older than specified days)"""
-        snapshots = []
-        
+        return list(self.iter_orphaned_snapshots(subscription_id, clients))
+    
+    def iter_orphaned_nics(self, subscription_id: Optional[str] = None,
+                           clients: Optional[SubscriptionClients] = None) -> Iterator[Dict[str, Any]]:
+        """Find unattached network interfaces (yielded as they are listed)"""
         # Use the provided subscription_id or fall back to instance subscription_id
         current_subscription_id = subscription_id or self.subscription_id
         
-        for snapshot in self.compute_client.snapshots.list():
-            age_days = (datetime.now(snapshot.time_created.tzinfo) - snapshot.time_created).days
-            snapshots.append({
-                'resource_type': 'Snapshot',
-                'resource_id': snapshot.id,
-                'name': snapshot.name,
-                'location': snapshot.location,
-                'resource_group': snapshot.id.split('/')[4],
-                'subscription_id': current_subscription_id,
-                'disk_size_gb': snapshot.disk_size_gb,
-                'age_days': age_days,
-                'created_date': snapshot.time_created.isoformat(),
-                'tags': snapshot.tags or {}
-            })
-        
-        return snapshots
+        for nic in self._list_operation('nics', clients or self):
+            record = self._nic_record(nic, current_subscription_id)
+            if record:
+                yield record
     
-    def get_orphaned_nics(self, subscription_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    def get_orphaned_nics(self, subscription_id: Optional[str] = None,
+                          clients: Optional[SubscriptionClients] = None) -> List[Dict[str, Any]]:
         """Find unattached network interfaces"""
-        orphaned_nics = []
-        
+        return list(self.iter_orphaned_nics(subscription_id, clients))
+    
+    def iter_vms_without_ahb(self, subscription_id: Optional[str] = None,
+                             clients: Optional[SubscriptionClients] = None) -> Iterator[Dict[str, Any]]:
+        """Find VMs not using Azure Hybrid Benefit for eligible OS types only (yielded as they are listed)"""
         # Use the provided subscription_id or fall back to instance subscription_id
         current_subscription_id = subscription_id or self.subscription_id
         
-        for nic in self.network_client.network_interfaces.list_all():
-            if nic.virtual_machine is None:
-                orphaned_nics.append({
-                    'resource_type': 'Network Interface',
-                    'resource_id': nic.id,
-                    'name': nic.name,
-                    'location': nic.location,
-                    'resource_group': nic.id.split('/')[4],
-                    'subscription_id': current_subscription_id,
-                    'tags': nic.tags or {}
-                })
-        
-        return orphaned_nics
+        for vm in self._list_operation('vms_without_ahb', clients or self):
+            record = self._vm_record(vm, current_subscription_id)
+            if record:
+                yield record
     
-    def get_vms_without_ahb(self, subscription_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    def get_vms_without_ahb(self, subscription_id: Optional[str] = None,
+                            clients: Optional[SubscriptionClients] = None) -> List[Dict[str, Any]]:
         """Find VMs not using Azure Hybrid Benefit for eligible OS types only"""
-        vms_without_ahb = []
+        return list(self.iter_vms_without_ahb(subscription_id, clients))
+    
+    def _list_operation(self, name: str, client_set):
+        """Pager for a collector's list call, resource-group scoped when requested (works for sync and aio clients)"""
+        # Each page the pager fetches is counted as an API call of the request
+        hook = diagnostic_response_hook(name)
+        if name == 'public_ips':
+            operations = client_set.network_client.public_ip_addresses
+            return operations.list(self.resource_group, **hook) if self.resource_group else operations.list_all(**hook)
+        if name == 'disks':
+            operations = client_set.compute_client.disks
+            return operations.list_by_resource_group(self.resource_group, **hook) if self.resource_group else operations.list(**hook)
+        if name == 'snapshots':
+            operations = client_set.compute_client.snapshots
+            return operations.list_by_resource_group(self.resource_group, **hook) if self.resource_group else operations.list(**hook)
+        if name == 'nics':
+            operations = client_set.network_client.network_interfaces
+            return operations.list(self.resource_group, **hook) if self.resource_group else operations.list_all(**hook)
+        if name == 'vms_without_ahb':
+            operations = client_set.compute_client.virtual_machines
+            return operations.list(self.resource_group, **hook) if self.resource_group else operations.list_all(**hook)
+        if name == 'advisor':
+            return client_set.advisor_client.recommendations.list(filter="Category eq 'Cost'", **hook)
+        raise ValueError(f"Unknown collector: {name}")
+    
+    def _public_ip_record(self, ip, subscription_id: str) -> Optional[Dict[str, Any]]:
+        """Orphan record for an unattached public IP, or None"""
+        if not self._in_location(ip.location):
+            return None
         
-        # Use the provided subscription_id or fall back to instance subscription_id
-        current_subscription_id = subscription_id or self.subscription_id
+        # Check all possible attachment types
+        is_attached = (
+            ip.ip_configuration is not None or  # Attached to Network Interface
+            (hasattr(ip, 'nat_gateway') and ip.nat_gateway is not None) or  # Attached to NAT Gateway
+            (hasattr(ip, 'load_balancer_frontend_ip_configurations') and 
+             ip.load_balancer_frontend_ip_configurations)  # Attached to Load Balancer
+        )
+        if is_attached:
+            return None
         
-        for vm in self.compute_client.virtual_machines.list_all():
-            # Check if VM is eligible for Azure Hybrid Benefit
-            if not self._is_ahb_eligible(vm):
-                continue
-                
-            license_type = vm.license_type
-            if license_type is None or license_type == '':
-                # Get OS details for better reporting
-                os_info = self._get_vm_os_info(vm)
-                
-                vms_without_ahb.append({
-                    'resource_type': 'VM without AHB',
-                    'resource_id': vm.id,
-                    'name': vm.name,
-                    'location': vm.location,
-                    'resource_group': vm.id.split('/')[4],
-                    'subscription_id': current_subscription_id,
-                    'vm_size': vm.hardware_profile.vm_size,
-                    'os_type': vm.storage_profile.os_disk.os_type,
-                    'os_info': os_info,
-                    'tags': vm.tags or {}
-                })
+        return self._priced({
+            'resource_type': 'Public IP',
+            'resource_id': ip.id,
+            'name': ip.name,
+            'location': ip.location,
+            'resource_group': ip.id.split('/')[4],
+            'subscription_id': subscription_id,
+            'sku': ip.sku.name if ip.sku else 'Basic',
+            'allocation_method': ip.public_ip_allocation_method,
+            'etag': getattr(ip, 'etag', None),
+            'tags': ip.tags or {}
+        })
+    
+    def _disk_record(self, disk, subscription_id: str) -> Optional[Dict[str, Any]]:
+        """Orphan record for an unattached managed disk, or None"""
+        if disk.disk_state != 'Unattached' or not self._in_location(disk.location):
+            return None
+        
+        return self._priced({
+            'resource_type': 'Managed Disk',
+            'resource_id': disk.id,
+            'name': disk.name,
+            'location': disk.location,
+            'resource_group': disk.id.split('/')[4],
+            'subscription_id': subscription_id,
+            'disk_size_gb': disk.disk_size_gb,
+            'sku': disk.sku.name if disk.sku else 'Unknown',
+            'tags': disk.tags or {}
+        })
+    
+    def _snapshot_record(self, snapshot, subscription_id: str) -> Optional[Dict[str, Any]]:
+        """Record for a snapshot with its age, or None outside the location filter"""
+        if not self._in_location(snapshot.location):
+            return None
+        
+        age_days = (datetime.now(snapshot.time_created.tzinfo) - snapshot.time_created).days
+        return self._priced({
+            'resource_type': 'Snapshot',
+            'resource_id': snapshot.id,
+            'name': snapshot.name,
+            'location': snapshot.location,
+            'resource_group': snapshot.id.split('/')[4],
+            'subscription_id': subscription_id,
+            'disk_size_gb': snapshot.disk_size_gb,
+            'sku': snapshot.sku.name if snapshot.sku else 'Standard_LRS',
+            'age_days': age_days,
+            'created_date': snapshot.time_created.isoformat(),
+            'tags': snapshot.tags or {}
+        })
+    
+    def _nic_record(self, nic, subscription_id: str) -> Optional[Dict[str, Any]]:
+        """Orphan record for a network interface without a VM, or None"""
+        if nic.virtual_machine is not None or not self._in_location(nic.location):
+            return None
+        
+        return self._priced({
+            'resource_type': 'Network Interface',
+            'resource_id': nic.id,
+            'name': nic.name,
+            'location': nic.location,
+            'resource_group': nic.id.split('/')[4],
+            'subscription_id': subscription_id,
+            'etag': getattr(nic, 'etag', None),
+            'tags': nic.tags or {}
+        })
+    
+    def _vm_record(self, vm, subscription_id: str) -> Optional[Dict[str, Any]]:
+        """Record for an AHB-eligible VM that has no license type set, or None"""
+        # Check if VM is eligible for Azure Hybrid Benefit
+        if not self._in_location(vm.location) or not self._is_ahb_eligible(vm):
+            return None
+        
+        license_type = vm.license_type
+        if license_type is not None and license_type != '':
+            return None
+        
+        return {
+            'resource_type': 'VM without AHB',
+            'resource_id': vm.id,
+            'name': vm.name,
+            'location': vm.location,
+            'resource_group': vm.id.split('/')[4],
+            'subscription_id': subscription_id,
+            'vm_size': vm.hardware_profile.vm_size,
+            'os_type': vm.storage_profile.os_disk.os_type,
+            # Get OS details for better reporting
+            'os_info': self._get_vm_os_info(vm),
+            'tags': vm.tags or {}
+        }
+    
+    def _priced(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Attach the offline price-table estimate of the record's monthly cost"""
+        record['estimated_monthly_cost'] = self.price_table.estimate(record)
+        return record
+    
+    def _in_location(self, location: Optional[str]) -> bool:
+        """Check a resource location against the requested location filter (if any)"""
+        return not self.location or (location or '').lower() == self.location
+    
+    def active_collectors(self) -> List[Tuple[str, str, str]]:
+        """Collectors the query plan needs; others are skipped instead of scanned and discarded"""
+        collectors = self.COLLECTORS
+        if self.resource_types:
+            collectors = [c for c in collectors if c[1] in self.resource_types]
+        if self.location or self.resource_group:
+            # Advisor records carry no location/resource_group and never survive those filters
+            collectors = [c for c in collectors if c[0] != 'advisor']
+        return collectors
+    
+    def _filter_subscriptions(self, subscriptions: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """Resolve a subscription_name filter to the matching subscription IDs before scanning"""
+        if not self.subscription_name:
+            return subscriptions
         
-        return vms_without_ahb
+        wanted = self.subscription_name.lower()
+        matched = [sub for sub in subscriptions if (sub.get('display_name') or '').lower() == wanted]
+        logging.info(f"Subscription name '{self.subscription_name}' resolved to {len(matched)} of {len(subscriptions)} subscriptions")
+        return matched
+    
+    def _resource_group_exists(self, clients) -> bool:
+        """Skip subscriptions that do not contain the requested resource group (one HEAD call instead of six lists)"""
+        if not self.resource_group:
+            return True
+        try:
+            return bool(clients.resource_client.resource_groups.check_existence(self.resource_group))
+        except Exception as e:
+            logging.warning(f"Could not check resource group {self.resource_group} in subscription {clients.subscription_id}: {str(e)}")
+            return True
+    
+    def query_plan(self) -> Dict[str, Any]:
+        """Describe how the query scope was pushed down into the scan"""
+        return {
+            'collectors': [name for name, _, _ in self.active_collectors()],
+            'resource_group_scoped': bool(self.resource_group),
+            'location': self.location,
+            'subscription_name': self.subscription_name
+        }
     
     def _is_ahb_eligible(self, vm) -> bool:
         """Check if VM is eligible for Azure Hybrid Benefit"""
@@ -335,38 +847,41 @@ class OrphanedResourceAnalyzer:
         except Exception:
             return "Unknown"
     
-    def get_advisor_cost_recommendations(self, subscription_id: Optional[str] = None) -> List[Dict[str, Any]]:
-        """Get Azure Advisor cost optimization recommendations"""
-        recommendations = []
-        
+    def iter_advisor_cost_recommendations(self, subscription_id: Optional[str] = None,
+                                          clients: Optional[SubscriptionClients] = None) -> Iterator[Dict[str, Any]]:
+        """Get Azure Advisor cost optimization recommendations (yielded as they are listed)"""
         # Use the provided subscription_id or fall back to instance subscription_id
         current_subscription_id = subscription_id or self.subscription_id
         
         try:
-            advisor_recs = self.advisor_client.recommendations.list(
-                filter="Category eq 'Cost'"
-            )
-            
-            for rec in advisor_recs:
-                recommendations.append({
-                    'resource_type': 'Advisor Recommendation',
-                    'recommendation_id': rec.id,
-                    'name': rec.name,
-                    'category': rec.category,
-                    'impact': rec.impact,
-                    'risk': rec.risk,
-                    'short_description': rec.short_description.problem if rec.short_description else '',
-                    'solution': rec.short_description.solution if rec.short_description else '',
-                    'impacted_resource': rec.impacted_value,
-                    'resource_id': rec.resource_metadata.resource_id if rec.resource_metadata else '',
-                    'subscription_id': current_subscription_id,
-                    'potential_savings': self._extract_savings(rec.extended_properties) if rec.extended_properties else 0,
-                    'last_updated': rec.last_updated.isoformat() if rec.last_updated else ''
-                })
+            for rec in self._list_operation('advisor', clients or self):
+                yield self._advisor_record(rec, current_subscription_id)
         except Exception as e:
             logging.error(f"Error fetching Advisor recommendations for subscription {current_subscription_id}: {str(e)}")
-        
-        return recommendations
+            raise
+    
+    def _advisor_record(self, rec, subscription_id: str) -> Dict[str, Any]:
+        """Record for an Advisor cost recommendation"""
+        return {
+            'resource_type': 'Advisor Recommendation',
+            'recommendation_id': rec.id,
+            'name': rec.name,
+            'category': rec.category,
+            'impact': rec.impact,
+            'risk': rec.risk,
+            'short_description': rec.short_description.problem if rec.short_description else '',
+            'solution': rec.short_description.solution if rec.short_description else '',
+            'impacted_resource': rec.impacted_value,
+            'resource_id': rec.resource_metadata.resource_id if rec.resource_metadata else '',
+            'subscription_id': subscription_id,
+            'potential_savings': self._extract_savings(rec.extended_properties) if rec.extended_properties else 0,
+            'last_updated': rec.last_updated.isoformat() if rec.last_updated else ''
+        }
+    
+    def get_advisor_cost_recommendations(self, subscription_id: Optional[str] = None,
+                                         clients: Optional[SubscriptionClients] = None) -> List[Dict[str, Any]]:
+        """Get Azure Advisor cost optimization recommendations"""
+        return list(self.iter_advisor_cost_recommendations(subscription_id, clients))
     
     def _extract_savings(self, extended_properties: Dict) -> float:
         """Extract potential savings from extended properties"""
@@ -391,8 +906,18 @@ class OrphanedResourceAnalyzer:
         results = {
             'analysis_date': datetime.now().isoformat(),
             'resources': [],
-            'subscriptions_analyzed': []
+            'subscriptions_analyzed': [],
+            'backend': 'sdk'
         }
+        scan_started_at = datetime.now(timezone.utc)
+        
+        if self.backend == 'resource_graph':
+            try:
+                return self._record_snapshots(self._analyze_with_resource_graph(results), scan_started_at)
+            except Exception as e:
+                # The per-subscription SDK scan remains the fallback when Resource Graph is unavailable
+                logging.warning(f"Resource Graph backend failed, falling back to SDK scan: {str(e)}")
+                results['backend_fallback_reason'] = str(e)
         
         if self.subscription_id:
             # Single subscription analysis
@@ -400,13 +925,18 @@ class OrphanedResourceAnalyzer:
             results['analysis_scope'] = 'single_subscription'
             
             # Collect all orphaned resources for the specific subscription
-            all_resources = []
-            all_resources.extend(self.get_orphaned_public_ips())
-            all_resources.extend(self.get_orphaned_disks())
-            all_resources.extend(self.get_orphaned_snapshots())
-            all_resources.extend(self.get_orphaned_nics())
-            all_resources.extend(self.get_vms_without_ahb())
-            all_resources.extend(self.get_advisor_cost_recommendations())
+            self._load_reusable_snapshots([self.subscription_id])
+            self._report_progress('planned', subscriptions=[{'subscription_id': self.subscription_id, 'display_name': None}])
+            self._report_progress('subscription_started', subscription_id=self.subscription_id)
+            with diagnostic_span('subscription', subscription_id=self.subscription_id):
+                if self.subscription_id in self._reusable_snapshots:
+                    all_resources, all_errors = self._snapshot_records(self.subscription_id), []
+                elif self._resource_group_exists(self):
+                    all_resources, all_errors = self._run_collectors(self.subscription_id)
+                else:
+                    all_resources, all_errors = [], []
+            self._report_progress('subscription_completed', subscription_id=self.subscription_id,
+                                  resources=all_resources, errors=all_errors)
             
             results['resources'] = all_resources
             results['subscriptions_analyzed'] = [self.subscription_id]
@@ -415,47 +945,54 @@ class OrphanedResourceAnalyzer:
             # Tenant-wide analysis across all accessible subscriptions
             results['analysis_scope'] = 'tenant_wide'
             
-            subscriptions = self.get_accessible_subscriptions()
+            subscriptions = self._filter_subscriptions(self.get_accessible_subscriptions())
             all_resources = []
+            all_errors = []
             successful_subscriptions = []
             
-            logging.info(f"Starting tenant-wide analysis across {len(subscriptions)} subscriptions")
+            self._load_reusable_snapshots([sub['subscription_id'] for sub in subscriptions])
+            self._report_progress('planned', subscriptions=subscriptions)
             
-            for sub_info in subscriptions:
-                subscription_id = sub_info['subscription_id']
-                subscription_name = sub_info['display_name']
-                
-                logging.info(f"Analyzing subscription: {subscription_name} ({subscription_id})")
+            worker_count = max(1, min(self.max_workers, len(subscriptions)))
+            logging.info(f"Starting tenant-wide analysis across {len(subscriptions)} subscriptions with {worker_count} workers")
+            
+            with ContextThreadPoolExecutor(max_workers=worker_count, thread_name_prefix='orphan-scan') as executor:
+                futures = [executor.submit(self._track_subscription, sub_info) for sub_info in subscriptions]
                 
-                try:
-                    # Initialize clients for this subscription
-                    if self._initialize_clients_for_subscription(subscription_id):
-                        # Collect orphaned resources for this subscription
-                        sub_resources = []
-                        sub_resources.extend(self.get_orphaned_public_ips(subscription_id))
-                        sub_resources.extend(self.get_orphaned_disks(subscription_id))
-                        sub_resources.extend(self.get_orphaned_snapshots(subscription_id))
-                        sub_resources.extend(self.get_orphaned_nics(subscription_id))
-                        sub_resources.extend(self.get_vms_without_ahb(subscription_id))
-                        sub_resources.extend(self.get_advisor_cost_recommendations(subscription_id))
-                        
-                        # Add subscription display name to each resource
-                        for resource in sub_resources:
-                            resource['subscription_name'] = subscription_name
-                        
-                        all_resources.extend(sub_resources)
-                        successful_subscriptions.append({
+                # Merge in subscription order (not completion order) so output is deterministic
+                for sub_info, future in zip(subscriptions, futures):
+                    subscription_id = sub_info['subscription_id']
+                    subscription_name = sub_info['display_name']
+                    
+                    # A subscription that could not be scanned at all is an error, so the result is partial
+                    try:
+                        sub_result = future.result()
+                    except Exception as e:
+                        logging.error(f"Error analyzing subscription {subscription_id} ({subscription_name}): {str(e)}")
+                        all_errors.append({
                             'subscription_id': subscription_id,
                             'subscription_name': subscription_name,
-                            'resources_found': len(sub_resources)
+                            'error': str(e)
                         })
-                        
-                        logging.info(f"Found {len(sub_resources)} orphaned resources in {subscription_name}")
-                    else:
-                        logging.warning(f"Failed to initialize clients for subscription {subscription_id}")
-                        
-                except Exception as e:
-                    logging.error(f"Error analyzing subscription {subscription_id} ({subscription_name}): {str(e)}")
+                        continue
+                    
+                    if sub_result is None:
+                        all_errors.append({
+                            'subscription_id': subscription_id,
+                            'subscription_name': subscription_name,
+                            'error': 'Failed to initialize clients'
+                        })
+                        continue
+                    
+                    sub_resources, sub_errors = sub_result
+                    all_resources.extend(sub_resources)
+                    all_errors.extend(sub_errors)
+                    successful_subscriptions.append({
+                        'subscription_id': subscription_id,
+                        'subscription_name': subscription_name,
+                        'resources_found': len(sub_resources),
+                        'collector_errors': len(sub_errors)
+                    })
             
             results['resources'] = all_resources
             results['subscriptions_analyzed'] = successful_subscriptions
@@ -464,72 +1001,1543 @@ class OrphanedResourceAnalyzer:
             
             logging.info(f"Tenant-wide analysis completed: {len(all_resources)} total resources across {len(successful_subscriptions)} subscriptions")
         
+        # Collector failures produce a partial result instead of failing the whole analysis
+        results['errors'] = all_errors
+        results['partial'] = bool(all_errors)
+        results['query_plan'] = self.query_plan()
         results['summary'] = self._generate_summary(results['resources'])
         
-        return results
+        return self._record_snapshots(results, scan_started_at)
     
-    def _generate_summary(self, resources: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """Generate summary statistics for orphaned resources"""
-        summary = {
-            'total_resources': len(resources),
-            'by_type': {},
-            'total_potential_savings': 0.0
-        }
+    def _run_collectors(self, subscription_id: str,
+                        clients: Optional[SubscriptionClients] = None) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Run all collectors for one subscription concurrently with per-collector timeout and error isolation"""
+        tasks = [
+            (name, resource_type, lambda method=method: getattr(self, method)(subscription_id, clients))
+            for name, resource_type, method in self.active_collectors()
+        ]
+        return self._run_concurrently(tasks, subscription_id)
+    
+    def _run_concurrently(self, tasks: List[Tuple[str, str, Any]],
+                          subscription_id: Optional[str] = None) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Execute (name, resource_type, callable) collector tasks in parallel, isolating failures and timeouts"""
+        resources = []
+        errors = []
         
-        for resource in resources:
-            res_type = resource.get('resource_type', 'Unknown')
-            summary['by_type'][res_type] = summary['by_type'].get(res_type, 0) + 1
+        executor = ContextThreadPoolExecutor(max_workers=max(1, len(tasks)), thread_name_prefix='orphan-collector')
+        try:
+            futures = [(name, resource_type, executor.submit(self._timed_collector, name, subscription_id, task))
+                       for name, resource_type, task in tasks]
+            
+            # All collectors start together, so one shared deadline bounds each of them
+            wait([future for _, _, future in futures], timeout=self.collector_timeout)
             
-            # Only include potential savings from advisor recommendations
-            if res_type == 'Advisor Recommendation':
-                summary['total_potential_savings'] += resource.get('potential_savings', 0.0)
+            # Merge in collector order so output matches the sequential scan
+            for name, resource_type, future in futures:
+                marker = {}
+                if not future.done():
+                    error = f"Collector timed out after {self.collector_timeout:g}s"
+                elif future.exception() is not None:
+                    error = str(future.exception())
+                    marker = circuit_marker(future.exception())
+                else:
+                    resources.extend(future.result())
+                    continue
+                
+                logging.error(f"Collector '{name}' failed for subscription {subscription_id or 'all'}: {error}")
+                errors.append({
+                    'subscription_id': subscription_id,
+                    'collector': name,
+                    'resource_type': resource_type,
+                    'error': error,
+                    **marker
+                })
+        finally:
+            # Do not block on collectors that overran their timeout
+            executor.shutdown(wait=False, cancel_futures=True)
         
-        return summary
-
-
-def query_resources(query_params: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Main query function for identifying orphaned resources (no cost analysis)
+        return resources, errors
     
-    Parameters:
-    - subscription_id: Azure subscription ID (optional - if not provided, analyzes all subscriptions in tenant)
-    - resource_types: List of resource types to query (optional)
-    - resource_group: Filter by resource group (optional)
-    - location: Filter by location (optional)
-    - subscription_name: Filter by subscription name (optional, only for tenant-wide analysis)
-    """
+    @staticmethod
+    def _timed_collector(name: str, subscription_id: Optional[str], task) -> List[Dict[str, Any]]:
+        """Run one collector task as a diagnostics span and count the records it produced"""
+        with diagnostic_span(f'collector.{name}', subscription_id=subscription_id or 'all'):
+            records = task()
+        count_diagnostic('records', len(records))
+        return records
     
-    subscription_id = query_params.get('subscription_id')
+    def _analyze_with_resource_graph(self, results: Dict[str, Any]) -> Dict[str, Any]:
+        """Run every detector as a server-side Resource Graph query spanning all target subscriptions"""
+        if self.subscription_id:
+            subscriptions = [{'subscription_id': self.subscription_id, 'display_name': None}]
+            results['subscription_id'] = self.subscription_id
+            results['analysis_scope'] = 'single_subscription'
+        else:
+            subscriptions = self._filter_subscriptions(self.get_accessible_subscriptions())
+            results['analysis_scope'] = 'tenant_wide'
+        
+        graph_backend = ResourceGraphOrphanBackend(
+            self.graph_client or get_management_client(ResourceGraphClient), self
+        )
+        subscription_ids = [sub['subscription_id'] for sub in subscriptions]
+        
+        self._load_reusable_snapshots(subscription_ids)
+        self._report_progress('planned', subscriptions=subscriptions)
+        scan_ids = [sub_id for sub_id in subscription_ids if sub_id not in self._reusable_snapshots]
+        
+        tasks = [
+            (name, resource_type, lambda name=name: graph_backend.collect(name, scan_ids))
+            for name, resource_type, _ in self.active_collectors()
+        ] if scan_ids else []
+        all_resources, all_errors = self._run_concurrently(tasks)
+        
+        # Every query failing means Resource Graph itself is unusable - let the caller fall back
+        if scan_ids and tasks and len(all_errors) == len(tasks):
+            raise RuntimeError(all_errors[0]['error'])
+        
+        for sub_id in subscription_ids:
+            if sub_id in self._reusable_snapshots:
+                all_resources.extend(self._snapshot_records(sub_id))
+        
+        results['backend'] = 'resource_graph'
+        results['resources'] = all_resources
+        
+        if self.subscription_id:
+            results['subscriptions_analyzed'] = [self.subscription_id]
+        else:
+            names = {sub['subscription_id'].lower(): sub['display_name'] for sub in subscriptions}
+            counts = {}
+            for resource in all_resources:
+                sub_key = (resource.get('subscription_id') or '').lower()
+                resource['subscription_name'] = names.get(sub_key)
+                counts[sub_key] = counts.get(sub_key, 0) + 1
+            
+            results['subscriptions_analyzed'] = [
+                {
+                    'subscription_id': sub['subscription_id'],
+                    'subscription_name': sub['display_name'],
+                    'resources_found': counts.get(sub['subscription_id'].lower(), 0)
+                }
+                for sub in subscriptions
+            ]
+            results['total_subscriptions'] = len(subscriptions)
+            results['successful_subscriptions'] = len(subscriptions)
+        
+        # Graph queries span all subscriptions at once, so they all finish together
+        by_subscription = {}
+        for resource in all_resources:
+            by_subscription.setdefault((resource.get('subscription_id') or '').lower(), []).append(resource)
+        for sub_id in subscription_ids:
+            self._report_progress('subscription_completed', subscription_id=sub_id,
+                                  resources=by_subscription.get(sub_id.lower(), []), errors=[])
+        
+        results['errors'] = all_errors
+        results['partial'] = bool(all_errors)
+        results['query_plan'] = self.query_plan()
+        results['summary'] = self._generate_summary(results['resources'])
+        
+        logging.info(f"Resource Graph analysis completed: {len(all_resources)} resources across {len(subscriptions)} subscriptions")
+        return results
     
-    # Initialize analyzer - if no subscription_id provided, it will analyze all subscriptions
-    analyzer = OrphanedResourceAnalyzer(subscription_id)
+    def _snapshot_key(self, subscription_id: str) -> str:
+        """Snapshots are per subscription and per query scope, so a narrow scan never overwrites a broad one"""
+        plan = self.query_plan()
+        scope = json.dumps([plan['collectors'], (self.resource_group or '').lower(), plan['location']])
+        return f"{subscription_id.lower()}:{hashlib.sha256(scope.encode('utf-8')).hexdigest()[:16]}"
     
-    # Get all orphaned resources (single subscription or tenant-wide)
-    results = analyzer.analyze_all()
+    @staticmethod
+    def _record_key(record: Dict[str, Any]) -> str:
+        # Several Advisor recommendations can target the same resource
+        return (record.get('recommendation_id') or record.get('resource_id') or '').lower()
     
-    # Apply filters
-    filtered_resources = results['resources']
+    @staticmethod
+    def _content_hash(record: Dict[str, Any]) -> str:
+        """Hash of a record's content, ignoring fields that change without the resource changing"""
+        stable = {k: v for k, v in record.items()
+                  if k not in ('age_days', 'subscription_name', 'etag', 'estimated_monthly_cost')}
+        return hashlib.sha256(json.dumps(stable, sort_keys=True, default=str).encode('utf-8')).hexdigest()
     
-    if query_params.get('resource_types'):
-        resource_types = query_params['resource_types']
-        filtered_resources = [r for r in filtered_resources if r['resource_type'] in resource_types]
+    def _snapshot_records(self, subscription_id: str) -> List[Dict[str, Any]]:
+        """Records from a reusable snapshot, with snapshot age refreshed"""
+        records = []
+        for entry in self._reusable_snapshots[subscription_id]['entries'].values():
+            record = dict(entry['record'])
+            if record.get('created_date'):
+                created = datetime.fromisoformat(record['created_date'])
+                record['age_days'] = (datetime.now(created.tzinfo) - created).days
+            if record.get('resource_type') in self.SAVINGS_RESOURCE_TYPES:
+                # Re-price with the current table; prices may have been refreshed since the snapshot
+                self._priced(record)
+            records.append(record)
+        return records
     
-    if query_params.get('resource_group'):
-        rg = query_params['resource_group'].lower()
-        filtered_resources = [r for r in filtered_resources if r.get('resource_group', '').lower() == rg]
+    def _load_reusable_snapshots(self, subscription_ids: List[str]) -> None:
+        """Find subscriptions whose last snapshot is fresh and has no resource changes since it was taken"""
+        self._reusable_snapshots = {}
+        if self.snapshot_store is None or not subscription_ids:
+            return
+        
+        max_age = timedelta(hours=ORPHAN_SNAPSHOT_MAX_AGE_HOURS)
+        now = datetime.now(timezone.utc)
+        fresh = {}
+        for subscription_id in subscription_ids:
+            snapshot = self.snapshot_store.load(self._snapshot_key(subscription_id))
+            if snapshot and now - datetime.fromisoformat(snapshot['scanned_at']) < max_age:
+                fresh[subscription_id] = snapshot
+        
+        if not fresh:
+            return
+        
+        try:
+            last_changes = self._last_resource_changes(
+                list(fresh), min(datetime.fromisoformat(snap['scanned_at']) for snap in fresh.values())
+            )
+            self._change_detection = 'resource_changes'
+        except Exception as e:
+            # Without a change feed we cannot prove a subscription is unchanged, so rescan everything
+            logging.warning(f"Resource change feed unavailable, running a full scan: {str(e)}")
+            self._change_detection = 'unavailable'
+            return
+        
+        for subscription_id, snapshot in fresh.items():
+            last_change = last_changes.get(subscription_id.lower())
+            if last_change is None or last_change <= datetime.fromisoformat(snapshot['scanned_at']):
+                self._reusable_snapshots[subscription_id] = snapshot
+        
+        logging.info(f"Incremental scan: reusing {len(self._reusable_snapshots)} of {len(subscription_ids)} subscription snapshots")
     
-    if query_params.get('location'):
-        loc = query_params['location'].lower()
-        filtered_resources = [r for r in filtered_resources if r.get('location', '').lower() == loc]
+    def _last_resource_changes(self, subscription_ids: List[str], since: datetime) -> Dict[str, datetime]:
+        """Latest resource change per subscription from the Resource Graph change feed"""
+        graph_backend = ResourceGraphOrphanBackend(
+            self.graph_client or get_management_client(ResourceGraphClient), self
+        )
+        query = f"""resourcechanges
+| extend changeTime = todatetime(properties.changeAttributes.timestamp)
+| where changeTime > datetime({since.strftime('%Y-%m-%dT%H:%M:%SZ')})
+| summarize lastChange = max(changeTime) by subscriptionId"""
+        
+        last_changes = {}
+        for row in graph_backend.query(query, subscription_ids):
+            changed_at = datetime.fromisoformat(str(row['lastChange']).replace('Z', '+00:00'))
+            last_changes[str(row['subscriptionId']).lower()] = changed_at
+        return last_changes
     
-    if query_params.get('subscription_name'):
-        sub_name = query_params['subscription_name'].lower()
-        filtered_resources = [r for r in filtered_resources if r.get('subscription_name', '').lower() == sub_name]
+    def _record_snapshots(self, results: Dict[str, Any], scan_started_at: datetime) -> Dict[str, Any]:
+        """Diff the scan against the previous snapshots (added/resolved/changed) and persist the new ones"""
+        if self.snapshot_store is None:
+            return results
+        
+        analyzed = [
+            sub if isinstance(sub, str) else sub['subscription_id']
+            for sub in results.get('subscriptions_analyzed', [])
+        ]
+        errored = {(error.get('subscription_id') or '*').lower() for error in results.get('errors', [])}
+        
+        records_by_subscription = {}
+        for record in results['resources']:
+            records_by_subscription.setdefault((record.get('subscription_id') or '').lower(), []).append(record)
+        
+        changes = {'added': [], 'resolved': [], 'changed': [], 'unchanged_count': 0}
+        for subscription_id in analyzed:
+            if '*' in errored or subscription_id.lower() in errored:
+                # A partial scan would report every record of a failed collector as resolved
+                continue
+            
+            current = {}
+            for record in records_by_subscription.get(subscription_id.lower(), []):
+                current[self._record_key(record)] = {
+                    'hash': self._content_hash(record),
+                    'etag': record.get('etag'),
+                    'record': record
+                }
+            
+            reused = subscription_id in self._reusable_snapshots
+            previous = self._reusable_snapshots[subscription_id] if reused else \
+                self.snapshot_store.load(self._snapshot_key(subscription_id))
+            previous_entries = (previous or {}).get('entries', {})
+            
+            for key, entry in current.items():
+                old_entry = previous_entries.get(key)
+                if old_entry is None:
+                    changes['added'].append(entry['record'])
+                elif old_entry['hash'] != entry['hash'] or (entry['etag'] and old_entry.get('etag') != entry['etag']):
+                    changes['changed'].append(entry['record'])
+                else:
+                    changes['unchanged_count'] += 1
+            
+            changes['resolved'].extend(
+                entry['record'] for key, entry in previous_entries.items() if key not in current
+            )
+            
+            # Reused snapshots keep their original timestamp so the change window still starts there
+            if not reused:
+                self.snapshot_store.save(self._snapshot_key(subscription_id), {
+                    'scanned_at': scan_started_at.isoformat(),
+                    'entries': current
+                })
+        
+        results['changes'] = changes
+        results['incremental'] = {
+            'reused_subscriptions': len(self._reusable_snapshots),
+            'scanned_subscriptions': len(analyzed) - len(self._reusable_snapshots),
+            'change_detection': self._change_detection
+        }
+        return results
+    
+    def _report_progress(self, event: str, **details) -> None:
+        """Notify the progress callback, if any; a failing callback never fails the scan"""
+        if self.progress is None:
+            return
+        try:
+            self.progress(event, **details)
+        except Exception as e:
+            logging.warning(f"Progress callback failed for event {event}: {str(e)}")
+    
+    def _track_subscription(self, sub_info: Dict[str, str]) -> Optional[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]:
+        """Run _analyze_subscription and report its start and outcome to the progress callback"""
+        subscription_id = sub_info['subscription_id']
+        self._report_progress('subscription_started', subscription_id=subscription_id)
+        
+        try:
+            with diagnostic_span('subscription', subscription_id=subscription_id):
+                sub_result = self._analyze_subscription(sub_info)
+        except Exception as e:
+            self._report_progress('subscription_failed', subscription_id=subscription_id, error=str(e))
+            raise
+        
+        if sub_result is None:
+            self._report_progress('subscription_failed', subscription_id=subscription_id,
+                                  error='Failed to initialize clients')
+        else:
+            self._report_progress('subscription_completed', subscription_id=subscription_id,
+                                  resources=sub_result[0], errors=sub_result[1])
+        return sub_result
+    
+    def _analyze_subscription(self, sub_info: Dict[str, str]) -> Optional[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]:
+        """Collect orphaned resources for one subscription using its own client set (thread-safe)"""
+        subscription_id = sub_info['subscription_id']
+        subscription_name = sub_info['display_name']
+        
+        if subscription_id in self._reusable_snapshots:
+            logging.info(f"No changes in {subscription_name} since its last scan, reusing snapshot")
+            sub_resources = self._snapshot_records(subscription_id)
+            for resource in sub_resources:
+                resource['subscription_name'] = subscription_name
+            return sub_resources, []
+        
+        logging.info(f"Analyzing subscription: {subscription_name} ({subscription_id})")
+        
+        clients = self._initialize_clients_for_subscription(subscription_id)
+        if clients is None:
+            logging.warning(f"Failed to initialize clients for subscription {subscription_id}")
+            return None
+        
+        if not self._resource_group_exists(clients):
+            logging.info(f"Resource group {self.resource_group} not found in {subscription_name}, skipping")
+            return [], []
+        
+        sub_resources, sub_errors = self._run_collectors(subscription_id, clients)
+        
+        # Add subscription display name to each resource
+        for resource in sub_resources:
+            resource['subscription_name'] = subscription_name
+        
+        logging.info(f"Found {len(sub_resources)} orphaned resources in {subscription_name}")
+        return sub_resources, sub_errors
+    
+    def _generate_summary(self, resources: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Generate summary statistics for orphaned resources"""
+        summary = SummaryAccumulator()
+        for resource in resources:
+            summary.add(resource)
+        return summary.to_dict()
+    
+    def iter_analysis(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Stream ('resource', record) and ('error', entry) items as the collectors find them.
+
+        Subscriptions and collectors run on worker threads that feed a bounded queue, so memory
+        stays flat however large the tenant is. Items arrive in completion order, not scan order.
+        Collectors share one deadline per subscription as in _run_concurrently, so one that hangs
+        inside a page is still reported as timed out; its worker closes the pager when the page
+        returns. If every Resource Graph query fails, a ('fallback', {'reason': ...}) item is sent
+        and the SDK collectors take over, skipping records already streamed. Closing the generator
+        stops the workers at their next record.
+        """
+        if self.subscription_id:
+            subscriptions = [{'subscription_id': self.subscription_id, 'display_name': None}]
+        else:
+            subscriptions = self._filter_subscriptions(self.get_accessible_subscriptions())
+        
+        output = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+        stop = threading.Event()
+        finished = object()
+        
+        def emit(item, abandoned: Optional[threading.Event] = None) -> bool:
+            while not stop.is_set() and not (abandoned is not None and abandoned.is_set()):
+                try:
+                    output.put(item, timeout=1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        
+        subscription_names = {} if self.subscription_id else {
+            sub['subscription_id'].lower(): sub['display_name'] for sub in subscriptions
+        }
+        collectors = self.active_collectors()
+        # Keys of Resource Graph records, kept only until one graph query succeeds
+        streamed = set()
+        graph_succeeded = threading.Event()
+        
+        def read(records: Iterator[Dict[str, Any]], abandoned: threading.Event, track: bool):
+            try:
+                for record in records:
+                    if abandoned.is_set():
+                        return
+                    if track and not graph_succeeded.is_set():
+                        streamed.add(self._record_key(record))
+                    elif not track and self._record_key(record) in streamed:
+                        continue
+                    subscription_name = subscription_names.get((record.get('subscription_id') or '').lower())
+                    if subscription_name is not None:
+                        record['subscription_name'] = subscription_name
+                    if not emit(('resource', record), abandoned):
+                        return
+                if track:
+                    graph_succeeded.set()
+                    streamed.clear()
+            finally:
+                # Closing the generator releases its pager and connection
+                close = getattr(records, 'close', None)
+                if close is not None:
+                    close()
+        
+        def stream_collectors(tasks: List[Tuple[str, str, Iterator[Dict[str, Any]]]],
+                              subscription_id: Optional[str], track: bool = False) -> List[Dict[str, Any]]:
+            """Stream (name, resource_type, records) tasks on a bounded pool and return their error entries"""
+            errors = []
+            executor = ContextThreadPoolExecutor(max_workers=max(1, len(tasks)), thread_name_prefix='orphan-collector')
+            try:
+                futures = []
+                for name, resource_type, records in tasks:
+                    abandoned = threading.Event()
+                    futures.append((name, resource_type, abandoned, executor.submit(read, records, abandoned, track)))
+                
+                wait([future for *_, future in futures], timeout=self.collector_timeout)
+                
+                for name, resource_type, abandoned, future in futures:
+                    marker = {}
+                    if not future.done():
+                        abandoned.set()
+                        error = f"Collector timed out after {self.collector_timeout:g}s"
+                    elif future.exception() is not None:
+                        error = str(future.exception())
+                        marker = circuit_marker(future.exception())
+                    else:
+                        continue
+                    
+                    logging.error(f"Collector '{name}' failed for subscription {subscription_id or 'all'}: {error}")
+                    errors.append({
+                        'subscription_id': subscription_id,
+                        'collector': name,
+                        'resource_type': resource_type,
+                        'error': error,
+                        **marker
+                    })
+            finally:
+                # Do not block on collectors that overran their timeout
+                executor.shutdown(wait=False, cancel_futures=True)
+            return errors
+        
+        def scan_subscription(sub_info: Dict[str, str]):
+            if stop.is_set():
+                return
+            subscription_id = sub_info['subscription_id']
+            clients = self._initialize_clients_for_subscription(subscription_id)
+            if clients is None or not self._resource_group_exists(clients):
+                return
+            tasks = [
+                (name, resource_type, getattr(self, method.replace('get_', 'iter_', 1))(subscription_id, clients))
+                for name, resource_type, method in collectors
+            ]
+            for error in stream_collectors(tasks, subscription_id):
+                emit(('error', error))
+        
+        def scan_with_resource_graph() -> bool:
+            """Stream the graph queries; False when every one failed and the SDK scan should take over"""
+            graph_backend = ResourceGraphOrphanBackend(
+                self.graph_client or get_management_client(ResourceGraphClient), self
+            )
+            subscription_ids = [sub['subscription_id'] for sub in subscriptions]
+            tasks = [
+                (name, resource_type, graph_backend.iter_collect(name, subscription_ids))
+                for name, resource_type, _ in collectors
+            ]
+            errors = stream_collectors(tasks, None, track=True)
+            if tasks and len(errors) == len(tasks) and not stop.is_set():
+                logging.warning(f"Resource Graph backend failed, falling back to SDK scan: {errors[0]['error']}")
+                emit(('fallback', {'reason': errors[0]['error']}))
+                return False
+            for error in errors:
+                emit(('error', error))
+            return True
+        
+        def produce():
+            try:
+                if self.backend == 'resource_graph':
+                    try:
+                        if scan_with_resource_graph():
+                            return
+                    except Exception as e:
+                        logging.warning(f"Resource Graph backend failed, falling back to SDK scan: {str(e)}")
+                        emit(('fallback', {'reason': str(e)}))
+                
+                worker_count = max(1, min(self.max_workers, len(subscriptions)))
+                with ContextThreadPoolExecutor(max_workers=worker_count, thread_name_prefix='orphan-scan') as pool:
+                    for future in [pool.submit(scan_subscription, sub) for sub in subscriptions]:
+                        try:
+                            future.result()
+                        except Exception as e:
+                            logging.error(f"Error streaming subscription analysis: {str(e)}")
+            finally:
+                emit(finished)
+        
+        threading.Thread(target=contextvars.copy_context().run, args=(produce,), name='orphan-stream', daemon=True).start()
+        try:
+            while True:
+                item = output.get()
+                if item is finished:
+                    break
+                yield item
+        finally:
+            stop.set()
+
+
+class ResourceGraphOrphanBackend:
+    """Evaluates the orphan detection rules server-side with Azure Resource Graph.
+
+    Each rule is a KQL query over many subscriptions at once, paged with skip tokens, so only
+    the orphaned resources cross the wire instead of the full inventory of every resource type.
+    Rows are mapped into the same record shape produced by the SDK collectors.
+    """
+    
+    PAGE_SIZE = 1000
+    MAX_SUBSCRIPTIONS_PER_QUERY = 1000
+    
+    QUERIES = {
+        'public_ips': """Resources
+| where type =~ 'microsoft.network/publicipaddresses'
+| where isnull(properties.ipConfiguration) and isnull(properties.natGateway)
+| where coalesce(array_length(properties.loadBalancerFrontendIpConfigurations), 0) == 0
+| project id, name, location, subscriptionId, tags,
+    sku = tostring(sku.name),
+    allocationMethod = tostring(properties.publicIPAllocationMethod)""",
+        'disks': """Resources
+| where type =~ 'microsoft.compute/disks'
+| where properties.diskState =~ 'Unattached'
+| project id, name, location, subscriptionId, tags,
+    diskSizeGB = toint(properties.diskSizeGB),
+    sku = tostring(sku.name)""",
+        'snapshots': """Resources
+| where type =~ 'microsoft.compute/snapshots'
+| project id, name, location, subscriptionId, tags,
+    diskSizeGB = toint(properties.diskSizeGB),
+    sku = tostring(sku.name),
+    timeCreated = tostring(properties.timeCreated)""",
+        'nics': """Resources
+| where type =~ 'microsoft.network/networkinterfaces'
+| where isnull(properties.virtualMachine)
+| project id, name, location, subscriptionId, tags""",
+        'vms_without_ahb': """Resources
+| where type =~ 'microsoft.compute/virtualmachines'
+| where isempty(tostring(properties.licenseType))
+| project id, name, location, subscriptionId, tags,
+    vmSize = tostring(properties.hardwareProfile.vmSize),
+    osType = tostring(properties.storageProfile.osDisk.osType),
+    publisher = tostring(properties.storageProfile.imageReference.publisher),
+    offer = tostring(properties.storageProfile.imageReference.offer),
+    imageSku = tostring(properties.storageProfile.imageReference.sku)""",
+        'advisor': """AdvisorResources
+| where type =~ 'microsoft.advisor/recommendations'
+| where properties.category =~ 'Cost'
+| project id, name, subscriptionId,
+    category = tostring(properties.category),
+    impact = tostring(properties.impact),
+    risk = tostring(properties.risk),
+    problem = tostring(properties.shortDescription.problem),
+    solution = tostring(properties.shortDescription.solution),
+    impactedValue = tostring(properties.impactedValue),
+    impactedResourceId = tostring(properties.resourceMetadata.resourceId),
+    extendedProperties = properties.extendedProperties,
+    lastUpdated = tostring(properties.lastUpdated)"""
+    }
+    
+    def __init__(self, graph_client, analyzer: OrphanedResourceAnalyzer):
+        self.graph_client = graph_client
+        self.analyzer = analyzer
+    
+    def collect(self, name: str, subscription_ids: List[str]) -> List[Dict[str, Any]]:
+        """Run one detector query across the given subscriptions and map rows to orphan records"""
+        return list(self.iter_collect(name, subscription_ids))
+    
+    def iter_collect(self, name: str, subscription_ids: List[str]) -> Iterator[Dict[str, Any]]:
+        """Yield orphan records page by page as the detector query returns them"""
+        mapper = getattr(self, f'_map_{name}')
+        for row in self.query(self.scoped_query(name), subscription_ids):
+            record = mapper(row)
+            if record is not None:
+                yield record
+    
+    def scoped_query(self, name: str) -> str:
+        """Push the analyzer's location and resource group filters into the KQL query"""
+        table, _, body = self.QUERIES[name].partition('\n')
+        filters = []
+        if self.analyzer.resource_group:
+            filters.append(f"| where resourceGroup =~ '{self._escape(self.analyzer.resource_group)}'")
+        if self.analyzer.location:
+            filters.append(f"| where location =~ '{self._escape(self.analyzer.location)}'")
+        return '\n'.join([table] + filters + [body])
+    
+    @staticmethod
+    def _escape(value: str) -> str:
+        return value.replace('\\', '\\\\').replace("'", "\\'")
+    
+    def query(self, query: str, subscription_ids: List[str]):
+        """Yield result rows, chunking subscriptions and following skip tokens"""
+        for start in range(0, max(len(subscription_ids), 1), self.MAX_SUBSCRIPTIONS_PER_QUERY):
+            chunk = subscription_ids[start:start + self.MAX_SUBSCRIPTIONS_PER_QUERY] or None
+            skip_token = None
+            
+            while True:
+                with diagnostic_span('graph.query', subscriptions=len(chunk or [])):
+                    response = self.graph_client.resources(QueryRequest(
+                        query=query,
+                        subscriptions=chunk,
+                        options=QueryRequestOptions(
+                            skip_token=skip_token,
+                            top=self.PAGE_SIZE,
+                            result_format='objectArray'
+                        )
+                    ))
+                count_diagnostic('api_calls')
+                count_diagnostic('pages')
+                
+                for row in response.data or []:
+                    yield row
+                
+                skip_token = getattr(response, 'skip_token', None)
+                if not skip_token:
+                    break
+    
+    @staticmethod
+    def _base_record(row: Dict[str, Any], resource_type: str) -> Dict[str, Any]:
+        return {
+            'resource_type': resource_type,
+            'resource_id': row['id'],
+            'name': row.get('name'),
+            'location': row.get('location'),
+            'resource_group': row['id'].split('/')[4],
+            'subscription_id': row.get('subscriptionId')
+        }
+    
+    def _map_public_ips(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        record = self._base_record(row, 'Public IP')
+        record.update({
+            'sku': row.get('sku') or 'Basic',
+            'allocation_method': row.get('allocationMethod'),
+            'tags': row.get('tags') or {}
+        })
+        return self.analyzer._priced(record)
+    
+    def _map_disks(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        record = self._base_record(row, 'Managed Disk')
+        record.update({
+            'disk_size_gb': row.get('diskSizeGB'),
+            'sku': row.get('sku') or 'Unknown',
+            'tags': row.get('tags') or {}
+        })
+        return self.analyzer._priced(record)
+    
+    def _map_snapshots(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        record = self._base_record(row, 'Snapshot')
+        # tostring() of a missing timeCreated is '', so the age is left unknown rather than failing the page
+        time_created = None
+        try:
+            time_created = datetime.fromisoformat(str(row.get('timeCreated') or '').replace('Z', '+00:00'))
+            if time_created.tzinfo is None:
+                time_created = time_created.replace(tzinfo=timezone.utc)
+        except ValueError:
+            logging.warning(f"Snapshot {row['id']} has no valid timeCreated ({row.get('timeCreated')!r})")
+        record.update({
+            'disk_size_gb': row.get('diskSizeGB'),
+            'sku': row.get('sku') or 'Standard_LRS',
+            'age_days': (datetime.now(timezone.utc) - time_created).days if time_created else None,
+            'created_date': time_created.isoformat() if time_created else None,
+            'tags': row.get('tags') or {}
+        })
+        return self.analyzer._priced(record)
+    
+    def _map_nics(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        record = self._base_record(row, 'Network Interface')
+        record['tags'] = row.get('tags') or {}
+        return self.analyzer._priced(record)
+    
+    def _map_vms_without_ahb(self, row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        # Rebuild the SDK model shape so the eligibility rules stay defined in one place
+        image_reference = None
+        if row.get('publisher') or row.get('offer') or row.get('imageSku'):
+            image_reference = SimpleNamespace(
+                publisher=row.get('publisher') or '',
+                offer=row.get('offer') or '',
+                sku=row.get('imageSku') or ''
+            )
+        vm = SimpleNamespace(
+            name=row.get('name'),
+            storage_profile=SimpleNamespace(
+                os_disk=SimpleNamespace(os_type=row.get('osType') or None),
+                image_reference=image_reference
+            )
+        )
+        
+        if not self.analyzer._is_ahb_eligible(vm):
+            return None
+        
+        record = self._base_record(row, 'VM without AHB')
+        record.update({
+            'vm_size': row.get('vmSize'),
+            'os_type': row.get('osType'),
+            'os_info': self.analyzer._get_vm_os_info(vm),
+            'tags': row.get('tags') or {}
+        })
+        return record
+    
+    def _map_advisor(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        extended_properties = row.get('extendedProperties') or {}
+        return {
+            'resource_type': 'Advisor Recommendation',
+            'recommendation_id': row['id'],
+            'name': row.get('name'),
+            'category': row.get('category'),
+            'impact': row.get('impact'),
+            'risk': row.get('risk') or None,
+            'short_description': row.get('problem') or '',
+            'solution': row.get('solution') or '',
+            'impacted_resource': row.get('impactedValue'),
+            'resource_id': row.get('impactedResourceId') or '',
+            'subscription_id': row.get('subscriptionId'),
+            'potential_savings': self.analyzer._extract_savings(extended_properties) if extended_properties else 0,
+            'last_updated': row.get('lastUpdated') or ''
+        }
+
+
+class AsyncSubscriptionClients:
+    """aio management clients for one subscription; an async context manager that closes them after the scan"""
+    
+    def __init__(self, subscription_id: str, credential):
+        self.subscription_id = subscription_id
+        policies = async_client_policies()
+        self.compute_client = AsyncComputeManagementClient(credential, subscription_id, **policies)
+        self.network_client = AsyncNetworkManagementClient(credential, subscription_id, **policies)
+        self.advisor_client = AsyncAdvisorManagementClient(credential, subscription_id, **policies)
+        self.resource_client = AsyncResourceManagementClient(credential, subscription_id, **policies)
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        await asyncio.gather(
+            self.compute_client.close(), self.network_client.close(),
+            self.advisor_client.close(), self.resource_client.close(),
+            return_exceptions=True
+        )
+
+
+class AsyncOrphanedResourceAnalyzer(OrphanedResourceAnalyzer):
+    """OrphanedResourceAnalyzer on the aio SDK clients: every list call is awaited on one event loop.
+
+    Shares the query plan and record mapping of the sync analyzer; analyze_all() is a coroutine.
+    Only the SDK backend is available here (no Resource Graph, snapshots or progress callbacks).
+    Transient failures and 429s are retried per HTTP call by AsyncBudgetedRetryPolicy, which
+    honors Retry-After, draws on the request's retry budget and sleeps with asyncio.
+    """
+    
+    def __init__(self, subscription_id: Optional[str] = None, max_workers: Optional[int] = None,
+                 collector_timeout: Optional[float] = None, resource_types: Optional[List[str]] = None,
+                 resource_group: Optional[str] = None, location: Optional[str] = None,
+                 subscription_name: Optional[str] = None, credential=None,
+                 price_table: Optional[PriceTable] = None):
+        max_workers = _positive_param(max_workers, 'max_workers', DEFAULT_ASYNC_SCAN_CONCURRENCY)
+        super().__init__(subscription_id, max_workers=max_workers,
+                         collector_timeout=collector_timeout, backend='sdk', resource_types=resource_types,
+                         resource_group=resource_group, location=location, subscription_name=subscription_name,
+                         price_table=price_table)
+        self.credential = credential
+    
+    def _init_clients(self) -> None:
+        # aio clients are bound to the running loop, so analyze_all opens them per scan
+        pass
+    
+    async def analyze_all(self) -> Dict[str, Any]:
+        """Analyze orphaned resources (single subscription or tenant-wide) with concurrent aio calls"""
+        results = {
+            'analysis_date': datetime.now().isoformat(),
+            'resources': [],
+            'subscriptions_analyzed': [],
+            'backend': 'sdk',
+            'execution': 'async'
+        }
+        
+        # An aio credential is bound to the running loop, so one is opened per scan unless supplied
+        owns_credential = self.credential is None
+        aio_credential = self.credential or AsyncDefaultAzureCredential()
+        try:
+            if self.subscription_id:
+                results['subscription_id'] = self.subscription_id
+                results['analysis_scope'] = 'single_subscription'
+                subscriptions = [{'subscription_id': self.subscription_id, 'display_name': None}]
+            else:
+                results['analysis_scope'] = 'tenant_wide'
+                subscriptions = self._filter_subscriptions(await self._list_subscriptions(aio_credential))
+            
+            logging.info(f"Starting async analysis across {len(subscriptions)} subscriptions (concurrency {self.max_workers})")
+            semaphore = asyncio.Semaphore(self.max_workers)
+            outcomes = await asyncio.gather(
+                *(self._analyze_subscription_async(sub_info, aio_credential, semaphore) for sub_info in subscriptions),
+                return_exceptions=True
+            )
+        finally:
+            if owns_credential:
+                await aio_credential.close()
+        
+        all_resources = []
+        all_errors = []
+        successful_subscriptions = []
+        
+        # Merge in subscription order (not completion order) so output matches the sync scan
+        for sub_info, outcome in zip(subscriptions, outcomes):
+            if isinstance(outcome, BaseException):
+                logging.error(f"Error analyzing subscription {sub_info['subscription_id']} ({sub_info['display_name']}): {str(outcome)}")
+                all_errors.append({
+                    'subscription_id': sub_info['subscription_id'],
+                    'subscription_name': sub_info['display_name'],
+                    'error': str(outcome)
+                })
+                continue
+            
+            sub_resources, sub_errors = outcome
+            all_resources.extend(sub_resources)
+            all_errors.extend(sub_errors)
+            successful_subscriptions.append({
+                'subscription_id': sub_info['subscription_id'],
+                'subscription_name': sub_info['display_name'],
+                'resources_found': len(sub_resources),
+                'collector_errors': len(sub_errors)
+            })
+        
+        results['resources'] = all_resources
+        if self.subscription_id:
+            results['subscriptions_analyzed'] = [self.subscription_id]
+        else:
+            results['subscriptions_analyzed'] = successful_subscriptions
+            results['total_subscriptions'] = len(subscriptions)
+            results['successful_subscriptions'] = len(successful_subscriptions)
+        
+        results['errors'] = all_errors
+        results['partial'] = bool(all_errors)
+        results['query_plan'] = self.query_plan()
+        results['summary'] = self._generate_summary(all_resources)
+        
+        logging.info(f"Async analysis completed: {len(all_resources)} total resources across {len(successful_subscriptions)} subscriptions")
+        return results
+    
+    async def _list_subscriptions(self, aio_credential) -> List[Dict[str, str]]:
+        """Get all subscriptions accessible to the credential"""
+        subscriptions = []
+        try:
+            async with AsyncSubscriptionClient(aio_credential, **async_client_policies()) as subscription_client:
+                async for subscription in subscription_client.subscriptions.list():
+                    subscriptions.append(self._subscription_record(subscription))
+            logging.info(f"Found {len(subscriptions)} accessible subscriptions")
+        except Exception as e:
+            logging.error(f"Error fetching subscriptions: {str(e)}")
+        
+        return subscriptions
+    
+    async def _analyze_subscription_async(self, sub_info: Dict[str, str], aio_credential,
+                                          semaphore: asyncio.Semaphore) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Collect orphaned resources for one subscription; the semaphore bounds subscriptions in flight"""
+        subscription_id = sub_info['subscription_id']
+        subscription_name = sub_info['display_name']
+        
+        async with semaphore:
+            with diagnostic_span('subscription', subscription_id=subscription_id):
+                async with AsyncSubscriptionClients(subscription_id, aio_credential) as clients:
+                    if not await self._resource_group_exists_async(clients):
+                        logging.info(f"Resource group {self.resource_group} not found in {subscription_name}, skipping")
+                        return [], []
+                    
+                    sub_resources, sub_errors = await self._run_collectors_async(subscription_id, clients)
+        
+        if subscription_name is not None:
+            for resource in sub_resources:
+                resource['subscription_name'] = subscription_name
+        
+        return sub_resources, sub_errors
+    
+    async def _resource_group_exists_async(self, clients: AsyncSubscriptionClients) -> bool:
+        if not self.resource_group:
+            return True
+        try:
+            return bool(await clients.resource_client.resource_groups.check_existence(self.resource_group))
+        except Exception as e:
+            logging.warning(f"Could not check resource group {self.resource_group} in subscription {clients.subscription_id}: {str(e)}")
+            return True
+    
+    async def _run_collectors_async(self, subscription_id: str,
+                                    clients: AsyncSubscriptionClients) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Run all collectors for one subscription concurrently with per-collector timeout and error isolation"""
+        collectors = self.active_collectors()
+        outcomes = await asyncio.gather(
+            *(asyncio.wait_for(self._collect_async(name, subscription_id, clients), self.collector_timeout)
+              for name, _, _ in collectors),
+            return_exceptions=True
+        )
+        
+        resources = []
+        errors = []
+        for (name, resource_type, _), outcome in zip(collectors, outcomes):
+            if isinstance(outcome, asyncio.TimeoutError):
+                error = f"Collector timed out after {self.collector_timeout:g}s"
+            elif isinstance(outcome, BaseException):
+                error = str(outcome)
+            else:
+                resources.extend(outcome)
+                continue
+            
+            logging.error(f"Collector '{name}' failed for subscription {subscription_id}: {error}")
+            errors.append({
+                'subscription_id': subscription_id,
+                'collector': name,
+                'resource_type': resource_type,
+                'error': error,
+                **circuit_marker(outcome)
+            })
+        
+        return resources, errors
+    
+    async def _collect_async(self, name: str, subscription_id: str,
+                             clients: AsyncSubscriptionClients) -> List[Dict[str, Any]]:
+        """Page through one collector's list call (async iteration fetches pages on demand)"""
+        to_record = getattr(self, self.RECORD_MAPPERS[name])
+        records = []
+        with diagnostic_span(f'collector.{name}', subscription_id=subscription_id):
+            async for item in self._list_operation(name, clients):
+                record = to_record(item, subscription_id)
+                if record:
+                    records.append(record)
+        count_diagnostic('records', len(records))
+        return records
+
+
+def query_resources(query_params: Dict[str, Any], progress=None) -> Dict[str, Any]:
+    """
+    Main query function for identifying orphaned resources (no cost analysis)
+    
+    Parameters:
+    - subscription_id: Azure subscription ID (optional - if not provided, analyzes all subscriptions in tenant)
+    - resource_types: List of resource types to query (optional)
+    - resource_group: Filter by resource group (optional)
+    - location: Filter by location (optional)
+    - subscription_name: Filter by subscription name (optional, only for tenant-wide analysis)
+    - max_workers: Number of subscriptions scanned in parallel (optional, tenant-wide only)
+    - collector_timeout: Seconds each collector may run before it is reported as an error (optional)
+    - backend: Detection backend, 'sdk' (default) or 'resource_graph' (optional, falls back to 'sdk' on failure)
+    - mode: 'full' (default) or 'delta' - delta returns only orphans added/resolved since the last snapshot
+    - incremental: Persist snapshots and reuse unchanged subscriptions without returning a delta (optional)
+    - page_size: Return results in pages of this size; 'page.next_cursor' fetches the next page (optional)
+    - order_by: Order results by a record field, one of ScanResultStore.ORDERABLE_FIELDS, e.g. disk_size_gb,
+      age_days, potential_savings (optional). The scan is sorted in full once, and later pages are slices of it
+    - order: 'desc' (default) or 'asc' (optional, with order_by)
+    - cursor: Opaque cursor from a previous page; served from the materialized scan without rescanning
+    - include_cost: Join each record's actual spend ('cost') from one ResourceId-grouped cost query per
+      subscription; orphans also get 'potential_savings' (spend projected to a year) (optional)
+    - cost_days: Trailing days of spend used by include_cost (optional, default 30)
+    - diagnostics: Add a '_diagnostics' section with timing spans (collectors, subscriptions, cost queries,
+      retries, backoff) and counters (API calls, pages, records) for this request (optional)
+    """
+    with request_diagnostics('analyze', query_params):
+        if query_params.get('cursor'):
+            page = _page_from_cursor(query_params['cursor'])
+            attach_diagnostics(page, query_params)
+            return page
+        
+        mode = query_params.get('mode', 'full')
+        if mode not in ('full', 'delta'):
+            raise ValueError(f"Invalid mode: {mode}. Valid modes: full, delta")
+        _validate_scan_params(query_params)
+        incremental = mode == 'delta' or bool(query_params.get('incremental'))
+        cost_window = _resource_cost_window(query_params) if query_params.get('include_cost') else None
+        
+        # Initialize analyzer - if no subscription_id provided, it will analyze all subscriptions
+        analyzer = _analyzer_from_params(query_params, get_default_snapshot_store() if incremental else None, progress)
+        
+        # Get orphaned resources within the planned scope (single subscription or tenant-wide)
+        results = analyzer.analyze_all()
+        
+        if mode == 'delta':
+            changes = results.pop('changes')
+            results['resolved'] = _filter_resources(changes['resolved'], query_params)
+            results['changed'] = _filter_resources(changes['changed'], query_params)
+            results['resources'] = changes['added']
+            results['delta'] = {
+                'added': 0,
+                'resolved': len(results['resolved']),
+                'changed': len(results['changed']),
+                'unchanged': changes['unchanged_count']
+            }
+        
+        filtered_resources = _filter_resources(results['resources'], query_params)
+        if mode == 'delta':
+            results['delta']['added'] = len(filtered_resources)
+        
+        results['resources'] = filtered_resources
+        if cost_window:
+            _attach_resource_costs(results, *cost_window)
+        results['summary'] = analyzer._generate_summary(filtered_resources)
+        results['price_table'] = analyzer.price_table.info()
+        
+        if query_params.get('page_size') or query_params.get('order_by'):
+            results = _paginate_results(results, query_params)
+        
+        attach_diagnostics(results, query_params)
+        return results
+
+
+async def query_resources_async(query_params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    query_resources on the aio SDK clients. Accepts the same filters, max_workers (subscriptions
+    in flight), collector_timeout, page_size, order_by, order, cursor, include_cost and cost_days; mode 'delta',
+    incremental scans and the Resource Graph backend are only available on the sync path.
+    """
+    with request_diagnostics('analyze', query_params):
+        if query_params.get('cursor'):
+            page = _page_from_cursor(query_params['cursor'])
+            attach_diagnostics(page, query_params)
+            return page
+        
+        if query_params.get('mode', 'full') != 'full' or query_params.get('incremental'):
+            raise ValueError("The async path only supports mode 'full' without incremental snapshots")
+        if (query_params.get('backend') or 'sdk').lower() != 'sdk':
+            raise ValueError("The async path only supports backend 'sdk'")
+        _validate_scan_params(query_params)
+        cost_window = _resource_cost_window(query_params) if query_params.get('include_cost') else None
+        
+        analyzer = AsyncOrphanedResourceAnalyzer(
+            query_params.get('subscription_id'),
+            max_workers=query_params.get('max_workers'),
+            collector_timeout=query_params.get('collector_timeout'),
+            resource_types=query_params.get('resource_types'),
+            resource_group=query_params.get('resource_group'),
+            location=query_params.get('location'),
+            subscription_name=query_params.get('subscription_name')
+        )
+        
+        results = await analyzer.analyze_all()
+        
+        filtered_resources = _filter_resources(results['resources'], query_params)
+        results['resources'] = filtered_resources
+        if cost_window:
+            await _attach_resource_costs_async(results, *cost_window)
+        results['summary'] = analyzer._generate_summary(filtered_resources)
+        results['price_table'] = analyzer.price_table.info()
+        
+        if query_params.get('page_size') or query_params.get('order_by'):
+            results = _paginate_results(results, query_params)
+        
+        attach_diagnostics(results, query_params)
+        return results
+
+
+def _positive_param(value: Any, name: str, default, cast=int):
+    """A request setting as a positive int (or float); `default` when unset, ValueError naming it otherwise"""
+    if value is None or value == '':
+        return default
+    try:
+        number = cast(value) if not isinstance(value, bool) else None
+    except (TypeError, ValueError):
+        number = None
+    if number is None or not number > 0 or (cast is int and number != float(value)):
+        kind = 'integer' if cast is int else 'number'
+        raise ValueError(f"{name} must be a positive {kind}, got {value!r}")
+    return number
+
+
+def _validate_scan_params(query_params: Dict[str, Any]) -> None:
+    """Reject malformed numeric scan settings and orderings before any scan work (or background job) starts"""
+    for name, cast in (('max_workers', int), ('collector_timeout', float), ('page_size', int), ('cost_days', int)):
+        _positive_param(query_params.get(name), name, None, cast)
+    _check_ordering(query_params.get('order_by'), _requested_order(query_params))
+
+
+def _requested_order(query_params: Dict[str, Any]) -> str:
+    return str(query_params.get('order') or 'desc').lower()
+
+
+def _check_ordering(order_by: Any, order: Any) -> None:
+    """ValueError unless order_by is an orderable record field (or None) and order is asc/desc"""
+    if order not in ('asc', 'desc'):
+        raise ValueError(f"Invalid order: {order}. Valid values: asc, desc")
+    if order_by and (not isinstance(order_by, str) or order_by not in ScanResultStore.ORDERABLE_FIELDS):
+        raise ValueError(f"Invalid order_by: {order_by}. Valid fields: {', '.join(ScanResultStore.ORDERABLE_FIELDS)}")
+
+
+def _paginate_results(results: Dict[str, Any], query_params: Dict[str, Any]) -> Dict[str, Any]:
+    """Materialize a finished scan and return its first page (ordered if requested)"""
+    order = _requested_order(query_params)
+    _check_ordering(query_params.get('order_by'), order)
+    
+    page_size = _positive_param(query_params.get('page_size'), 'page_size', len(results['resources']) or 1)
+    
+    scan_id = _scan_result_store.put(results)
+    return _build_page(results, scan_id, 0, page_size, query_params.get('order_by'), order)
+
+
+def _page_from_cursor(cursor: str) -> Dict[str, Any]:
+    """Serve the page a cursor points at from its materialized scan"""
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+        scan_id = position['scan_id']
+        offset = position['offset']
+        page_size = position['page_size']
+        order_by = position.get('order_by')
+        order = position.get('order', 'desc')
+        if not isinstance(offset, int) or isinstance(offset, bool) or offset < 0:
+            raise ValueError("offset must be a non-negative integer")
+        if not isinstance(page_size, int) or isinstance(page_size, bool) or page_size < 1:
+            raise ValueError("page_size must be a positive integer")
+        _check_ordering(order_by, order)
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        raise ValueError(f"Invalid cursor: {str(e)}")
+    
+    results = _scan_result_store.get(scan_id)
+    if results is None:
+        raise ValueError("Cursor has expired or belongs to another instance; run the query again without a cursor")
+    
+    return _build_page(results, scan_id, offset, page_size, order_by, order)
+
+
+def _build_page(results: Dict[str, Any], scan_id: str, offset: int, page_size: int,
+                order_by: Optional[str], order: str) -> Dict[str, Any]:
+    """Slice one page out of a materialized scan, in the order the store sorted it once"""
+    resources = _scan_result_store.ordered(scan_id, order_by, order)
+    if resources is None:
+        raise ValueError("Cursor has expired or belongs to another instance; run the query again without a cursor")
+    page = resources[offset:offset + page_size]
+    
+    next_offset = offset + len(page)
+    next_cursor = None
+    if next_offset < len(resources):
+        next_cursor = base64.urlsafe_b64encode(json.dumps({
+            'scan_id': scan_id,
+            'offset': next_offset,
+            'page_size': page_size,
+            'order_by': order_by,
+            'order': order
+        }).encode('utf-8')).decode('ascii')
+    
+    paged_results = {key: value for key, value in results.items() if key != 'resources'}
+    paged_results['resources'] = page
+    paged_results['page'] = {
+        'offset': offset,
+        'page_size': page_size,
+        'returned': len(page),
+        'total_resources': len(resources),
+        'order_by': order_by,
+        'order': order,
+        'next_cursor': next_cursor
+    }
+    return paged_results
+
+
+def _analyzer_from_params(query_params: Dict[str, Any],
+                          snapshot_store: Optional[InventorySnapshotStore] = None,
+                          progress=None) -> OrphanedResourceAnalyzer:
+    """Build an analyzer whose query plan carries the request filters, so unrequested collectors,
+    subscriptions and resource groups are never scanned"""
+    return OrphanedResourceAnalyzer(
+        query_params.get('subscription_id'),
+        max_workers=query_params.get('max_workers'),
+        collector_timeout=query_params.get('collector_timeout'),
+        backend=query_params.get('backend'),
+        resource_types=query_params.get('resource_types'),
+        resource_group=query_params.get('resource_group'),
+        location=query_params.get('location'),
+        subscription_name=query_params.get('subscription_name'),
+        snapshot_store=snapshot_store,
+        progress=progress
+    )
+
+
+def _filter_resources(resources: List[Dict[str, Any]], query_params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Apply query filters in memory (a cheap safety net - the scan itself is already scoped)"""
+    return [r for r in resources if _resource_matches(r, query_params)]
+
+
+def _resource_matches(resource: Dict[str, Any], query_params: Dict[str, Any]) -> bool:
+    """Check one record against the resource_types, resource_group, location and subscription_name filters"""
+    if query_params.get('resource_types') and resource['resource_type'] not in query_params['resource_types']:
+        return False
+    
+    if query_params.get('resource_group'):
+        if resource.get('resource_group', '').lower() != query_params['resource_group'].lower():
+            return False
+    
+    if query_params.get('location'):
+        if resource.get('location', '').lower() != query_params['location'].lower():
+            return False
+    
+    if query_params.get('subscription_name'):
+        if resource.get('subscription_name', '').lower() != query_params['subscription_name'].lower():
+            return False
+    
+    return True
+
+
+def _resource_cost_window(query_params: Dict[str, Any]) -> Tuple[datetime, datetime]:
+    """Whole-day window of the last cost_days days (day-aligned so repeated scans hit the cost cache)"""
+    days = _positive_param(query_params.get('cost_days'), 'cost_days', DEFAULT_ORPHAN_COST_DAYS)
+    
+    today = datetime.now(timezone.utc).date()
+    start_date = datetime.combine(today - timedelta(days=days - 1), datetime.min.time())
+    end_date = datetime.combine(today, datetime.max.time()).replace(microsecond=0)
+    return start_date, end_date
+
+
+def _resource_cost_requests(resources: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+    """Resource IDs of the costed record types, grouped by subscription (one cost query each)"""
+    requests = {}
+    for resource in resources:
+        if resource.get('resource_type') in OrphanedResourceAnalyzer.COSTED_RESOURCE_TYPES and resource.get('resource_id'):
+            requests.setdefault(resource['subscription_id'], []).append(resource['resource_id'])
+    return requests
+
+
+def _attach_resource_costs(results: Dict[str, Any], start_date: datetime, end_date: datetime) -> None:
+    """Price the records with one ResourceId-grouped cost query per subscription, run concurrently"""
+    requests = _resource_cost_requests(results['resources'])
+    totals = {}
+    if requests:
+        with ContextThreadPoolExecutor(max_workers=min(COST_SCOPE_FANOUT_WORKERS, len(requests))) as executor:
+            outcomes = executor.map(
+                lambda item: CostManagementAnalyzer(item[0]).get_resource_cost_totals(item[1], start_date, end_date),
+                requests.items()
+            )
+            totals = dict(zip(requests, outcomes))
+    
+    _join_resource_costs(results, totals, start_date, end_date)
+
+
+async def _attach_resource_costs_async(results: Dict[str, Any], start_date: datetime, end_date: datetime) -> None:
+    """_attach_resource_costs on one shared aio Cost Management client"""
+    requests = _resource_cost_requests(results['resources'])
+    totals = {}
+    if requests:
+        async with AsyncDefaultAzureCredential() as aio_credential:
+            cost_policies = async_client_policies(retry_throttled=False)
+            async with AsyncCostManagementClient(aio_credential, **cost_policies) as cost_client:
+                CostManagementAnalyzer._add_client_type_header(cost_client)
+                outcomes = await asyncio.gather(*(
+                    AsyncCostManagementAnalyzer(subscription_id, credential=aio_credential, cost_client=cost_client)
+                    .get_resource_cost_totals(resource_ids, start_date, end_date)
+                    for subscription_id, resource_ids in requests.items()
+                ))
+        totals = dict(zip(requests, outcomes))
+    
+    _join_resource_costs(results, totals, start_date, end_date)
+
+
+def _join_resource_costs(results: Dict[str, Any], totals: Dict[str, Dict[str, Any]],
+                         start_date: datetime, end_date: datetime) -> None:
+    """Hash-join per-subscription cost totals into the records by lower-cased resource ID"""
+    days = (end_date.date() - start_date.date()).days + 1
+    errors = [{'subscription_id': subscription_id, **outcome}
+              for subscription_id, outcome in totals.items() if 'error' in outcome]
+    
+    for resource in results['resources']:
+        outcome = totals.get(resource.get('subscription_id'))
+        if resource.get('resource_type') not in OrphanedResourceAnalyzer.COSTED_RESOURCE_TYPES or not outcome or 'error' in outcome:
+            continue
+        
+        # No usage rows in the window means the resource cost nothing
+        cost = outcome['costs'].get(resource['resource_id'].lower(), 0.0)
+        resource['cost'] = cost
+        if resource['resource_type'] in OrphanedResourceAnalyzer.SAVINGS_RESOURCE_TYPES:
+            # Annualized, the same unit as Advisor's annualSavingsAmount
+            resource['potential_savings'] = cost * 365 / days
+    
+    currencies = list(dict.fromkeys(outcome['currency'] for outcome in totals.values() if outcome.get('currency')))
+    results['cost'] = {
+        'start': start_date.isoformat(),
+        'end': end_date.isoformat(),
+        'days': days,
+        'currency': currencies[0] if len(currencies) == 1 else currencies or 'USD',
+        'queries': len(totals),
+        'complete': not errors and all(outcome.get('complete', False) for outcome in totals.values()),
+        'errors': errors
+    }
+
+
+def stream_query_resources(query_params: Dict[str, Any]) -> Iterator[str]:
+    """
+    Streaming variant of query_resources producing NDJSON lines
+    
+    Each matching orphan is written as soon as a collector finds it ({"record_type": "resource", ...}),
+    collector failures as {"record_type": "error", ...}, and a trailing {"record_type": "summary", ...}
+    record carries the incrementally computed summary and, like the JSON response, the list of errors.
+    When the Resource Graph backend fails, the scan falls back to the SDK collectors as /analyze does
+    and the summary reports backend 'sdk' with backend_fallback_reason. Delta mode is not available
+    when streaming.
+    
+    Parameters are validated before the stream is returned, so a bad request raises ValueError
+    here instead of failing after the response has started.
+    """
+    if query_params.get('mode', 'full') != 'full':
+        raise ValueError("Streaming output only supports mode 'full'")
+    if query_params.get('include_cost'):
+        raise ValueError("include_cost needs the complete orphan set and is not available when streaming")
+    
+    return _stream_records(_analyzer_from_params(query_params), query_params)
+
+
+def _stream_records(analyzer: OrphanedResourceAnalyzer, query_params: Dict[str, Any]) -> Iterator[str]:
+    summary = SummaryAccumulator()
+    errors = []
+    fallback = {}
+    
+    for kind, item in analyzer.iter_analysis():
+        if kind == 'error':
+            errors.append(item)
+            yield _ndjson_line({'record_type': 'error', **item})
+        elif kind == 'fallback':
+            fallback = {'backend': 'sdk', 'backend_fallback_reason': item['reason']}
+        elif _resource_matches(item, query_params):
+            summary.add(item)
+            yield _ndjson_line({'record_type': 'resource', **item})
+    
+    yield _ndjson_line({
+        'record_type': 'summary',
+        'analysis_date': datetime.now().isoformat(),
+        'analysis_scope': 'single_subscription' if analyzer.subscription_id else 'tenant_wide',
+        'backend': analyzer.backend,
+        **fallback,
+        'query_plan': analyzer.query_plan(),
+        'errors': errors,
+        'partial': bool(errors),
+        'summary': summary.to_dict()
+    })
+
+
+def _ndjson_line(record: Dict[str, Any]) -> str:
+    return json.dumps(record, separators=(',', ':'), default=str) + '\n'
+
+
+class AnalysisJobTracker:
+    """Progress callback that keeps an async job's per-subscription state current in its JobStore.
+
+    Writes are throttled to one per ORPHAN_JOB_PERSIST_INTERVAL_SECONDS except for state changes
+    of the job itself, so a tenant with hundreds of subscriptions does not rewrite the job per event.
+    Each completed subscription's resources are written once, as their own partial-result entry.
+    """
+    
+    def __init__(self, job: Dict[str, Any], store: JobStore):
+        self.job = job
+        self.store = store
+        self._lock = threading.Lock()
+        self._last_persist = 0.0
+    
+    def __call__(self, event: str, **details) -> None:
+        with self._lock:
+            subscriptions = self.job['subscriptions']
+            
+            if event == 'planned':
+                self.job['subscriptions'] = {
+                    sub['subscription_id']: {'subscription_name': sub.get('display_name'), 'state': 'pending'}
+                    for sub in details['subscriptions']
+                }
+            else:
+                subscription_id = details['subscription_id']
+                entry = subscriptions.setdefault(subscription_id, {'subscription_name': None})
+                
+                if event == 'subscription_started':
+                    entry['state'] = 'running'
+                elif event == 'subscription_completed':
+                    entry['state'] = 'completed'
+                    entry['resources_found'] = len(details['resources'])
+                    entry['collector_errors'] = len(details['errors'])
+                    self._save_partial(subscription_id, details['resources'])
+                elif event == 'subscription_failed':
+                    entry['state'] = 'failed'
+                    entry['error'] = details.get('error')
+            
+            self._persist(force=event == 'planned')
+    
+    def start(self) -> None:
+        with self._lock:
+            self.job['status'] = 'running'
+            self.job['started_at'] = datetime.now(timezone.utc).isoformat()
+            self._persist(force=True)
+    
+    def finish(self, result: Dict[str, Any]) -> None:
+        with self._lock:
+            self.job['status'] = 'succeeded'
+            self.job['result'] = result
+            self.job['completed_at'] = datetime.now(timezone.utc).isoformat()
+            self._persist(force=True)
+        
+        try:
+            self.store.delete_partials(self.job['job_id'])
+        except Exception as e:
+            logging.warning(f"Failed to drop partial results of job {self.job['job_id']}: {str(e)}")
+    
+    def fail(self, error: str) -> None:
+        # Resources from completed subscriptions are kept so the caller can still read a partial result
+        with self._lock:
+            self.job['status'] = 'failed'
+            self.job['error'] = error
+            self.job['completed_at'] = datetime.now(timezone.utc).isoformat()
+            self._persist(force=True)
+    
+    def _save_partial(self, subscription_id: str, resources: List[Dict[str, Any]]) -> None:
+        try:
+            self.store.save_partial(self.job['job_id'], subscription_id, resources)
+        except Exception as e:
+            logging.error(f"Failed to persist partial results of job {self.job['job_id']} "
+                          f"for subscription {subscription_id}: {str(e)}")
+    
+    def _persist(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._last_persist < ORPHAN_JOB_PERSIST_INTERVAL_SECONDS:
+            return
+        
+        entries = list(self.job['subscriptions'].values())
+        states = [entry.get('state') for entry in entries]
+        self.job['progress'] = {
+            'total_subscriptions': len(states),
+            'pending': states.count('pending'),
+            'running': states.count('running'),
+            'completed': states.count('completed'),
+            'failed': states.count('failed'),
+            'resources_found': sum(entry.get('resources_found', 0) for entry in entries)
+        }
+        self.job['updated_at'] = datetime.now(timezone.utc).isoformat()
+        
+        try:
+            self.store.save(self.job)
+            self._last_persist = now
+        except Exception as e:
+            logging.error(f"Failed to persist job {self.job['job_id']}: {str(e)}")
+
+
+_job_executor = None
+_job_executor_lock = threading.Lock()
+
+
+def _get_job_executor() -> ThreadPoolExecutor:
+    """Shared background executor for async jobs, bounded by ORPHAN_JOB_WORKERS"""
+    global _job_executor
+    with _job_executor_lock:
+        if _job_executor is None:
+            _job_executor = ThreadPoolExecutor(max_workers=max(1, ORPHAN_JOB_WORKERS), thread_name_prefix='orphan-job')
+        return _job_executor
+
+
+def start_analysis_job(query_params: Dict[str, Any], job_store: Optional[JobStore] = None) -> Dict[str, Any]:
+    """Queue an orphaned resources scan in the background and return its job record immediately.
+
+    Accepts the same parameters as query_resources (except 'cursor').
+    """
+    if query_params.get('cursor'):
+        raise ValueError("Jobs always run a new scan; fetch further pages from /analyze with the cursor")
+    mode = query_params.get('mode', 'full')
+    if mode not in ('full', 'delta'):
+        raise ValueError(f"Invalid mode: {mode}. Valid modes: full, delta")
+    _validate_scan_params(query_params)
+    
+    store = job_store or get_default_job_store()
+    now = datetime.now(timezone.utc).isoformat()
+    job = {
+        'job_id': f"{uuid.uuid4().hex}-{_INSTANCE_TAG}",
+        'status': 'queued',
+        'created_at': now,
+        'updated_at': now,
+        'started_at': None,
+        'completed_at': None,
+        'request': query_params,
+        'progress': {},
+        'subscriptions': {},
+        'result': None,
+        'error': None
+    }
+    store.save(job)
+    
+    # The worker owns the live job dict from here on; the caller gets the queued state
+    queued = dict(job)
+    _get_job_executor().submit(_run_analysis_job, job, store)
+    logging.info(f"Queued orphaned resources job {job['job_id']}")
+    return queued
+
+
+def _run_analysis_job(job: Dict[str, Any], store: JobStore) -> None:
+    tracker = AnalysisJobTracker(job, store)
+    tracker.start()
+    
+    try:
+        result = query_resources(job['request'], progress=tracker)
+    except Exception as e:
+        logging.error(f"Orphaned resources job {job['job_id']} failed: {str(e)}")
+        tracker.fail(str(e))
+        return
+    
+    tracker.finish(result)
+    logging.info(f"Orphaned resources job {job['job_id']} completed")
+
+
+def get_analysis_job(job_id: str, include_partial: bool = False,
+                     job_store: Optional[JobStore] = None) -> Optional[Dict[str, Any]]:
+    """Current state of a job; with include_partial, unfinished jobs carry the resources found so far.
+
+    Raises JobNotOnThisInstanceError when the store is local and the job was started on another instance.
+    """
+    store = job_store or get_default_job_store()
+    job = store.load(job_id)
+    if job is None:
+        if not store.shared and '-' in job_id and job_id.rsplit('-', 1)[1] != _INSTANCE_TAG:
+            raise JobNotOnThisInstanceError(job_id)
+        return None
+    
+    # A running job that stopped reporting most likely lost its worker (instance recycled or scaled in)
+    if job['status'] == 'running':
+        updated_at = datetime.fromisoformat(job['updated_at'])
+        if (datetime.now(timezone.utc) - updated_at).total_seconds() > ORPHAN_JOB_STALE_SECONDS:
+            job['status'] = 'abandoned'
+            job['error'] = f"No progress for over {ORPHAN_JOB_STALE_SECONDS}s; the worker was likely recycled"
     
-    results['resources'] = filtered_resources
-    results['summary'] = analyzer._generate_summary(filtered_resources)
+    if include_partial and job['result'] is None:
+        partial_resources = store.load_partials(job_id)
+        resources = _filter_resources(
+            [resource for sub_resources in partial_resources.values() for resource in sub_resources],
+            job['request']
+        )
+        summary = SummaryAccumulator()
+        for resource in resources:
+            summary.add(resource)
+        job['partial_result'] = {
+            'resources': resources,
+            'summary': summary.to_dict(),
+            'partial': True
+        }
     
-    return results
+    return job
 
 
 @app.function_name(name="OrphanedResourcesAnalyzer")
@@ -544,10 +2552,62 @@ def analyze_orphaned_resources(req: func.HttpRequest) -> func.HttpResponse:
         req_body = req.get_json()
         logging.info(f"Request body: {json.dumps(req_body)}")
         
-        results = query_resources(req_body)
+        with request_diagnostics('analyze', req_body):
+            if req_body.get('output') == 'ndjson':
+                # Buffered NDJSON for hosts without HTTP streaming; /analyze/stream sends lines as they are found
+                body = ''.join(stream_query_resources(req_body))
+                count_diagnostic('bytes_serialized', len(body))
+                return func.HttpResponse(
+                    body=body,
+                    mimetype="application/x-ndjson",
+                    status_code=200
+                )
+            
+            results = query_resources(req_body)
+            body = json.dumps(results, indent=2)
+            count_diagnostic('bytes_serialized', len(body))
+        
+        return func.HttpResponse(
+            body=body,
+            mimetype="application/json",
+            status_code=200
+        )
+        
+    except ValueError as e:
+        logging.error(f"Invalid request: {str(e)}")
+        return func.HttpResponse(
+            body=json.dumps({'error': f'Invalid request: {str(e)}'}),
+            mimetype="application/json",
+            status_code=400
+        )
+    except Exception as e:
+        logging.error(f"Error processing request: {str(e)}")
+        return func.HttpResponse(
+            body=json.dumps({'error': str(e)}),
+            mimetype="application/json",
+            status_code=500
+        )
+
+
+@app.function_name(name="OrphanedResourcesAnalyzerAsync")
+@app.route(route="analyze/async", methods=["POST"], auth_level=func.AuthLevel.FUNCTION)
+async def analyze_orphaned_resources_async(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    HTTP trigger for /analyze on the aio SDK clients (no worker thread held per Azure call)
+    """
+    logging.info('Orphaned Resources Analyzer async function triggered')
+    
+    try:
+        req_body = req.get_json()
+        logging.info(f"Request body: {json.dumps(req_body)}")
+        
+        with request_diagnostics('analyze', req_body):
+            results = await query_resources_async(req_body)
+            body = json.dumps(results, indent=2)
+            count_diagnostic('bytes_serialized', len(body))
         
         return func.HttpResponse(
-            body=json.dumps(results, indent=2),
+            body=body,
             mimetype="application/json",
             status_code=200
         )
@@ -568,6 +2628,111 @@ def analyze_orphaned_resources(req: func.HttpRequest) -> func.HttpResponse:
         )
 
 
+@app.function_name(name="OrphanedResourcesAnalyzerStartJob")
+@app.route(route="analyze/jobs", methods=["POST"], auth_level=func.AuthLevel.FUNCTION)
+def start_orphaned_resources_job(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    HTTP trigger queuing a long (e.g. tenant-wide) scan as a background job; poll analyze/jobs/{job_id}
+    """
+    logging.info('Orphaned Resources Analyzer job submission triggered')
+    
+    try:
+        req_body = req.get_json()
+        logging.info(f"Request body: {json.dumps(req_body)}")
+        
+        job = start_analysis_job(req_body)
+        
+        return func.HttpResponse(
+            body=json.dumps({
+                'job_id': job['job_id'],
+                'status': job['status'],
+                'created_at': job['created_at'],
+                'status_url': f"/api/analyze/jobs/{job['job_id']}"
+            }, indent=2),
+            mimetype="application/json",
+            status_code=202
+        )
+        
+    except ValueError as e:
+        logging.error(f"Invalid request: {str(e)}")
+        return func.HttpResponse(
+            body=json.dumps({'error': f'Invalid request: {str(e)}'}),
+            mimetype="application/json",
+            status_code=400
+        )
+    except Exception as e:
+        logging.error(f"Error submitting job: {str(e)}")
+        return func.HttpResponse(
+            body=json.dumps({'error': str(e)}),
+            mimetype="application/json",
+            status_code=500
+        )
+
+
+@app.function_name(name="OrphanedResourcesAnalyzerJobStatus")
+@app.route(route="analyze/jobs/{job_id}", methods=["GET"], auth_level=func.AuthLevel.FUNCTION)
+def get_orphaned_resources_job(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    HTTP trigger returning job status, per-subscription progress and the final result
+    (add ?include_partial=true for resources found so far while the job is unfinished)
+    """
+    job_id = req.route_params.get('job_id')
+    include_partial = req.params.get('include_partial', 'false').lower() == 'true'
+    
+    try:
+        job = get_analysis_job(job_id, include_partial=include_partial)
+        
+        if job is None:
+            return func.HttpResponse(
+                body=json.dumps({'error': f'Job {job_id} not found'}),
+                mimetype="application/json",
+                status_code=404
+            )
+        
+        return func.HttpResponse(
+            body=json.dumps(job, indent=2, default=str),
+            mimetype="application/json",
+            status_code=200
+        )
+        
+    except JobNotOnThisInstanceError as e:
+        logging.warning(str(e))
+        return func.HttpResponse(
+            body=json.dumps({'error': str(e)}),
+            mimetype="application/json",
+            status_code=409
+        )
+    except Exception as e:
+        logging.error(f"Error reading job {job_id}: {str(e)}")
+        return func.HttpResponse(
+            body=json.dumps({'error': str(e)}),
+            mimetype="application/json",
+            status_code=500
+        )
+
+
+if HTTP_STREAMING_ENABLED:
+    from azurefunctions.extensions.http.fastapi import JSONResponse, Request, Response, StreamingResponse
+    
+    @app.function_name(name="OrphanedResourcesAnalyzerStream")
+    @app.route(route="analyze/stream", methods=["POST"], auth_level=func.AuthLevel.FUNCTION)
+    async def analyze_orphaned_resources_stream(req: Request) -> Response:
+        """
+        HTTP trigger streaming orphaned resources as NDJSON while the scan is running
+        """
+        logging.info('Orphaned Resources Analyzer streaming function triggered')
+        
+        req_body = await req.json()
+        logging.info(f"Request body: {json.dumps(req_body)}")
+        
+        try:
+            lines = stream_query_resources(req_body)
+        except ValueError as e:
+            return JSONResponse({'error': str(e)}, status_code=400)
+        
+        return StreamingResponse(lines, media_type="application/x-ndjson")
+
+
 # Example query for testing
 @app.function_name(name="GetOrphanedResourcesExample")
 @app.route(route="example", methods=["GET"], auth_level=func.AuthLevel.FUNCTION)
@@ -584,10 +2749,46 @@ def example_query(req: func.HttpRequest) -> func.HttpResponse:
         "tenant_wide_analysis": {
             "resource_types": ["Public IP", "Managed Disk"],
             "location": "eastus",
-            "subscription_name": "Production Subscription"
+            "subscription_name": "Production Subscription",
+            "max_workers": 8
         },
         "all_resources_all_subscriptions": {
             "description": "Analyze all resource types across all subscriptions in the tenant"
+        },
+        "paged_by_savings": {
+            "description": "First page of 50 ordered by potential savings; pass page.next_cursor as 'cursor' for the next page",
+            "page_size": 50,
+            "order_by": "potential_savings"
+        },
+        "next_page": {
+            "cursor": "<page.next_cursor from the previous response>"
+        },
+        "async_tenant_job": {
+            "description": "POST to /analyze/jobs to run a long tenant-wide scan in the background; poll GET /analyze/jobs/{job_id}?include_partial=true",
+            "max_workers": 16
+        },
+        "streaming_ndjson": {
+            "description": "NDJSON output: one line per orphan, trailing summary line (POST /analyze/stream streams it when ORPHAN_HTTP_STREAMING_ENABLED=true)",
+            "output": "ndjson"
+        },
+        "delta_since_last_scan": {
+            "description": "Return only orphans added or resolved since the previous scan of the same scope",
+            "mode": "delta"
+        },
+        "resource_graph_tenant_scan": {
+            "description": "Evaluate orphan rules server-side with Azure Resource Graph (falls back to the SDK scan)",
+            "backend": "resource_graph"
+        },
+        "with_diagnostics": {
+            "description": "Add a _diagnostics section with per-collector/subscription timings and API call, page and record counters",
+            "subscription_id": "your-subscription-id",
+            "diagnostics": True
+        },
+        "orphans_with_actual_cost": {
+            "description": "Join each orphan's actual spend over the last 30 days (one cost query per subscription) and rank by it",
+            "include_cost": True,
+            "cost_days": 30,
+            "order_by": "cost"
         }
     }
     
@@ -613,10 +2814,13 @@ def cost_analysis_direct_query(req: func.HttpRequest) -> func.HttpResponse:
         req_body = req.get_json()
         logging.info(f"Request body: {json.dumps(req_body)}")
         
-        results = query_cost_management_direct(req_body)
+        with request_diagnostics('cost_analysis', req_body):
+            results = query_cost_management_direct(req_body)
+            body = json.dumps(results, indent=2)
+            count_diagnostic('bytes_serialized', len(body))
         
         return func.HttpResponse(
-            body=json.dumps(results, indent=2),
+            body=body,
             mimetype="application/json",
             status_code=200
         )
@@ -637,593 +2841,43 @@ def cost_analysis_direct_query(req: func.HttpRequest) -> func.HttpResponse:
         )
 
 
-class CostManagementAnalyzer:
-    """Direct Azure Cost Management and Billing API analyzer"""
-    
-    def __init__(self, subscription_id: str):
-        self.subscription_id = subscription_id
-        self.credential = credential
-        
-        # Initialize Cost Management Client with custom headers to avoid 429 rate limiting
-        self.cost_client = CostManagementClient(credential)
-        
-        # Add custom ClientType header to bypass rate limiting (as per Microsoft documentation)
-        # https://learn.microsoft.com/en-us/answers/questions/1340993/exception-429-too-many-requests-for-azure-cost-man
-        if hasattr(self.cost_client, '_client') and hasattr(self.cost_client._client, '_config'):
-            # Add custom header to all requests
-            custom_headers = getattr(self.cost_client._client._config, 'headers', {})
-            custom_headers['ClientType'] = 'AwesomeType'
-            self.cost_client._client._config.headers = custom_headers
-            logging.info("Added ClientType header to Cost Management client to avoid rate limiting")
-        
-        self.resource_client = ResourceManagementClient(credential, subscription_id)
-    
-    def get_subscription_costs(self, start_date: datetime, end_date: datetime, 
-                             granularity: str = "Daily") -> Dict[str, Any]:
-        """Get total subscription costs with breakdown"""
-        try:
-            scope = f"/subscriptions/{self.subscription_id}"
-            
-            query_body = {
-                "type": "ActualCost",
-                "timeframe": "Custom",
-                "timePeriod": {
-                    "from": start_date.isoformat(),
-                    "to": end_date.isoformat()
-                },
-                "dataset": {
-                    "granularity": granularity,
-                    "aggregation": {
-                        "totalCost": {
-                            "name": "Cost",
-                            "function": "Sum"
-                        },
-                        "totalCostUSD": {
-                            "name": "CostUSD", 
-                            "function": "Sum"
-                        }
-                    },
-                    "grouping": [
-                        {
-                            "type": "Dimension",
-                            "name": "ServiceName"
-                        },
-                        {
-                            "type": "Dimension", 
-                            "name": "ResourceLocation"
-                        }
-                    ]
-                }
-            }
-            
-            result = self.cost_client.query.usage(scope, query_body)
-            
-            return self._process_cost_result(result, "subscription")
-            
-        except Exception as e:
-            logging.error(f"Error fetching subscription costs: {str(e)}")
-            return {"error": str(e)}
-    
-    def get_resource_group_costs(self, resource_group: str, start_date: datetime, 
-                               end_date: datetime, granularity: str = "Daily") -> Dict[str, Any]:
-        """Get costs for a specific resource group"""
-        try:
-            scope = f"/subscriptions/{self.subscription_id}/resourceGroups/{resource_group}"
-            
-            query_body = {
-                "type": "ActualCost",
-                "timeframe": "Custom", 
-                "timePeriod": {
-                    "from": start_date.isoformat(),
-                    "to": end_date.isoformat()
-                },
-                "dataset": {
-                    "granularity": granularity,
-                    "aggregation": {
-                        "totalCost": {
-                            "name": "Cost",
-                            "function": "Sum"
-                        }
-                    },
-                    "grouping": [
-                        {
-                            "type": "Dimension",
-                            "name": "ResourceId"
-                        },
-                        {
-                            "type": "Dimension",
-                            "name": "ServiceName"
-                        }
-                    ]
-                }
-            }
-            
-            result = self.cost_client.query.usage(scope, query_body)
-            
-            return self._process_cost_result(result, "resource_group", resource_group)
-            
-        except Exception as e:
-            logging.error(f"Error fetching resource group costs: {str(e)}")
-            return {"error": str(e)}
-    
-    def get_resource_costs_by_service(self, service_names: List[str], start_date: datetime,
-                                    end_date: datetime) -> Dict[str, Any]:
-        """Get costs filtered by Azure service names"""
-        try:
-            scope = f"/subscriptions/{self.subscription_id}"
-            
-            query_body = {
-                "type": "ActualCost",
-                "timeframe": "Custom",
-                "timePeriod": {
-                    "from": start_date.isoformat(),
-                    "to": end_date.isoformat()
-                },
-                "dataset": {
-                    "granularity": "Daily",
-                    "aggregation": {
-                        "totalCost": {
-                            "name": "Cost",
-                            "function": "Sum"
-                        }
-                    },
-                    "filter": {
-                        "dimensions": {
-                            "name": "ServiceName",
-                            "operator": "In",
-                            "values": service_names
-                        }
-                    },
-                    "grouping": [
-                        {
-                            "type": "Dimension",
-                            "name": "ResourceId"
-                        },
-                        {
-                            "type": "Dimension",
-                            "name": "ServiceName"
-                        },
-                        {
-                            "type": "Dimension",
-                            "name": "ResourceLocation"
-                        }
-                    ]
-                }
-            }
-            
-            result = self.cost_client.query.usage(scope, query_body)
-            
-            return self._process_cost_result(result, "service_filter", service_names)
-            
-        except Exception as e:
-            logging.error(f"Error fetching service costs: {str(e)}")
-            return {"error": str(e)}
-    
-    def get_top_cost_resources(self, start_date: datetime, end_date: datetime, 
-                             top_n: int = 10) -> Dict[str, Any]:
-        """Get top N most expensive resources"""
-        try:
-            scope = f"/subscriptions/{self.subscription_id}"
-            
-            query_body = {
-                "type": "ActualCost",
-                "timeframe": "Custom",
-                "timePeriod": {
-                    "from": start_date.isoformat(),
-                    "to": end_date.isoformat()
-                },
-                "dataset": {
-                    "granularity": "None",
-                    "aggregation": {
-                        "totalCost": {
-                            "name": "Cost",
-                            "function": "Sum"
-                        }
-                    },
-                    "grouping": [
-                        {
-                            "type": "Dimension",
-                            "name": "ResourceId"
-                        },
-                        {
-                            "type": "Dimension",
-                            "name": "ServiceName"
-                        }
-                    ],
-                    "sorting": [
-                        {
-                            "direction": "Descending",
-                            "name": "Cost"
-                        }
-                    ]
-                },
-                "top": top_n
-            }
-            
-            result = self.cost_client.query.usage(scope, query_body)
-            
-            return self._process_cost_result(result, "top_resources", top_n)
-            
-        except Exception as e:
-            logging.error(f"Error fetching top cost resources: {str(e)}")
-            return {"error": str(e)}
-    
-    def get_budget_analysis(self, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
-        """Get budget vs actual spending analysis"""
-        try:
-            # Get actual costs
-            actual_costs = self.get_subscription_costs(start_date, end_date, "Monthly")
-            
-            # Get budgets (if any are configured)
-            budgets = []
-            try:
-                scope = f"/subscriptions/{self.subscription_id}"
-                budget_list = list(self.cost_client.budgets.list(scope))
-                
-                for budget in budget_list:
-                    budgets.append({
-                        "name": budget.name,
-                        "amount": budget.amount,
-                        "current_spend": budget.current_spend.amount if budget.current_spend else 0,
-                        "forecasted_spend": budget.forecasted_spend.amount if budget.forecasted_spend else 0,
-                        "time_grain": budget.time_grain,
-                        "category": budget.category
-                    })
-            except Exception as e:
-                logging.warning(f"Could not fetch budgets: {str(e)}")
-            
-            return {
-                "subscription_id": self.subscription_id,
-                "period": {
-                    "start": start_date.isoformat(),
-                    "end": end_date.isoformat()
-                },
-                "actual_costs": actual_costs,
-                "budgets": budgets,
-                "analysis_date": datetime.now().isoformat()
-            }
-            
-        except Exception as e:
-            logging.error(f"Error in budget analysis: {str(e)}")
-            return {"error": str(e)}
-    
-    def get_cost_by_location(self, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
-        """Get costs broken down by Azure regions"""
-        try:
-            scope = f"/subscriptions/{self.subscription_id}"
-            
-            query_body = {
-                "type": "ActualCost",
-                "timeframe": "Custom",
-                "timePeriod": {
-                    "from": start_date.isoformat(),
-                    "to": end_date.isoformat()
-                },
-                "dataset": {
-                    "granularity": "None",
-                    "aggregation": {
-                        "totalCost": {
-                            "name": "Cost",
-                            "function": "Sum"
-                        }
-                    },
-                    "grouping": [
-                        {
-                            "type": "Dimension",
-                            "name": "ResourceLocation"
-                        },
-                        {
-                            "type": "Dimension",
-                            "name": "ServiceName"
-                        }
-                    ],
-                    "sorting": [
-                        {
-                            "direction": "Descending",
-                            "name": "Cost"
-                        }
-                    ]
-                }
-            }
-            
-            result = self.cost_client.query.usage(scope, query_body)
-            
-            return self._process_cost_result(result, "by_location")
-            
-        except Exception as e:
-            logging.error(f"Error fetching costs by location: {str(e)}")
-            return {"error": str(e)}
-    
-    def _process_cost_result(self, result, analysis_type: str, metadata: Any = None) -> Dict[str, Any]:
-        """Process cost query results into structured format"""
-        processed_result = {
-            "subscription_id": self.subscription_id,
-            "analysis_type": analysis_type,
-            "metadata": metadata,
-            "total_cost": 0.0,
-            "currency": "USD",
-            "rows": [],
-            "columns": []
-        }
-        
-        if hasattr(result, 'columns') and result.columns:
-            processed_result["columns"] = [col.name for col in result.columns]
-        
-        if hasattr(result, 'rows') and result.rows:
-            total_cost = 0.0
-            
-            for row in result.rows:
-                if row and len(row) > 0:
-                    # First column is usually the cost
-                    cost = float(row[0]) if row[0] else 0.0
-                    total_cost += cost
-                    
-                    processed_row = {
-                        "cost": cost,
-                        "data": row[1:] if len(row) > 1 else []
-                    }
-                    processed_result["rows"].append(processed_row)
-            
-            processed_result["total_cost"] = total_cost
-        
-        return processed_result
-    
-    def get_specific_resources_cost(self, resource_ids: List[str], start_date: datetime,
-                                  end_date: datetime) -> Dict[str, Any]:
-        """Get costs for specific resource IDs using individual queries with rate limiting"""
-        results = {
-            "subscription_id": self.subscription_id,
-            "period": {
-                "start": start_date.isoformat(),
-                "end": end_date.isoformat()
-            },
-            "resources": [],
-            "total_cost": 0.0
-        }
-        
-        logging.info(f"Querying costs for {len(resource_ids)} resources individually to ensure accuracy")
-        
-        return self._get_individual_resource_costs(resource_ids, start_date, end_date, results)
-    
-    def _get_individual_resource_costs(self, resource_ids: List[str], start_date: datetime,
-                                     end_date: datetime, results: Dict[str, Any]) -> Dict[str, Any]:
-        """Primary method: Query each resource individually with aggressive rate limiting and retry logic"""
-        logging.warning("Falling back to individual resource queries due to batch query failure")
-        
-        import time
-        
-        # Split large resource lists into smaller batches to reduce rate limiting
-        batch_size = 3  # Process max 3 resources at a time
-        if len(resource_ids) > batch_size:
-            logging.info(f"Processing {len(resource_ids)} resources in batches of {batch_size} to avoid rate limits")
-        
-        # Circuit breaker for consecutive rate limit failures
-        consecutive_rate_limits = 0
-        max_consecutive_rate_limits = 3
-        
-        for i, resource_id in enumerate(resource_ids):
-            # Add modest delay with ClientType header fix - much reduced delays
-            if i > 0:
-                # Modest rate limiting with ClientType header: 2s base + 0.5s per resource, max 10s
-                delay = min(2.0 + (i * 0.5), 10.0)  
-                logging.info(f"Rate limiting delay: {delay:.1f}s before querying resource {i+1}/{len(resource_ids)}")
-                time.sleep(delay)
-            
-            # Retry logic for each individual resource with extended retries for 429
-            max_retries = 5  # Increased from 3 to 5
-            for attempt in range(max_retries):
-                try:
-                    scope = f"/subscriptions/{self.subscription_id}"
-                    
-                    # Use the same QueryDefinition format that works in our tests
-                    from azure.mgmt.costmanagement.models import (
-                        QueryDefinition, QueryTimePeriod, QueryDataset, 
-                        QueryAggregation, QueryFilter, QueryComparisonExpression
-                    )
-                    
-                    query_definition = QueryDefinition(
-                        type="ActualCost",
-                        timeframe="Custom",
-                        time_period=QueryTimePeriod(
-                            from_property=start_date,
-                            to=end_date
-                        ),
-                        dataset=QueryDataset(
-                            granularity="Daily",
-                            aggregation={
-                                "totalCost": QueryAggregation(name="Cost", function="Sum")
-                            },
-                            filter=QueryFilter(
-                                dimensions=QueryComparisonExpression(
-                                    name="ResourceId",
-                                    operator="In",
-                                    values=[resource_id]
-                                )
-                            )
-                        )
-                    )
-                    
-                    result = self.cost_client.query.usage(scope, query_definition)
-                    
-                    resource_cost = 0.0
-                    daily_costs = []
-                    
-                    if hasattr(result, 'rows') and result.rows:
-                        for row in result.rows:
-                            if row and len(row) > 0:
-                                cost = float(row[0]) if row[0] else 0.0
-                                resource_cost += cost
-                                # Parse date from the second column
-                                date_value = row[1] if len(row) > 1 else ""
-                                date_str = str(date_value) if date_value else ""
-                                daily_costs.append({
-                                    "date": date_str,
-                                    "cost": cost
-                                })
-                    
-                    results["resources"].append({
-                        "resource_id": resource_id,
-                        "total_cost": resource_cost,
-                        "daily_costs": daily_costs
-                    })
-                    
-                    results["total_cost"] += resource_cost
-                    
-                    resource_name = resource_id.split('/')[-1] if '/' in resource_id else resource_id
-                    if resource_cost > 0:
-                        logging.info(f"✅ Resource {i+1}/{len(resource_ids)} ({resource_name}): ${resource_cost:.2f}")
-                    else:
-                        logging.info(f"⚪ Resource {i+1}/{len(resource_ids)} ({resource_name}): $0.00")
-                    
-                    # Reset consecutive rate limit counter on success
-                    consecutive_rate_limits = 0
-                    break  # Success, exit retry loop
-                    
-                except Exception as e:
-                    if attempt < max_retries - 1:
-                        # Special handling for 429 rate limit errors
-                        if "429" in str(e) or "Too many requests" in str(e):
-                            consecutive_rate_limits += 1
-                            # Much longer delays for rate limit errors
-                            retry_delay = min(15.0 * (2 ** attempt), 120.0)  # 15s, 30s, 60s, 120s
-                            logging.warning(f"Rate limit hit for {resource_id} (attempt {attempt + 1}/{max_retries}). Waiting {retry_delay:.1f}s before retry...")
-                            
-                            # Circuit breaker: if too many consecutive rate limits, give up early
-                            if consecutive_rate_limits >= max_consecutive_rate_limits:
-                                logging.error(f"Circuit breaker activated: {consecutive_rate_limits} consecutive rate limits. Skipping remaining resources to avoid further API throttling.")
-                                # Add remaining resources as failed
-                                for remaining_resource in resource_ids[i:]:
-                                    results["resources"].append({
-                                        "resource_id": remaining_resource,
-                                        "error": "Skipped due to rate limiting circuit breaker"
-                                    })
-                                return results
-                        else:
-                            # Standard exponential backoff for other errors
-                            retry_delay = min(5.0 * (2 ** attempt), 30.0)
-                            logging.warning(f"Attempt {attempt + 1} failed for {resource_id}: {str(e)}. Retrying in {retry_delay:.1f}s")
-                        
-                        time.sleep(retry_delay)
-                    else:
-                        # All retries failed
-                        if "429" in str(e) or "Too many requests" in str(e):
-                            consecutive_rate_limits += 1
-                        
-                        logging.error(f"All {max_retries} attempts failed for resource {resource_id}: {str(e)}")
-                        results["resources"].append({
-                            "resource_id": resource_id,
-                            "error": str(e)
-                        })
-        
-        return results
-
-
-def query_cost_management_direct(query_params: Dict[str, Any]) -> Dict[str, Any]:
+@app.function_name(name="CostAnalysisDirectQueryAsync")
+@app.route(route="cost-analysis/async", methods=["POST"], auth_level=func.AuthLevel.FUNCTION)
+async def cost_analysis_direct_query_async(req: func.HttpRequest) -> func.HttpResponse:
     """
-    Main function for direct Cost Management API queries
-    
-    Parameters:
-    - subscription_id: Azure subscription ID (required)
-    - query_type: Type of query (subscription, resource_group, service, top_resources, budget, location, specific_resources)
-    - start_date: Start date in ISO format (required)
-    - end_date: End date in ISO format (required)
-    - resource_group: Resource group name (for resource_group query)
-    - service_names: List of service names (for service query)
-    - resource_ids: List of resource IDs (for specific_resources query)
-    - top_n: Number of top resources (for top_resources query, default: 10)
-    - granularity: Data granularity (Daily, Monthly, None - default: Daily)
+    Direct Cost Management query on the aio client (same request and response as /cost-analysis)
     """
+    logging.info('Cost Analysis Direct Query async function triggered')
     
-    subscription_id = query_params.get('subscription_id')
-    if not subscription_id:
-        return {'error': 'subscription_id is required'}
-    
-    # Auto-detect query_type if not provided based on parameters
-    query_type = query_params.get('query_type')
-    if not query_type:
-        if query_params.get('resource_ids'):
-            query_type = 'specific_resources'
-        elif query_params.get('resource_group'):
-            query_type = 'resource_group'
-        elif query_params.get('service_names'):
-            query_type = 'service'
-        elif query_params.get('top_n'):
-            query_type = 'top_resources'
-        else:
-            query_type = 'subscription'
-    
-    # Parse dates - handle automatic "last 30 days" calculation
-    try:
-        # Check if dates are provided
-        if 'start_date' in query_params and 'end_date' in query_params:
-            start_date_str = query_params['start_date']
-            end_date_str = query_params['end_date']
-            
-            # Handle different date formats
-            if 'T' not in start_date_str:
-                # Format: YYYY-MM-DD -> add time component
-                start_date = datetime.fromisoformat(start_date_str + 'T00:00:00')
-                end_date = datetime.fromisoformat(end_date_str + 'T23:59:59')
-            else:
-                # Format: YYYY-MM-DDTHH:MM:SS[Z]
-                start_date = datetime.fromisoformat(start_date_str.replace('Z', '+00:00'))
-                end_date = datetime.fromisoformat(end_date_str.replace('Z', '+00:00'))
-        else:
-            # Auto-calculate "last 30 days" from current date
-            from datetime import timedelta
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=30)
-            
-            logging.info(f"Auto-calculated date range: {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}")
-            
-    except (KeyError, ValueError) as e:
-        return {'error': f'Invalid date format. Use ISO format (YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS): {str(e)}'}
-    
-    # Initialize analyzer
-    analyzer = CostManagementAnalyzer(subscription_id)
-    
-    # Execute query based on type
     try:
-        if query_type == 'subscription':
-            granularity = query_params.get('granularity', 'Daily')
-            return analyzer.get_subscription_costs(start_date, end_date, granularity)
-        
-        elif query_type == 'resource_group':
-            resource_group = query_params.get('resource_group')
-            if not resource_group:
-                return {'error': 'resource_group is required for resource_group query'}
-            granularity = query_params.get('granularity', 'Daily')
-            return analyzer.get_resource_group_costs(resource_group, start_date, end_date, granularity)
-        
-        elif query_type == 'service':
-            service_names = query_params.get('service_names')
-            if not service_names:
-                return {'error': 'service_names list is required for service query'}
-            return analyzer.get_resource_costs_by_service(service_names, start_date, end_date)
-        
-        elif query_type == 'top_resources':
-            top_n = query_params.get('top_n', 10)
-            return analyzer.get_top_cost_resources(start_date, end_date, top_n)
-        
-        elif query_type == 'budget':
-            return analyzer.get_budget_analysis(start_date, end_date)
-        
-        elif query_type == 'location':
-            return analyzer.get_cost_by_location(start_date, end_date)
-        
-        elif query_type == 'specific_resources':
-            resource_ids = query_params.get('resource_ids')
-            if not resource_ids:
-                return {'error': 'resource_ids list is required for specific_resources query'}
-            logging.info(f"Executing specific_resources cost query for {len(resource_ids)} resources")
-            return analyzer.get_specific_resources_cost(resource_ids, start_date, end_date)
+        req_body = req.get_json()
+        logging.info(f"Request body: {json.dumps(req_body)}")
         
-        else:
-            return {'error': f'Invalid query_type: {query_type}. Valid types: subscription, resource_group, service, top_resources, budget, location, specific_resources'}
-    
+        with request_diagnostics('cost_analysis', req_body):
+            results = await query_cost_management_direct_async(req_body)
+            body = json.dumps(results, indent=2)
+            count_diagnostic('bytes_serialized', len(body))
+        
+        return func.HttpResponse(
+            body=body,
+            mimetype="application/json",
+            status_code=200
+        )
+        
+    except ValueError as e:
+        logging.error(f"Invalid request: {str(e)}")
+        return func.HttpResponse(
+            body=json.dumps({'error': f'Invalid request: {str(e)}'}),
+            mimetype="application/json",
+            status_code=400
+        )
     except Exception as e:
-        logging.error(f"Error executing cost query: {str(e)}")
-        return {'error': str(e)}
+        logging.error(f"Error processing request: {str(e)}")
+        return func.HttpResponse(
+            body=json.dumps({'error': str(e)}),
+            mimetype="application/json",
+            status_code=500
+        )
 
 
 @app.function_name(name="CostManagementExample")
@@ -1281,6 +2935,38 @@ def cost_management_example(req: func.HttpRequest) -> func.HttpResponse:
             "query_type": "location",
             "start_date": "2025-09-01T00:00:00Z",
             "end_date": "2025-09-30T23:59:59Z"
+        },
+        "rollup": {
+            "description": "One daily pull, several local views: cost by service, by region and by month",
+            "subscription_id": "your-subscription-id",
+            "query_type": "rollup",
+            "group_by": ["service", "location"],
+            "time_grains": ["monthly", "weekly"],
+            "start_date": "2025-07-01T00:00:00Z",
+            "end_date": "2025-09-30T23:59:59Z"
+        },
+        "multi_subscription_chargeback": {
+            "description": "Fan out over several subscriptions; merged result plus per-scope subtotals in 'scopes'",
+            "subscription_ids": ["subscription-id-1", "subscription-id-2"],
+            "query_type": "rollup",
+            "group_by": ["service"],
+            "start_date": "2025-09-01T00:00:00Z",
+            "end_date": "2025-09-30T23:59:59Z"
+        },
+        "management_group_costs": {
+            "description": "One management-group scoped query instead of one per subscription",
+            "management_group_id": "your-management-group-id",
+            "query_type": "location",
+            "start_date": "2025-09-01T00:00:00Z",
+            "end_date": "2025-09-30T23:59:59Z"
+        },
+        "columnar_subscription_costs": {
+            "subscription_id": "your-subscription-id",
+            "query_type": "subscription",
+            "output_format": "columnar",
+            "group_totals": ["ServiceName", "ResourceLocation"],
+            "start_date": "2025-09-01T00:00:00Z",
+            "end_date": "2025-09-30T23:59:59Z"
         }
     }
     
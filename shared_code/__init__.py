@@ -0,0 +1 @@
+"""Code shared by the function app: Azure clients, diagnostics, resilience policies, caches and cost queries"""
@@ -0,0 +1,136 @@
+"""Lazily imported Azure SDK clients, the shared credential and the process-wide client cache"""
+import importlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from .resilience import client_policies
+from .settings import env_number
+
+# Maximum number of management clients kept alive across invocations on a warm instance
+MANAGEMENT_CLIENT_CACHE_SIZE = env_number('MANAGEMENT_CLIENT_CACHE_SIZE', 256)
+
+
+class LazyImport:
+    """Stand-in for an SDK class whose module is imported the first time the class is used.
+
+    Calls and attribute lookups are forwarded to the real class, so module code uses the
+    placeholder like the class itself, and tests can still patch the module attribute.
+    """
+    
+    def __init__(self, module: str, name: str):
+        self.module = module
+        self.name = name
+        self._target = None
+    
+    def resolve(self):
+        if self._target is None:
+            started = time.perf_counter()
+            self._target = getattr(importlib.import_module(self.module), self.name)
+            logging.debug(f"Imported {self.module}.{self.name} in {(time.perf_counter() - started) * 1000:.0f}ms")
+        return self._target
+    
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **kwargs)
+    
+    def __getattr__(self, attribute):
+        return getattr(self.resolve(), attribute)
+    
+    def __repr__(self) -> str:
+        return f"<lazy {self.module}.{self.name}>"
+
+
+# SDK clients are imported on first use: static endpoints (/example, /cost-example) load none of them,
+# /analyze loads compute/network/advisor/resource and /cost-analysis only costmanagement
+DefaultAzureCredential = LazyImport('azure.identity', 'DefaultAzureCredential')
+AsyncDefaultAzureCredential = LazyImport('azure.identity.aio', 'DefaultAzureCredential')
+ComputeManagementClient = LazyImport('azure.mgmt.compute', 'ComputeManagementClient')
+NetworkManagementClient = LazyImport('azure.mgmt.network', 'NetworkManagementClient')
+AdvisorManagementClient = LazyImport('azure.mgmt.advisor', 'AdvisorManagementClient')
+CostManagementClient = LazyImport('azure.mgmt.costmanagement', 'CostManagementClient')
+ResourceManagementClient = LazyImport('azure.mgmt.resource', 'ResourceManagementClient')
+SubscriptionClient = LazyImport('azure.mgmt.resource', 'SubscriptionClient')
+ResourceGraphClient = LazyImport('azure.mgmt.resourcegraph', 'ResourceGraphClient')
+QueryRequest = LazyImport('azure.mgmt.resourcegraph.models', 'QueryRequest')
+QueryRequestOptions = LazyImport('azure.mgmt.resourcegraph.models', 'QueryRequestOptions')
+AsyncComputeManagementClient = LazyImport('azure.mgmt.compute.aio', 'ComputeManagementClient')
+AsyncNetworkManagementClient = LazyImport('azure.mgmt.network.aio', 'NetworkManagementClient')
+AsyncAdvisorManagementClient = LazyImport('azure.mgmt.advisor.aio', 'AdvisorManagementClient')
+AsyncCostManagementClient = LazyImport('azure.mgmt.costmanagement.aio', 'CostManagementClient')
+AsyncResourceManagementClient = LazyImport('azure.mgmt.resource.resources.aio', 'ResourceManagementClient')
+AsyncSubscriptionClient = LazyImport('azure.mgmt.resource.subscriptions.aio', 'SubscriptionClient')
+
+# Shared credential, built by get_credential() on the first request that calls Azure
+credential = None
+_credential_lock = threading.Lock()
+
+
+def get_credential():
+    """The process-wide DefaultAzureCredential, constructed on first use"""
+    global credential
+    if credential is None:
+        with _credential_lock:
+            if credential is None:
+                credential = DefaultAzureCredential()
+    return credential
+
+
+class ManagementClientCache:
+    """Process-wide, thread-safe LRU cache of Azure management clients keyed by (client type, subscription).
+
+    Warm function instances reuse client pipelines, connection pools and token state across
+    invocations instead of rebuilding every client on each request.
+    """
+    
+    def __init__(self, max_size: int):
+        self.max_size = max(1, max_size)
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, client_cls, subscription_id: Optional[str] = None, configure=None,
+            policies: Optional[Dict[str, Any]] = None):
+        """Return the cached client, building it (and applying `configure` once) on first use"""
+        key = (client_cls, subscription_id)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self._clients.move_to_end(key)
+                self.hits += 1
+                return client
+            
+            self.misses += 1
+            # Every management client retries and trips circuit breakers through the shared policies
+            policies = policies or client_policies()
+            if subscription_id:
+                client = client_cls(get_credential(), subscription_id, **policies)
+            else:
+                client = client_cls(get_credential(), **policies)
+            if configure:
+                configure(client)
+            
+            self._clients[key] = client
+            # Evicted clients are not closed - another invocation may still be using them
+            while len(self._clients) > self.max_size:
+                self._clients.popitem(last=False)
+            return client
+    
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+    
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'size': len(self._clients), 'hits': self.hits, 'misses': self.misses}
+
+
+_client_cache = ManagementClientCache(MANAGEMENT_CLIENT_CACHE_SIZE)
+
+
+def get_management_client(client_cls, subscription_id: Optional[str] = None, configure=None,
+                          policies: Optional[Dict[str, Any]] = None):
+    """Get a shared management client from the process-wide client cache"""
+    return _client_cache.get(client_cls, subscription_id, configure, policies)
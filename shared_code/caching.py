@@ -0,0 +1,294 @@
+"""Cost query result cache, inventory snapshot stores and stored scan results"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from .settings import env_number
+
+
+# Cost query result cache: closed past periods are stable, ranges touching the last few days are not
+COST_CACHE_CLOSED_TTL_SECONDS = env_number('COST_CACHE_CLOSED_TTL_SECONDS', 24 * 3600)
+COST_CACHE_OPEN_TTL_SECONDS = env_number('COST_CACHE_OPEN_TTL_SECONDS', 300)
+COST_CACHE_SETTLE_DAYS = env_number('COST_CACHE_SETTLE_DAYS', 3)
+COST_CACHE_MAX_ENTRIES = env_number('COST_CACHE_MAX_ENTRIES', 512)
+COST_CACHE_MAX_DISK_ENTRIES = env_number('COST_CACHE_MAX_DISK_ENTRIES', 2048)
+# Optional local disk tier (created owner-only); unset keeps tenant cost data in memory only
+COST_CACHE_DIR = os.environ.get('COST_CACHE_DIR', '')
+
+
+# Incremental orphan scans: where snapshots are persisted (ORPHAN_SNAPSHOT_MAX_AGE_HOURS sets their reuse)
+ORPHAN_SNAPSHOT_DB = os.environ.get('ORPHAN_SNAPSHOT_DB', os.path.join(tempfile.gettempdir(), 'orphan-snapshots.sqlite3'))
+
+
+class CostQueryCache:
+    """Two-tier (memory + local disk) TTL cache for Cost Management query results.
+
+    Entries are keyed by a fingerprint of the scope and the canonical JSON of the normalized
+    query body; follow-up result pages add their page index and the chain id of the first page.
+    Fully closed past periods get a long TTL; ranges that reach into the last
+    COST_CACHE_SETTLE_DAYS days (where usage is still being posted) get a short one.
+    """
+    
+    def __init__(self, max_entries: int, directory: Optional[str] = None, max_disk_entries: int = 0):
+        self.max_entries = max(1, max_entries)
+        self.directory = directory or None
+        self.max_disk_entries = max_disk_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        
+        if self.directory:
+            try:
+                os.makedirs(self.directory, mode=0o700, exist_ok=True)
+                os.chmod(self.directory, 0o700)
+            except OSError as e:
+                logging.warning(f"Cost query disk cache disabled ({self.directory}): {str(e)}")
+                self.directory = None
+    
+    @staticmethod
+    def normalize_body(query_body) -> Dict[str, Any]:
+        """Return the query as a plain dict whether it was built as a dict or an SDK model"""
+        if hasattr(query_body, 'serialize'):
+            return query_body.serialize()
+        return query_body
+    
+    @staticmethod
+    def fingerprint(scope: str, query_body: Dict[str, Any], page: int = 0, chain: Optional[str] = None) -> str:
+        # Follow-up pages carry the chain id of the first page they were fetched after
+        canonical = json.dumps(
+            {'scope': scope.lower(), 'query': query_body, 'page': page, 'chain': chain},
+            sort_keys=True, separators=(',', ':'), default=str
+        )
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+    
+    @staticmethod
+    def ttl_for(query_body: Dict[str, Any]) -> int:
+        """Long TTL for fully closed periods, short TTL when the range includes recent days"""
+        try:
+            period_end = str(query_body['timePeriod']['to'])
+            end_date = datetime.fromisoformat(period_end.replace('Z', '+00:00')[:10]).date()
+        except (KeyError, TypeError, ValueError):
+            return COST_CACHE_OPEN_TTL_SECONDS
+        
+        settled_before = datetime.now(timezone.utc).date() - timedelta(days=COST_CACHE_SETTLE_DAYS)
+        return COST_CACHE_CLOSED_TTL_SECONDS if end_date < settled_before else COST_CACHE_OPEN_TTL_SECONDS
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    return entry[1]
+                del self._entries[key]
+        
+        entry = self._read_disk(key)
+        if entry is None or entry[0] <= now:
+            return None
+        
+        # Promote disk hits into the memory tier
+        self._store_memory(key, entry)
+        return entry[1]
+    
+    def set(self, key: str, value: Dict[str, Any], ttl: int) -> None:
+        entry = (time.time() + ttl, value)
+        self._store_memory(key, entry)
+        self._write_disk(key, entry)
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+    
+    def _store_memory(self, key: str, entry) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def _read_disk(self, key: str):
+        if not self.directory:
+            return None
+        try:
+            with open(os.path.join(self.directory, f'{key}.json'), 'r', encoding='utf-8') as cache_file:
+                stored = json.load(cache_file)
+            return stored['expires_at'], stored['value']
+        except (OSError, ValueError, KeyError):
+            return None
+    
+    def _write_disk(self, key: str, entry) -> None:
+        if not self.directory:
+            return
+        path = os.path.join(self.directory, f'{key}.json')
+        try:
+            temp_path = f'{path}.{threading.get_ident()}.tmp'
+            file_descriptor = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(file_descriptor, 'w', encoding='utf-8') as cache_file:
+                json.dump({'expires_at': entry[0], 'value': entry[1]}, cache_file, default=str)
+            os.replace(temp_path, path)
+            self._evict_disk()
+        except OSError as e:
+            logging.warning(f"Could not write cost query cache entry: {str(e)}")
+    
+    def _evict_disk(self) -> None:
+        """Drop the oldest files once the disk tier exceeds its size bound"""
+        files = [entry for entry in os.scandir(self.directory) if entry.name.endswith('.json')]
+        if len(files) <= self.max_disk_entries:
+            return
+        files.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in files[:len(files) - self.max_disk_entries]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+class InventorySnapshotStore(ABC):
+    """Persists the last orphan scan per subscription and query scope for incremental scans.
+
+    A snapshot is a dict: {'scanned_at': ISO-8601 UTC, 'entries': {key: {'hash', 'etag', 'record'}}}.
+    """
+    
+    @abstractmethod
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        ...
+    
+    @abstractmethod
+    def save(self, key: str, snapshot: Dict[str, Any]) -> None:
+        ...
+
+
+class InMemorySnapshotStore(InventorySnapshotStore):
+    """Process-local snapshot store (useful for tests and single-instance runs)"""
+    
+    def __init__(self):
+        self._snapshots = {}
+        self._lock = threading.Lock()
+    
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+        return json.loads(snapshot) if snapshot else None
+    
+    def save(self, key: str, snapshot: Dict[str, Any]) -> None:
+        payload = json.dumps(snapshot, default=str)
+        with self._lock:
+            self._snapshots[key] = payload
+
+
+class SQLiteSnapshotStore(InventorySnapshotStore):
+    """Snapshot store backed by a local SQLite file"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS orphan_snapshots "
+                "(key TEXT PRIMARY KEY, scanned_at TEXT NOT NULL, payload TEXT NOT NULL)"
+            )
+    
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+    
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as connection:
+            row = connection.execute("SELECT payload FROM orphan_snapshots WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+    
+    def save(self, key: str, snapshot: Dict[str, Any]) -> None:
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO orphan_snapshots (key, scanned_at, payload) VALUES (?, ?, ?)",
+                (key, snapshot['scanned_at'], json.dumps(snapshot, default=str))
+            )
+
+
+_default_snapshot_store = None
+_default_snapshot_store_lock = threading.Lock()
+
+
+def get_default_snapshot_store() -> InventorySnapshotStore:
+    """Shared SQLite snapshot store at ORPHAN_SNAPSHOT_DB (created on first use)"""
+    global _default_snapshot_store
+    with _default_snapshot_store_lock:
+        if _default_snapshot_store is None:
+            _default_snapshot_store = SQLiteSnapshotStore(ORPHAN_SNAPSHOT_DB)
+        return _default_snapshot_store
+
+
+class ScanResultStore:
+    """Materialized /analyze results, so later pages are served by cursor without rescanning.
+
+    Results are held in instance memory with a TTL and an LRU size cap; a cursor that lands on
+    another instance or outlives its scan is rejected and the caller starts a new scan.
+    Each requested (order_by, order) is fully sorted once per scan and kept, so every page is a
+    slice. A full sort replaces per-page top-k heap selection: pages past the first would each
+    need a larger heap, while one O(n log n) sort serves every later page and cursor.
+    """
+    
+    # Record fields /analyze can order by; each holds one comparable type (or None) across record types
+    ORDERABLE_FIELDS = ('cost', 'potential_savings', 'estimated_monthly_cost', 'disk_size_gb', 'age_days',
+                        'name', 'resource_type', 'resource_group', 'location', 'subscription_name', 'sku')
+    
+    def __init__(self, ttl_seconds: int, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self._scans = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def put(self, results: Dict[str, Any]) -> str:
+        scan_id = uuid.uuid4().hex
+        with self._lock:
+            self._scans[scan_id] = (time.time() + self.ttl_seconds, results, {})
+            while len(self._scans) > self.max_entries:
+                self._scans.popitem(last=False)
+        return scan_id
+    
+    def get(self, scan_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._entry(scan_id)
+        return entry[1] if entry else None
+    
+    def ordered(self, scan_id: str, order_by: Optional[str], order: str) -> Optional[List[Dict[str, Any]]]:
+        """The scan's resources in the requested order, fully sorted on first request; None once expired"""
+        entry = self._entry(scan_id)
+        if entry is None:
+            return None
+        resources = entry[1]['resources']
+        if not order_by:
+            return resources
+        
+        orderings = entry[2]
+        with self._lock:
+            ordered = orderings.get((order_by, order))
+        if ordered is None:
+            # Missing values sort last in either direction
+            if order == 'desc':
+                ordered = sorted(resources, reverse=True,
+                                 key=lambda r: (1, r[order_by]) if r.get(order_by) is not None else (0, 0))
+            else:
+                ordered = sorted(resources,
+                                 key=lambda r: (0, r[order_by]) if r.get(order_by) is not None else (1, 0))
+            with self._lock:
+                ordered = orderings.setdefault((order_by, order), ordered)
+        return ordered
+    
+    def _entry(self, scan_id: str) -> Optional[Tuple[float, Dict[str, Any], Dict[Tuple[str, str], List]]]:
+        with self._lock:
+            entry = self._scans.get(scan_id)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._scans[scan_id]
+                return None
+            self._scans.move_to_end(scan_id)
+            return entry
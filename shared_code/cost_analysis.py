@@ -0,0 +1,1949 @@
+"""Cost Management queries: paging, caching, window splitting and multi-scope fan-out"""
+import asyncio
+import heapq
+import logging
+import threading
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+from azure.core.rest import HttpRequest
+
+from .azure_clients import (AsyncCostManagementClient, AsyncDefaultAzureCredential, CostManagementClient,
+                            ResourceManagementClient, get_credential, get_management_client)
+from .caching import COST_CACHE_DIR, COST_CACHE_MAX_DISK_ENTRIES, COST_CACHE_MAX_ENTRIES, CostQueryCache
+from .diagnostics import (ContextThreadPoolExecutor, attach_diagnostics, count_diagnostic, diagnostic_span,
+                          request_diagnostics)
+from .resilience import CircuitOpenError, CostRateLimiter, async_client_policies, client_policies, error_result
+from .settings import env_number
+
+
+# Shared Cost Management request budget (requests/second); adapted at runtime from the service's headers
+COST_QUERY_RATE = env_number('COST_QUERY_RATE', 1.0, float)
+COST_QUERY_MAX_RATE = env_number('COST_QUERY_MAX_RATE', 10.0, float)
+COST_QUERY_BURST = env_number('COST_QUERY_BURST', 4)
+
+
+# Upper bound on next_link pages followed per query; results cut off there are reported as incomplete
+COST_QUERY_MAX_PAGES = env_number('COST_QUERY_MAX_PAGES', 100)
+
+
+# Cost queries fanned out over several subscriptions run this many scopes at once (paced by the rate limiter)
+COST_SCOPE_FANOUT_WORKERS = env_number('COST_SCOPE_FANOUT_WORKERS', 8)
+
+# Long Daily/Monthly cost queries are split into calendar-month windows fetched this many at a time
+COST_QUERY_WINDOW_WORKERS = env_number('COST_QUERY_WINDOW_WORKERS', 4)
+# Only ranges longer than this are split; shorter ones fit comfortably in one query and one cache entry
+COST_QUERY_SPLIT_MIN_DAYS = env_number('COST_QUERY_SPLIT_MIN_DAYS', 62)
+
+
+_cost_rate_limiter = CostRateLimiter(COST_QUERY_RATE, COST_QUERY_MAX_RATE, COST_QUERY_BURST)
+
+_cost_query_cache = CostQueryCache(COST_CACHE_MAX_ENTRIES, COST_CACHE_DIR, COST_CACHE_MAX_DISK_ENTRIES)
+
+
+class CostColumns:
+    """Column-oriented view of a Cost Management result: one list per column, addressed by name.
+
+    Totals and group-bys are single passes over the columns; rows arrive as Python lists from JSON,
+    so hashing keys into a dict is cheaper than converting them to arrays first.
+    """
+    
+    COST_COLUMN_NAMES = ("Cost", "PreTaxCost", "CostUSD")
+    
+    def __init__(self, names: List[str], rows: List[List[Any]]):
+        self.names = names
+        self.row_count = len(rows)
+        columns = [list(column) for column in zip(*rows)] if rows else []
+        self.data = {name: columns[i] if i < len(columns) else [None] * self.row_count
+                     for i, name in enumerate(names)}
+    
+    @classmethod
+    def from_result(cls, result) -> 'CostColumns':
+        names = [col.name for col in result.columns] if getattr(result, 'columns', None) else []
+        return cls(names, list(getattr(result, 'rows', None) or []))
+    
+    @classmethod
+    def from_columns(cls, names: List[str], data: Dict[str, List[Any]]) -> 'CostColumns':
+        """Wrap columns that were already accumulated column-wise (no row transposition)"""
+        table = cls(names, [])
+        table.data = data
+        table.row_count = len(data[names[0]]) if names else 0
+        return table
+    
+    def find(self, candidates) -> Optional[str]:
+        """First column matching any candidate name (case-insensitive)"""
+        lowered = {name.lower(): name for name in self.names}
+        for candidate in candidates:
+            if candidate.lower() in lowered:
+                return lowered[candidate.lower()]
+        return None
+    
+    def cost_column(self) -> Optional[str]:
+        return self.find(self.COST_COLUMN_NAMES)
+    
+    def numeric(self, name: str) -> List[float]:
+        """Column as a float list, with empty values as 0"""
+        return [float(value) if value else 0.0 for value in self.data[name]]
+    
+    def total(self, name: str) -> float:
+        return float(sum(self.numeric(name)))
+    
+    def group_sum(self, keys: List[str], value: str, values: Optional[List[float]] = None) -> Dict[Any, float]:
+        """Sum `value` per distinct key (a tuple when several key columns are given), in first-seen order"""
+        key_columns = [self.data[key] for key in keys]
+        key_values = zip(*key_columns) if len(keys) > 1 else key_columns[0]
+        weights = self.numeric(value) if values is None else values
+        
+        # One pass: each key is hashed once per row and its sum lives in a list slot
+        index = {}
+        sums = []
+        for key, weight in zip(key_values, weights):
+            code = index.get(key)
+            if code is None:
+                index[key] = len(sums)
+                sums.append(weight)
+            else:
+                sums[code] += weight
+        return dict(zip(index, sums))
+
+
+class CostQueryPages:
+    """Lazy iterator over the result pages of one usage query.
+
+    The first page comes from query.usage; each further page is fetched only when the consumer
+    asks for it, by POSTing the query body to the previous page's next_link. Pages go through the
+    analyzer's cache and the shared rate limiter like any other query; follow-up pages are cached
+    under the chain id of the first page, so a refreshed first page never continues with pages
+    cached from an earlier run. Iterate with `for` on the
+    sync analyzer and `async for` on the async one; afterwards `complete` says whether every page
+    was read (False when COST_QUERY_MAX_PAGES was reached or a later page failed).
+    """
+    
+    def __init__(self, analyzer: 'CostManagementAnalyzer', scope: str, query_body,
+                 max_pages: int = COST_QUERY_MAX_PAGES):
+        self.analyzer = analyzer
+        self.scope = scope
+        self.query_body = query_body
+        self.max_pages = max(1, max_pages)
+        self.page_count = 0
+        self.row_count = 0
+        self.complete = False
+        self.error = None
+    
+    def __iter__(self):
+        page = self.analyzer._query_usage(self.scope, self.query_body)
+        while True:
+            yield page
+            if not self._has_next(page):
+                return
+            try:
+                page = self.analyzer._query_next_page(self.scope, self.query_body, page, self.page_count)
+            except Exception as e:
+                self._fail(e)
+                return
+    
+    async def __aiter__(self):
+        page = await self.analyzer._query_usage(self.scope, self.query_body)
+        while True:
+            yield page
+            if not self._has_next(page):
+                return
+            try:
+                page = await self.analyzer._query_next_page(self.scope, self.query_body, page, self.page_count)
+            except Exception as e:
+                self._fail(e)
+                return
+    
+    def _has_next(self, page) -> bool:
+        """Count the page just consumed and decide whether to follow its next_link"""
+        self.page_count += 1
+        self.row_count += len(getattr(page, 'rows', None) or [])
+        if not getattr(page, 'next_link', None):
+            self.complete = True
+            return False
+        if self.page_count >= self.max_pages:
+            logging.warning(f"Cost query on {self.scope} stopped after {self.page_count} pages ({self.row_count} rows); result is incomplete")
+            return False
+        return True
+    
+    def _fail(self, error: Exception) -> None:
+        # Keep the rows already aggregated and report the result as incomplete
+        self.error = str(error)
+        logging.warning(f"Cost query page {self.page_count + 1} on {self.scope} failed, result is incomplete: {str(error)}")
+    
+    def summary(self) -> Dict[str, Any]:
+        return self.combined_summary([self])
+    
+    @staticmethod
+    def combined_summary(sources: List['CostQueryPages']) -> Dict[str, Any]:
+        """Paging status of a result assembled from one or more queries"""
+        summary = {"complete": all(pages.complete for pages in sources),
+                   "pages": sum(pages.page_count for pages in sources)}
+        errors = [pages.error for pages in sources if pages.error]
+        if errors:
+            summary["page_error"] = errors[0]
+        return summary
+
+
+class CostManagementAnalyzer:
+    """Direct Azure Cost Management and Billing API analyzer"""
+    
+    # Cost Management returns at most this many rows per page; resource batches are sized to fit one page
+    COST_QUERY_ROW_LIMIT = 5000
+    MAX_RESOURCE_BATCH_SIZE = 100
+    MAX_RESOURCE_FILTER_VALUES = 1000
+    
+    OUTPUT_FORMATS = ('rows', 'columnar')
+    
+    # Rollup dimensions (request name -> Cost Management dimension) and local time grains
+    ROLLUP_DIMENSIONS = {
+        'service': 'ServiceName',
+        'location': 'ResourceLocation',
+        'resource_group': 'ResourceGroupName'
+    }
+    ROLLUP_TIME_GRAINS = ('daily', 'weekly', 'monthly')
+    MAX_QUERY_GROUPINGS = 2
+    
+    # Time-series granularities whose windows can be queried separately and concatenated
+    SPLITTABLE_GRANULARITIES = ('Daily', 'Monthly')
+    
+    def __init__(self, subscription_id: Optional[str], use_cache: bool = True, output_format: str = 'rows',
+                 group_totals: Optional[List[str]] = None, scope: Optional[str] = None):
+        self.subscription_id = subscription_id
+        # Query scope: the subscription by default, or a management group / billing scope
+        self.scope = scope or f"/subscriptions/{subscription_id}"
+        self.use_cache = use_cache
+        self.output_format = output_format
+        self.group_totals = group_totals or []
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._stats_lock = threading.Lock()
+        self._init_clients()
+    
+    def _init_clients(self) -> None:
+        self.credential = get_credential()
+        # Shared Cost Management Client with custom headers to avoid 429 rate limiting
+        self.cost_client = get_management_client(
+            CostManagementClient, configure=self._add_client_type_header,
+            policies=client_policies(retry_throttled=False)
+        )
+        self.resource_client = get_management_client(ResourceManagementClient, self.subscription_id) if self.subscription_id else None
+    
+    def _query_usage(self, scope: str, query_body):
+        """Run a Cost Management usage query through the result cache and the shared, header-aware rate limit"""
+        normalized_body, cache_key, cached = self._cache_lookup(scope, query_body)
+        if cached is not None:
+            return cached
+        
+        with diagnostic_span('cost.query', scope=scope):
+            result = _cost_rate_limiter.call(self.cost_client.query.usage, scope, query_body)
+        count_diagnostic('pages')
+        return self._cache_store(cache_key, normalized_body, result)
+    
+    def _query_next_page(self, scope: str, query_body, previous, page: int):
+        """Fetch the page after `previous` (cached per page index within its chain, paced by the shared rate limiter)"""
+        normalized_body, cache_key, cached = self._cache_lookup(scope, query_body, page, previous.chain)
+        if cached is not None:
+            return cached
+        
+        with diagnostic_span('cost.next_page', scope=scope, page=page + 1):
+            result = _cost_rate_limiter.call(self._post_next_link, previous.next_link, normalized_body)
+        count_diagnostic('pages')
+        return self._cache_store(cache_key, normalized_body, result, previous.chain)
+    
+    def _post_next_link(self, next_link: str, query_body: Dict[str, Any], **kwargs):
+        """POST the query body to a nextLink URL; query.usage has no pager, so this goes through the raw pipeline"""
+        response = self.cost_client._client.send_request(HttpRequest("POST", next_link, json=query_body), **kwargs)
+        response.raise_for_status()
+        return self._page_from_json(response.json())
+    
+    def _usage_pages(self, scope: str, query_body) -> CostQueryPages:
+        return CostQueryPages(self, scope, query_body)
+    
+    @classmethod
+    def _split_time_period(cls, query_body) -> List[Any]:
+        """Calendar-month windows of a long time-series query, in order (one window when it cannot be split).
+
+        Full months get identical bodies on every request, so each closed window is cached on its
+        own and extending a range only re-fetches the newest window. Ranges of up to
+        COST_QUERY_SPLIT_MIN_DAYS days run as one query. Top-N/sorted queries and granularity
+        None totals cannot be concatenated and always run as one query.
+        """
+        if not isinstance(query_body, dict) or "top" in query_body:
+            return [query_body]
+        dataset = query_body.get("dataset") or {}
+        if dataset.get("granularity") not in cls.SPLITTABLE_GRANULARITIES or dataset.get("sorting"):
+            return [query_body]
+        
+        try:
+            start = datetime.fromisoformat(str(query_body["timePeriod"]["from"]))
+            end = datetime.fromisoformat(str(query_body["timePeriod"]["to"]))
+        except (KeyError, TypeError, ValueError):
+            return [query_body]
+        if (end - start).days < COST_QUERY_SPLIT_MIN_DAYS:
+            return [query_body]
+        
+        windows = []
+        window_start = start
+        while window_start <= end:
+            next_month = (window_start.replace(day=1) + timedelta(days=32)).replace(
+                day=1, hour=0, minute=0, second=0, microsecond=0)
+            window_end = min(end, next_month - timedelta(seconds=1))
+            windows.append(dict(query_body, timePeriod={"from": window_start.isoformat(), "to": window_end.isoformat()}))
+            window_start = next_month
+        
+        return windows if len(windows) > 1 else [query_body]
+    
+    def _cache_lookup(self, scope: str, query_body, page: int = 0, chain: Optional[str] = None):
+        """Normalized body, cache key and cached result (None on a miss or with caching disabled)"""
+        normalized_body = CostQueryCache.normalize_body(query_body)
+        cache_key = CostQueryCache.fingerprint(scope, normalized_body, page, chain)
+        
+        cached = None
+        if self.use_cache:
+            cached = _cost_query_cache.get(cache_key)
+            with self._stats_lock:
+                if cached is not None:
+                    self.cache_hits += 1
+                else:
+                    self.cache_misses += 1
+            count_diagnostic('cache_hits' if cached is not None else 'cache_misses')
+        
+        return normalized_body, cache_key, self._result_from_dict(cached) if cached is not None else None
+    
+    def _cache_store(self, cache_key: str, normalized_body: Dict[str, Any], result, chain: Optional[str] = None):
+        payload = self._result_to_dict(result)
+        # A freshly fetched first page starts a new chain; its follow-up pages inherit the id
+        payload['chain'] = chain or uuid.uuid4().hex
+        
+        if self.use_cache:
+            _cost_query_cache.set(cache_key, payload, CostQueryCache.ttl_for(normalized_body))
+        
+        return self._result_from_dict(payload)
+    
+    def _run_usage_query(self, scope: str, query_body, analysis_type: str,
+                         metadata: Any = None, description: str = "costs") -> Dict[str, Any]:
+        """Run one usage query (long ranges as concurrent month windows) and shape the result; failures are returned as {'error': ...}"""
+        try:
+            windows = self._split_time_period(query_body)
+            if len(windows) == 1:
+                parts = [self._collect_window(scope, windows[0], analysis_type, metadata)]
+            else:
+                with ContextThreadPoolExecutor(max_workers=min(COST_QUERY_WINDOW_WORKERS, len(windows))) as executor:
+                    parts = list(executor.map(
+                        lambda window: self._collect_window(scope, window, analysis_type, metadata), windows
+                    ))
+            
+            return self._merge_windows(parts, analysis_type, metadata)
+            
+        except Exception as e:
+            logging.error(f"Error fetching {description}: {str(e)}")
+            return error_result(e)
+    
+    @staticmethod
+    def _result_to_dict(result) -> Dict[str, Any]:
+        """Reduce an SDK QueryResult to the cacheable parts (columns, rows, next_link)"""
+        columns = getattr(result, 'columns', None) or []
+        return {
+            'columns': [{'name': col.name, 'type': getattr(col, 'type', None)} for col in columns],
+            'rows': list(getattr(result, 'rows', None) or []),
+            'next_link': getattr(result, 'next_link', None)
+        }
+    
+    @staticmethod
+    def _result_from_dict(payload: Dict[str, Any]):
+        return SimpleNamespace(
+            columns=[SimpleNamespace(**col) for col in payload['columns']],
+            rows=payload['rows'],
+            next_link=payload.get('next_link'),
+            chain=payload.get('chain')
+        )
+    
+    @classmethod
+    def _page_from_json(cls, payload: Dict[str, Any]):
+        """Result object for a raw QueryResult JSON page (columns, rows and nextLink live under properties)"""
+        properties = payload.get('properties') or {}
+        return cls._result_from_dict({
+            'columns': [{'name': col.get('name'), 'type': col.get('type')} for col in properties.get('columns') or []],
+            'rows': properties.get('rows') or [],
+            'next_link': properties.get('nextLink')
+        })
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Per-request cache hit/miss counts for the response metadata"""
+        with self._stats_lock:
+            return {'enabled': self.use_cache, 'hits': self.cache_hits, 'misses': self.cache_misses}
+    
+    @staticmethod
+    def _add_client_type_header(cost_client):
+        """Add custom ClientType header to bypass rate limiting (applied once per cached client)"""
+        # https://learn.microsoft.com/en-us/answers/questions/1340993/exception-429-too-many-requests-for-azure-cost-man
+        if hasattr(cost_client, '_client') and hasattr(cost_client._client, '_config'):
+            # Add custom header to all requests
+            custom_headers = getattr(cost_client._client._config, 'headers', {})
+            custom_headers['ClientType'] = 'AwesomeType'
+            cost_client._client._config.headers = custom_headers
+            logging.info("Added ClientType header to Cost Management client to avoid rate limiting")
+    
+    def get_subscription_costs(self, start_date: datetime, end_date: datetime, 
+                             granularity: str = "Daily") -> Dict[str, Any]:
+        """Get total subscription costs with breakdown"""
+        query_body = self._subscription_costs_query(start_date, end_date, granularity)
+        return self._run_usage_query(self.scope, query_body, "subscription", description="subscription costs")
+    
+    @staticmethod
+    def _subscription_costs_query(start_date: datetime, end_date: datetime, granularity: str) -> Dict[str, Any]:
+        return {
+            "type": "ActualCost",
+            "timeframe": "Custom",
+            "timePeriod": {
+                "from": start_date.isoformat(),
+                "to": end_date.isoformat()
+            },
+            "dataset": {
+                "granularity": granularity,
+                "aggregation": {
+                    "totalCost": {
+                        "name": "Cost",
+                        "function": "Sum"
+                    },
+                    "totalCostUSD": {
+                        "name": "CostUSD", 
+                        "function": "Sum"
+                    }
+                },
+                "grouping": [
+                    {
+                        "type": "Dimension",
+                        "name": "ServiceName"
+                    },
+                    {
+                        "type": "Dimension", 
+                        "name": "ResourceLocation"
+                    }
+                ]
+            }
+        }
+    
+    def get_resource_group_costs(self, resource_group: str, start_date: datetime, 
+                               end_date: datetime, granularity: str = "Daily") -> Dict[str, Any]:
+        """Get costs for a specific resource group"""
+        if not self.subscription_id:
+            return {"error": "resource_group query requires a subscription scope"}
+        
+        scope = f"{self.scope}/resourceGroups/{resource_group}"
+        
+        query_body = self._resource_group_costs_query(start_date, end_date, granularity)
+        return self._run_usage_query(scope, query_body, "resource_group", resource_group, description="resource group costs")
+    
+    @staticmethod
+    def _resource_group_costs_query(start_date: datetime, end_date: datetime, granularity: str) -> Dict[str, Any]:
+        return {
+            "type": "ActualCost",
+            "timeframe": "Custom", 
+            "timePeriod": {
+                "from": start_date.isoformat(),
+                "to": end_date.isoformat()
+            },
+            "dataset": {
+                "granularity": granularity,
+                "aggregation": {
+                    "totalCost": {
+                        "name": "Cost",
+                        "function": "Sum"
+                    }
+                },
+                "grouping": [
+                    {
+                        "type": "Dimension",
+                        "name": "ResourceId"
+                    },
+                    {
+                        "type": "Dimension",
+                        "name": "ServiceName"
+                    }
+                ]
+            }
+        }
+    
+    def get_resource_costs_by_service(self, service_names: List[str], start_date: datetime,
+                                    end_date: datetime) -> Dict[str, Any]:
+        """Get costs filtered by Azure service names"""
+        query_body = self._service_costs_query(service_names, start_date, end_date)
+        return self._run_usage_query(self.scope, query_body, "service_filter", service_names, description="service costs")
+    
+    @staticmethod
+    def _service_costs_query(service_names: List[str], start_date: datetime, end_date: datetime) -> Dict[str, Any]:
+        return {
+            "type": "ActualCost",
+            "timeframe": "Custom",
+            "timePeriod": {
+                "from": start_date.isoformat(),
+                "to": end_date.isoformat()
+            },
+            "dataset": {
+                "granularity": "Daily",
+                "aggregation": {
+                    "totalCost": {
+                        "name": "Cost",
+                        "function": "Sum"
+                    }
+                },
+                "filter": {
+                    "dimensions": {
+                        "name": "ServiceName",
+                        "operator": "In",
+                        "values": service_names
+                    }
+                },
+                "grouping": [
+                    {
+                        "type": "Dimension",
+                        "name": "ResourceId"
+                    },
+                    {
+                        "type": "Dimension",
+                        "name": "ServiceName"
+                    },
+                    {
+                        "type": "Dimension",
+                        "name": "ResourceLocation"
+                    }
+                ]
+            }
+        }
+    
+    def get_top_cost_resources(self, start_date: datetime, end_date: datetime, 
+                             top_n: int = 10) -> Dict[str, Any]:
+        """Get top N most expensive resources"""
+        query_body = self._top_resources_query(start_date, end_date, top_n)
+        return self._run_usage_query(self.scope, query_body, "top_resources", top_n, description="top cost resources")
+    
+    @staticmethod
+    def _top_resources_query(start_date: datetime, end_date: datetime, top_n: int) -> Dict[str, Any]:
+        return {
+            "type": "ActualCost",
+            "timeframe": "Custom",
+            "timePeriod": {
+                "from": start_date.isoformat(),
+                "to": end_date.isoformat()
+            },
+            "dataset": {
+                "granularity": "None",
+                "aggregation": {
+                    "totalCost": {
+                        "name": "Cost",
+                        "function": "Sum"
+                    }
+                },
+                "grouping": [
+                    {
+                        "type": "Dimension",
+                        "name": "ResourceId"
+                    },
+                    {
+                        "type": "Dimension",
+                        "name": "ServiceName"
+                    }
+                ],
+                "sorting": [
+                    {
+                        "direction": "Descending",
+                        "name": "Cost"
+                    }
+                ]
+            },
+            "top": top_n
+        }
+    
+    def get_budget_analysis(self, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
+        """Get budget vs actual spending analysis"""
+        try:
+            # Get actual costs
+            actual_costs = self.get_subscription_costs(start_date, end_date, "Monthly")
+            
+            # Get budgets (if any are configured)
+            budgets = []
+            budgets_error = None
+            try:
+                scope = self.scope
+                with diagnostic_span('cost.budgets', scope=scope):
+                    budget_list = _cost_rate_limiter.call(
+                        lambda **kwargs: list(self.cost_client.budgets.list(scope, **kwargs))
+                    )
+                
+                for budget in budget_list:
+                    budgets.append(self._budget_record(budget))
+            except Exception as e:
+                logging.warning(f"Could not fetch budgets: {str(e)}")
+                budgets_error = error_result(e)
+            
+            return self._budget_analysis_result(start_date, end_date, actual_costs, budgets, budgets_error)
+            
+        except Exception as e:
+            logging.error(f"Error in budget analysis: {str(e)}")
+            return error_result(e)
+    
+    @staticmethod
+    def _budget_record(budget) -> Dict[str, Any]:
+        return {
+            "name": budget.name,
+            "amount": budget.amount,
+            "current_spend": budget.current_spend.amount if budget.current_spend else 0,
+            "forecasted_spend": budget.forecasted_spend.amount if budget.forecasted_spend else 0,
+            "time_grain": budget.time_grain,
+            "category": budget.category
+        }
+    
+    def _budget_analysis_result(self, start_date: datetime, end_date: datetime, actual_costs: Dict[str, Any],
+                                budgets: List[Dict[str, Any]],
+                                budgets_error: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        result = {
+            "subscription_id": self.subscription_id,
+            "scope": self.scope,
+            "period": {
+                "start": start_date.isoformat(),
+                "end": end_date.isoformat()
+            },
+            "actual_costs": actual_costs,
+            "budgets": budgets,
+            "complete": actual_costs.get("complete", False) and budgets_error is None,
+            "analysis_date": datetime.now().isoformat()
+        }
+        # Budgets that could not be read are reported, not silently shown as none configured
+        if budgets_error:
+            result["budgets_error"] = budgets_error
+        return result
+    
+    def get_cost_by_location(self, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
+        """Get costs broken down by Azure regions"""
+        query_body = self._location_costs_query(start_date, end_date)
+        return self._run_usage_query(self.scope, query_body, "by_location", description="costs by location")
+    
+    @staticmethod
+    def _location_costs_query(start_date: datetime, end_date: datetime) -> Dict[str, Any]:
+        return {
+            "type": "ActualCost",
+            "timeframe": "Custom",
+            "timePeriod": {
+                "from": start_date.isoformat(),
+                "to": end_date.isoformat()
+            },
+            "dataset": {
+                "granularity": "None",
+                "aggregation": {
+                    "totalCost": {
+                        "name": "Cost",
+                        "function": "Sum"
+                    }
+                },
+                "grouping": [
+                    {
+                        "type": "Dimension",
+                        "name": "ResourceLocation"
+                    },
+                    {
+                        "type": "Dimension",
+                        "name": "ServiceName"
+                    }
+                ],
+                "sorting": [
+                    {
+                        "direction": "Descending",
+                        "name": "Cost"
+                    }
+                ]
+            }
+        }
+    
+    def get_cost_rollup(self, start_date: datetime, end_date: datetime,
+                        group_by: Optional[List[str]] = None,
+                        time_grains: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Pull daily costs grouped by the requested dimensions once and derive every view locally"""
+        try:
+            group_by, time_grains, query_bodies = self._rollup_plan(start_date, end_date, group_by, time_grains)
+        except ValueError as e:
+            return {"error": str(e)}
+        
+        return self._run_rollup(self.scope, query_bodies, start_date, end_date, group_by, time_grains)
+    
+    @classmethod
+    def _rollup_plan(cls, start_date: datetime, end_date: datetime, group_by: Optional[List[str]],
+                     time_grains: Optional[List[str]]) -> Tuple[List[str], List[str], List[Dict[str, Any]]]:
+        """(group_by, time_grains, query bodies) for a rollup; ValueError for unknown dimensions or grains"""
+        group_by = group_by or ['service', 'location']
+        time_grains = time_grains or ['monthly']
+        
+        unknown = [name for name in group_by if name not in cls.ROLLUP_DIMENSIONS]
+        unknown += [grain for grain in time_grains if grain not in cls.ROLLUP_TIME_GRAINS]
+        if unknown:
+            raise ValueError(f"Unsupported rollup dimensions or time grains: {', '.join(unknown)}. "
+                             f"Dimensions: {', '.join(cls.ROLLUP_DIMENSIONS)}; time grains: {', '.join(cls.ROLLUP_TIME_GRAINS)}")
+        
+        # The query API accepts at most two groupings, so more dimensions need a second pull
+        dimensions = [cls.ROLLUP_DIMENSIONS[name] for name in group_by]
+        groupings = [dimensions[i:i + cls.MAX_QUERY_GROUPINGS]
+                     for i in range(0, len(dimensions), cls.MAX_QUERY_GROUPINGS)] or [[]]
+        
+        return group_by, time_grains, [cls._rollup_query(start_date, end_date, grouping) for grouping in groupings]
+    
+    def _run_rollup(self, scope: str, query_bodies: List[Dict[str, Any]], start_date: datetime,
+                    end_date: datetime, group_by: List[str], time_grains: List[str]) -> Dict[str, Any]:
+        rollup = self._new_rollup(start_date, end_date, group_by, time_grains, len(query_bodies))
+        windows = [(index, window) for index, query_body in enumerate(query_bodies)
+                   for window in self._split_time_period(query_body)]
+        fold_lock = threading.Lock()
+        
+        def pull(index: int, window: Dict[str, Any]) -> CostQueryPages:
+            # Pages are fetched concurrently; only folding into the shared totals is serialized
+            pages = self._usage_pages(scope, window)
+            for page in pages:
+                with fold_lock:
+                    self._add_rollup_page(rollup, page, index == 0)
+            return pages
+        
+        try:
+            with ContextThreadPoolExecutor(max_workers=min(COST_QUERY_WINDOW_WORKERS, len(windows))) as executor:
+                sources = list(executor.map(lambda item: pull(*item), windows))
+            return self._finish_rollup(rollup, sources)
+        except Exception as e:
+            logging.error(f"Error building cost rollup: {str(e)}")
+            return error_result(e)
+    
+    @staticmethod
+    def _rollup_query(start_date: datetime, end_date: datetime, grouping: List[str]) -> Dict[str, Any]:
+        return {
+            "type": "ActualCost",
+            "timeframe": "Custom",
+            "timePeriod": {
+                "from": start_date.isoformat(),
+                "to": end_date.isoformat()
+            },
+            "dataset": {
+                "granularity": "Daily",
+                "aggregation": {
+                    "totalCost": {
+                        "name": "Cost",
+                        "function": "Sum"
+                    }
+                },
+                "grouping": [{"type": "Dimension", "name": name} for name in grouping]
+            }
+        }
+    
+    def _new_rollup(self, start_date: datetime, end_date: datetime, group_by: List[str],
+                    time_grains: List[str], queries: int) -> Dict[str, Any]:
+        return {
+            "subscription_id": self.subscription_id,
+            "scope": self.scope,
+            "analysis_type": "rollup",
+            "period": {
+                "start": start_date.isoformat(),
+                "end": end_date.isoformat()
+            },
+            "group_by": group_by,
+            "time_grains": time_grains,
+            "total_cost": 0.0,
+            "currency": None,
+            "views": {},
+            "source": {"queries": queries}
+        }
+    
+    def _add_rollup_page(self, rollup: Dict[str, Any], page, is_base: bool) -> None:
+        """Fold one result page into the running group-by and time-bucket totals (vectorized via CostColumns)"""
+        table = CostColumns.from_result(page)
+        if not table.row_count:
+            return
+        
+        table_cost = table.cost_column()
+        costs = table.numeric(table_cost)
+        views = rollup["views"]
+        date_column = table.find(("UsageDate",))
+        bucket_columns = {grain: self._add_time_bucket(table, date_column, grain)
+                          for grain in rollup["time_grains"]} if date_column else {}
+        
+        # Totals and time series come from the first pull only; every pull covers the same costs
+        if is_base:
+            rollup["total_cost"] += table.total(table_cost)
+            currency_column = table.find(("Currency",))
+            if rollup["currency"] is None and currency_column:
+                rollup["currency"] = table.data[currency_column][0]
+            for grain, bucket_column in bucket_columns.items():
+                self._accumulate(views.setdefault(grain, {}), table.group_sum([bucket_column], table_cost, costs))
+        
+        for name in rollup["group_by"]:
+            dimension = table.find((self.ROLLUP_DIMENSIONS[name],))
+            if not dimension:
+                continue
+            
+            self._accumulate(views.setdefault(f"by_{name}", {}), table.group_sum([dimension], table_cost, costs))
+            
+            for grain, bucket_column in bucket_columns.items():
+                series = views.setdefault(f"by_{name}_{grain}", {})
+                for (value, bucket), cost in table.group_sum([dimension, bucket_column], table_cost, costs).items():
+                    self._accumulate(series.setdefault(value, {}), {bucket: cost})
+    
+    @staticmethod
+    def _accumulate(totals: Dict[Any, float], additions: Dict[Any, float]) -> None:
+        for key, cost in additions.items():
+            totals[key] = totals.get(key, 0.0) + cost
+    
+    def _finish_rollup(self, rollup: Dict[str, Any], sources: List[CostQueryPages]) -> Dict[str, Any]:
+        """Order the accumulated views and record how much of each pull was read"""
+        views = {}
+        for key, totals in rollup["views"].items():
+            if key in rollup["time_grains"]:
+                views[key] = dict(sorted(totals.items()))
+            elif key.startswith("by_") and any(isinstance(value, dict) for value in totals.values()):
+                views[key] = {value: dict(sorted(series.items())) for value, series in totals.items()}
+            else:
+                views[key] = dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+        
+        rollup["views"] = views
+        rollup["currency"] = rollup["currency"] or "USD"
+        rollup["source"].update({
+            "rows": sum(pages.row_count for pages in sources),
+            "pages": sum(pages.page_count for pages in sources),
+            "windows": len(sources),
+            "complete": all(pages.complete for pages in sources)
+        })
+        rollup["complete"] = rollup["source"]["complete"]
+        return rollup
+    
+    @classmethod
+    def _add_time_bucket(cls, table: CostColumns, date_column: str, grain: str) -> str:
+        """Derive a bucket label column (parsing each distinct usage date once)"""
+        bucket_column = f"_{grain}_bucket"
+        labels = {}
+        for value in table.data[date_column]:
+            if value not in labels:
+                labels[value] = cls._time_bucket(value, grain)
+        table.data[bucket_column] = [labels[value] for value in table.data[date_column]]
+        return bucket_column
+    
+    @staticmethod
+    def _time_bucket(value: Any, grain: str) -> str:
+        """Bucket label for a UsageDate (20250901 or ISO string): YYYY-MM-DD, week-start YYYY-MM-DD or YYYY-MM"""
+        text = str(value)
+        if text[:8].isdigit():
+            day = datetime(int(text[:4]), int(text[4:6]), int(text[6:8]))
+        else:
+            day = datetime.fromisoformat(text[:10])
+        
+        if grain == 'monthly':
+            return day.strftime('%Y-%m')
+        if grain == 'weekly':
+            return (day - timedelta(days=day.weekday())).strftime('%Y-%m-%d')
+        return day.strftime('%Y-%m-%d')
+    
+    def _collect_window(self, scope: str, query_body, analysis_type: str,
+                        metadata: Any = None) -> Tuple[Dict[str, Any], CostQueryPages]:
+        """Fold every page of one query window into a partial result, one page at a time"""
+        pages = self._usage_pages(scope, query_body)
+        processed_result = self._new_cost_result(analysis_type, metadata)
+        for page in pages:
+            self._add_cost_page(processed_result, page)
+        return processed_result, pages
+    
+    def _new_cost_result(self, analysis_type: str, metadata: Any = None) -> Dict[str, Any]:
+        processed_result = {
+            "subscription_id": self.subscription_id,
+            "scope": self.scope,
+            "analysis_type": analysis_type,
+            "metadata": metadata,
+            "total_cost": 0.0,
+            "currency": "USD",
+            "rows": [],
+            "columns": []
+        }
+        
+        if self.output_format == 'columnar':
+            # One array per column (resolved by name) instead of one dict per row
+            del processed_result["rows"]
+            processed_result.update({"format": "columnar", "row_count": 0, "data": {}})
+        
+        return processed_result
+    
+    def _add_cost_page(self, processed_result: Dict[str, Any], page) -> None:
+        """Append one result page; the raw page is not kept once its rows are folded in"""
+        if not processed_result["columns"] and getattr(page, 'columns', None):
+            processed_result["columns"] = [col.name for col in page.columns]
+        rows = getattr(page, 'rows', None) or []
+        
+        if self.output_format == 'columnar':
+            data = processed_result["data"]
+            for i, name in enumerate(processed_result["columns"]):
+                data.setdefault(name, []).extend(row[i] if i < len(row) else None for row in rows)
+            processed_result["row_count"] += len(rows)
+            return
+        
+        for row in rows:
+            if row and len(row) > 0:
+                # First column is usually the cost
+                cost = float(row[0]) if row[0] else 0.0
+                processed_result["total_cost"] += cost
+                
+                processed_row = {
+                    "cost": cost,
+                    "data": row[1:] if len(row) > 1 else []
+                }
+                processed_result["rows"].append(processed_row)
+    
+    def _merge_windows(self, parts: List[Tuple[Dict[str, Any], CostQueryPages]], analysis_type: str,
+                       metadata: Any = None) -> Dict[str, Any]:
+        """Concatenate per-window partial results in window order and finish the totals"""
+        if len(parts) == 1:
+            processed_result = parts[0][0]
+        else:
+            processed_result = self._new_cost_result(analysis_type, metadata)
+            processed_result["windows"] = len(parts)
+            for part, _ in parts:
+                processed_result["columns"] = processed_result["columns"] or part["columns"]
+                if self.output_format == 'columnar':
+                    for name in processed_result["columns"]:
+                        processed_result["data"].setdefault(name, []).extend(
+                            part["data"].get(name, [None] * part["row_count"]))
+                    processed_result["row_count"] += part["row_count"]
+                else:
+                    processed_result["rows"].extend(part["rows"])
+                    processed_result["total_cost"] += part["total_cost"]
+        
+        if self.output_format == 'columnar':
+            self._finish_columnar_result(processed_result)
+        
+        processed_result.update(CostQueryPages.combined_summary([pages for _, pages in parts]))
+        return processed_result
+    
+    def _finish_columnar_result(self, processed_result: Dict[str, Any]) -> None:
+        """Totals and requested group-bys over the accumulated columns"""
+        names = processed_result["columns"]
+        data = processed_result["data"]
+        for name in names:
+            data.setdefault(name, [])
+        table = CostColumns.from_columns(names, data)
+        cost_column = table.cost_column()
+        currency_column = table.find(("Currency",))
+        
+        if cost_column and table.row_count:
+            processed_result["total_cost"] = table.total(cost_column)
+        if currency_column and table.row_count:
+            processed_result["currency"] = table.data[currency_column][0]
+        
+        # Requested group-bys over the returned columns, e.g. {"ServiceName": {"Storage": 12.5, ...}}
+        if cost_column and self.group_totals:
+            costs = table.numeric(cost_column)
+            processed_result["totals_by"] = {
+                column: table.group_sum([column], cost_column, costs)
+                for column in (table.find((name,)) for name in self.group_totals) if column
+            }
+    
+    def get_specific_resources_cost(self, resource_ids: List[str], start_date: datetime,
+                                  end_date: datetime) -> Dict[str, Any]:
+        """Get costs for specific resource IDs using batched ResourceId queries (per-resource only as fallback)"""
+        logging.info(f"Querying costs for {len(resource_ids)} resources in batches")
+        
+        return self._get_batched_resource_costs(resource_ids, start_date, end_date,
+                                                self._new_resource_costs(start_date, end_date))
+    
+    def _new_resource_costs(self, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
+        return {
+            "subscription_id": self.subscription_id,
+            "scope": self.scope,
+            "period": {
+                "start": start_date.isoformat(),
+                "end": end_date.isoformat()
+            },
+            "resources": [],
+            "total_cost": 0.0
+        }
+    
+    def _get_batched_resource_costs(self, resource_ids: List[str], start_date: datetime,
+                                    end_date: datetime, results: Dict[str, Any]) -> Dict[str, Any]:
+        """Query costs with one `ResourceId In [...]` query per chunk, split back into per-resource daily costs"""
+        # Daily rows per resource = days in range, so size chunks to keep a batch within one result page
+        days = max(1, (end_date.date() - start_date.date()).days + 1)
+        chunk_size = max(1, min(self.MAX_RESOURCE_BATCH_SIZE, self.COST_QUERY_ROW_LIMIT // days))
+        
+        costs_by_id = {}
+        failed_ids = []
+        batch_queries = 0
+        position = 0
+        
+        while position < len(resource_ids):
+            chunk = resource_ids[position:position + chunk_size]
+            batch_queries += 1
+            
+            try:
+                costs_by_id.update(self._query_resource_batch(chunk, start_date, end_date))
+            except Exception as e:
+                if len(chunk) > 1 and not isinstance(e, CircuitOpenError):
+                    # Adaptive chunking: retry the same position with half the batch, and keep
+                    # later batches at that size rather than re-trying a size that already failed
+                    chunk_size = max(1, len(chunk) // 2)
+                    logging.warning(f"Batch cost query for {len(chunk)} resources failed ({str(e)}), retrying with batches of {chunk_size}")
+                    continue
+                
+                logging.warning(f"Batch cost query failed for {chunk[0]}, falling back to an individual query: {str(e)}")
+                failed_ids.extend(chunk)
+            
+            position += len(chunk)
+        
+        fallback_costs = {}
+        if failed_ids:
+            fallback_results = {"resources": [], "total_cost": 0.0}
+            self._get_individual_resource_costs(failed_ids, start_date, end_date, fallback_results)
+            fallback_costs = {entry["resource_id"]: entry for entry in fallback_results["resources"]}
+        
+        return self._assemble_resource_costs(resource_ids, costs_by_id, fallback_costs, results,
+                                             batch_queries, len(failed_ids))
+    
+    def _assemble_resource_costs(self, resource_ids: List[str], costs_by_id: Dict[str, Dict[str, Any]],
+                                 fallback_costs: Dict[str, Dict[str, Any]], results: Dict[str, Any],
+                                 batch_queries: int, individual_queries: int) -> Dict[str, Any]:
+        """Fill per-resource entries in request order from batch costs, falling back to per-resource entries"""
+        # Assemble in request order; resources with no usage rows cost $0.00
+        for resource_id in resource_ids:
+            if resource_id in fallback_costs:
+                entry = fallback_costs[resource_id]
+            else:
+                resource_costs = costs_by_id.get(resource_id.lower(), {"total_cost": 0.0, "daily_costs": []})
+                entry = {
+                    "resource_id": resource_id,
+                    "total_cost": resource_costs["total_cost"],
+                    "daily_costs": resource_costs["daily_costs"]
+                }
+            
+            results["resources"].append(entry)
+            results["total_cost"] += entry.get("total_cost", 0.0)
+        
+        results["query_stats"] = {
+            "batch_queries": batch_queries,
+            "individual_queries": individual_queries
+        }
+        # Truncated batches are retried smaller, so only resources that still failed leave gaps
+        results["complete"] = not any("error" in entry for entry in results["resources"])
+        logging.info(f"Resolved costs for {len(resource_ids)} resources with {batch_queries} batch queries and {individual_queries} individual queries")
+        
+        return results
+    
+    def _query_resource_batch(self, resource_ids: List[str], start_date: datetime,
+                              end_date: datetime) -> Dict[str, Dict[str, Any]]:
+        """Run one ResourceId-filtered query grouped by ResourceId and date; keyed by lower-cased resource ID"""
+        scope = self.scope
+        pages = self._usage_pages(scope, self._resource_batch_query(resource_ids, start_date, end_date))
+        costs_by_id = {}
+        for page in pages:
+            self._add_resource_batch_page(costs_by_id, page)
+        return self._checked_resource_batch(costs_by_id, pages)
+    
+    @staticmethod
+    def _resource_batch_query(resource_ids: List[str], start_date: datetime, end_date: datetime) -> Dict[str, Any]:
+        return {
+            "type": "ActualCost",
+            "timeframe": "Custom",
+            "timePeriod": {
+                "from": start_date.isoformat(),
+                "to": end_date.isoformat()
+            },
+            "dataset": {
+                "granularity": "Daily",
+                "aggregation": {
+                    "totalCost": {
+                        "name": "Cost",
+                        "function": "Sum"
+                    }
+                },
+                "filter": {
+                    "dimensions": {
+                        "name": "ResourceId",
+                        "operator": "In",
+                        "values": resource_ids
+                    }
+                },
+                "grouping": [
+                    {
+                        "type": "Dimension",
+                        "name": "ResourceId"
+                    }
+                ]
+            }
+        }
+    
+    def get_resource_cost_totals(self, resource_ids: List[str], start_date: datetime,
+                                 end_date: datetime) -> Dict[str, Any]:
+        """Period totals per resource from a single ResourceId-grouped query, keyed by lower-cased resource ID"""
+        scope = self.scope
+        totals = {"costs": {}, "currency": None}
+        
+        try:
+            pages = self._usage_pages(scope, self._resource_totals_query(resource_ids, start_date, end_date))
+            for page in pages:
+                self._add_resource_totals_page(totals, page)
+            totals.update(pages.summary())
+            return totals
+        except Exception as e:
+            logging.error(f"Error fetching resource cost totals: {str(e)}")
+            return error_result(e)
+    
+    @classmethod
+    def _resource_totals_query(cls, resource_ids: List[str], start_date: datetime, end_date: datetime) -> Dict[str, Any]:
+        query_body = cls._resource_batch_query(resource_ids, start_date, end_date)
+        query_body["dataset"]["granularity"] = "None"
+        if len(resource_ids) > cls.MAX_RESOURCE_FILTER_VALUES:
+            # Too many IDs for one filter: group the whole scope by ResourceId and let the join pick the matches
+            del query_body["dataset"]["filter"]
+        return query_body
+    
+    def _add_resource_totals_page(self, totals: Dict[str, Any], result) -> None:
+        columns = [col.name for col in result.columns] if getattr(result, 'columns', None) else []
+        cost_index = self._column_index(columns, ("Cost", "PreTaxCost", "CostUSD"), 0)
+        resource_index = self._column_index(columns, ("ResourceId",), 1)
+        currency_index = self._column_index(columns, ("Currency",), -1)
+        
+        costs = totals["costs"]
+        for row in result.rows or []:
+            if not row or len(row) <= resource_index:
+                continue
+            resource_id = str(row[resource_index]).lower()
+            costs[resource_id] = costs.get(resource_id, 0.0) + (float(row[cost_index]) if row[cost_index] else 0.0)
+            if totals["currency"] is None and currency_index >= 0 and len(row) > currency_index:
+                totals["currency"] = row[currency_index]
+    
+    @staticmethod
+    def _checked_resource_batch(costs_by_id: Dict[str, Dict[str, Any]], pages: CostQueryPages) -> Dict[str, Dict[str, Any]]:
+        # A truncated batch would silently under-report costs, so treat it as a failure and shrink
+        if not pages.complete:
+            raise ValueError(f"Batch result incomplete after {pages.page_count} pages")
+        return costs_by_id
+    
+    def _add_resource_batch_page(self, costs_by_id: Dict[str, Dict[str, Any]], result) -> None:
+        """Split one page of a ResourceId-grouped batch result into per-resource totals and daily costs"""
+        columns = [col.name for col in result.columns] if getattr(result, 'columns', None) else []
+        cost_index = self._column_index(columns, ("Cost", "PreTaxCost", "CostUSD"), 0)
+        date_index = self._column_index(columns, ("UsageDate",), 1)
+        resource_index = self._column_index(columns, ("ResourceId",), 2)
+        
+        for row in result.rows or []:
+            if not row or len(row) <= resource_index:
+                continue
+            
+            resource_costs = costs_by_id.setdefault(
+                str(row[resource_index]).lower(), {"total_cost": 0.0, "daily_costs": []}
+            )
+            cost = float(row[cost_index]) if row[cost_index] else 0.0
+            date_value = row[date_index] if len(row) > date_index else ""
+            resource_costs["total_cost"] += cost
+            resource_costs["daily_costs"].append({
+                "date": str(date_value) if date_value else "",
+                "cost": cost
+            })
+    
+    @staticmethod
+    def _column_index(columns: List[str], names, default: int) -> int:
+        """Resolve a result column position by name (case-insensitive)"""
+        lowered = [column.lower() for column in columns]
+        for name in names:
+            if name.lower() in lowered:
+                return lowered.index(name.lower())
+        return default
+    
+    def _get_individual_resource_costs(self, resource_ids: List[str], start_date: datetime,
+                                     end_date: datetime, results: Dict[str, Any]) -> Dict[str, Any]:
+        """Fallback method: Query each resource individually (pacing and 429 backoff come from the shared rate limiter)"""
+        logging.warning("Falling back to individual resource queries due to batch query failure")
+        
+        for i, resource_id in enumerate(resource_ids):
+            try:
+                pages = self._usage_pages(self.scope, self._individual_resource_query(resource_id, start_date, end_date))
+                daily_costs = []
+                for result in pages:
+                    daily_costs.extend(self._daily_cost_rows(result))
+                entry = self._individual_cost_entry(resource_id, daily_costs, pages)
+            except Exception as e:
+                logging.error(f"Cost query failed for resource {resource_id}: {str(e)}")
+                entry = {"resource_id": resource_id, **error_result(e)}
+            self._add_individual_cost(results, entry, i, len(resource_ids))
+        
+        return results
+    
+    @staticmethod
+    def _individual_resource_query(resource_id: str, start_date: datetime, end_date: datetime):
+        from azure.mgmt.costmanagement.models import (
+            QueryDefinition, QueryTimePeriod, QueryDataset, 
+            QueryAggregation, QueryFilter, QueryComparisonExpression
+        )
+        
+        # Use the same QueryDefinition format that works in our tests
+        return QueryDefinition(
+            type="ActualCost",
+            timeframe="Custom",
+            time_period=QueryTimePeriod(
+                from_property=start_date,
+                to=end_date
+            ),
+            dataset=QueryDataset(
+                granularity="Daily",
+                aggregation={
+                    "totalCost": QueryAggregation(name="Cost", function="Sum")
+                },
+                filter=QueryFilter(
+                    dimensions=QueryComparisonExpression(
+                        name="ResourceId",
+                        operator="In",
+                        values=[resource_id]
+                    )
+                )
+            )
+        )
+    
+    @staticmethod
+    def _daily_cost_rows(result) -> List[Dict[str, Any]]:
+        daily_costs = []
+        for row in result.rows or []:
+            if row and len(row) > 0:
+                cost = float(row[0]) if row[0] else 0.0
+                # Parse date from the second column
+                date_value = row[1] if len(row) > 1 else ""
+                daily_costs.append({
+                    "date": str(date_value) if date_value else "",
+                    "cost": cost
+                })
+        return daily_costs
+    
+    @staticmethod
+    def _individual_cost_entry(resource_id: str, daily_costs: List[Dict[str, Any]], pages: CostQueryPages) -> Dict[str, Any]:
+        if not pages.complete:
+            raise ValueError(f"Cost result incomplete after {pages.page_count} pages")
+        return {
+            "resource_id": resource_id,
+            "total_cost": sum(day["cost"] for day in daily_costs),
+            "daily_costs": daily_costs
+        }
+    
+    @staticmethod
+    def _add_individual_cost(results: Dict[str, Any], entry: Dict[str, Any], index: int, count: int) -> None:
+        results["resources"].append(entry)
+        if "error" in entry:
+            return
+        
+        resource_cost = entry["total_cost"]
+        results["total_cost"] += resource_cost
+        resource_id = entry["resource_id"]
+        resource_name = resource_id.split('/')[-1] if '/' in resource_id else resource_id
+        if resource_cost > 0:
+            logging.info(f"✅ Resource {index+1}/{count} ({resource_name}): ${resource_cost:.2f}")
+        else:
+            logging.info(f"⚪ Resource {index+1}/{count} ({resource_name}): $0.00")
+
+
+class AsyncCostManagementAnalyzer(CostManagementAnalyzer):
+    """CostManagementAnalyzer on the aio Cost Management client (use as an async context manager).
+
+    Every query method is a coroutine returning the same result dict as its sync counterpart
+    (validation failures included), so many queries can be awaited concurrently from one event
+    loop while still drawing from the shared rate limiter and result cache.
+    """
+    
+    def __init__(self, subscription_id: Optional[str], use_cache: bool = True, output_format: str = 'rows',
+                 group_totals: Optional[List[str]] = None, scope: Optional[str] = None,
+                 credential=None, cost_client=None):
+        self.credential = credential
+        self.cost_client = cost_client
+        super().__init__(subscription_id, use_cache=use_cache, output_format=output_format,
+                         group_totals=group_totals, scope=scope)
+    
+    def _init_clients(self) -> None:
+        # aio clients are bound to the running loop, so they are opened per request and closed on exit;
+        # analyzers fanned out over several scopes share the caller's credential and client
+        self._owns_credential = self.credential is None
+        self.credential = self.credential or AsyncDefaultAzureCredential()
+        self._owns_client = self.cost_client is None
+        self.cost_client = self.cost_client or AsyncCostManagementClient(
+            self.credential, **async_client_policies(retry_throttled=False)
+        )
+        if self._owns_client:
+            self._add_client_type_header(self.cost_client)
+        self.resource_client = None
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        await self.close()
+    
+    async def close(self) -> None:
+        if self._owns_client:
+            await self.cost_client.close()
+        if self._owns_credential:
+            await self.credential.close()
+    
+    async def _query_usage(self, scope: str, query_body):
+        normalized_body, cache_key, cached = self._cache_lookup(scope, query_body)
+        if cached is not None:
+            return cached
+        
+        with diagnostic_span('cost.query', scope=scope):
+            result = await _cost_rate_limiter.call_async(self.cost_client.query.usage, scope, query_body)
+        count_diagnostic('pages')
+        return self._cache_store(cache_key, normalized_body, result)
+    
+    async def _collect_window(self, scope: str, query_body, analysis_type: str,
+                              metadata: Any = None) -> Tuple[Dict[str, Any], CostQueryPages]:
+        pages = self._usage_pages(scope, query_body)
+        processed_result = self._new_cost_result(analysis_type, metadata)
+        async for page in pages:
+            self._add_cost_page(processed_result, page)
+        return processed_result, pages
+    
+    async def _query_next_page(self, scope: str, query_body, previous, page: int):
+        normalized_body, cache_key, cached = self._cache_lookup(scope, query_body, page, previous.chain)
+        if cached is not None:
+            return cached
+        
+        with diagnostic_span('cost.next_page', scope=scope, page=page + 1):
+            result = await _cost_rate_limiter.call_async(self._post_next_link, previous.next_link, normalized_body)
+        count_diagnostic('pages')
+        return self._cache_store(cache_key, normalized_body, result, previous.chain)
+    
+    async def _post_next_link(self, next_link: str, query_body: Dict[str, Any], **kwargs):
+        response = await self.cost_client._client.send_request(HttpRequest("POST", next_link, json=query_body), **kwargs)
+        response.raise_for_status()
+        return self._page_from_json(response.json())
+    
+    async def _run_usage_query(self, scope: str, query_body, analysis_type: str,
+                               metadata: Any = None, description: str = "costs") -> Dict[str, Any]:
+        try:
+            windows = self._split_time_period(query_body)
+            parts = await asyncio.gather(*(self._collect_window(scope, window, analysis_type, metadata)
+                                           for window in windows))
+            return self._merge_windows(list(parts), analysis_type, metadata)
+            
+        except Exception as e:
+            logging.error(f"Error fetching {description}: {str(e)}")
+            return error_result(e)
+    
+    async def _run_rollup(self, scope: str, query_bodies: List[Dict[str, Any]], start_date: datetime,
+                          end_date: datetime, group_by: List[str], time_grains: List[str]) -> Dict[str, Any]:
+        rollup = self._new_rollup(start_date, end_date, group_by, time_grains, len(query_bodies))
+        
+        async def pull(index: int, window: Dict[str, Any]) -> CostQueryPages:
+            pages = self._usage_pages(scope, window)
+            async for page in pages:
+                self._add_rollup_page(rollup, page, index == 0)
+            return pages
+        
+        try:
+            sources = await asyncio.gather(*(pull(index, window) for index, query_body in enumerate(query_bodies)
+                                             for window in self._split_time_period(query_body)))
+            return self._finish_rollup(rollup, list(sources))
+        except Exception as e:
+            logging.error(f"Error building cost rollup: {str(e)}")
+            return error_result(e)
+    
+    async def get_subscription_costs(self, start_date: datetime, end_date: datetime,
+                                     granularity: str = "Daily") -> Dict[str, Any]:
+        query_body = self._subscription_costs_query(start_date, end_date, granularity)
+        return await self._run_usage_query(self.scope, query_body, "subscription", description="subscription costs")
+    
+    async def get_resource_group_costs(self, resource_group: str, start_date: datetime,
+                                       end_date: datetime, granularity: str = "Daily") -> Dict[str, Any]:
+        if not self.subscription_id:
+            return {"error": "resource_group query requires a subscription scope"}
+        
+        scope = f"{self.scope}/resourceGroups/{resource_group}"
+        query_body = self._resource_group_costs_query(start_date, end_date, granularity)
+        return await self._run_usage_query(scope, query_body, "resource_group", resource_group,
+                                           description="resource group costs")
+    
+    async def get_resource_costs_by_service(self, service_names: List[str], start_date: datetime,
+                                            end_date: datetime) -> Dict[str, Any]:
+        query_body = self._service_costs_query(service_names, start_date, end_date)
+        return await self._run_usage_query(self.scope, query_body, "service_filter", service_names,
+                                           description="service costs")
+    
+    async def get_top_cost_resources(self, start_date: datetime, end_date: datetime,
+                                     top_n: int = 10) -> Dict[str, Any]:
+        query_body = self._top_resources_query(start_date, end_date, top_n)
+        return await self._run_usage_query(self.scope, query_body, "top_resources", top_n,
+                                           description="top cost resources")
+    
+    async def get_cost_by_location(self, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
+        query_body = self._location_costs_query(start_date, end_date)
+        return await self._run_usage_query(self.scope, query_body, "by_location", description="costs by location")
+    
+    async def get_cost_rollup(self, start_date: datetime, end_date: datetime,
+                              group_by: Optional[List[str]] = None,
+                              time_grains: Optional[List[str]] = None) -> Dict[str, Any]:
+        try:
+            group_by, time_grains, query_bodies = self._rollup_plan(start_date, end_date, group_by, time_grains)
+        except ValueError as e:
+            return {"error": str(e)}
+        
+        return await self._run_rollup(self.scope, query_bodies, start_date, end_date, group_by, time_grains)
+    
+    async def get_specific_resources_cost(self, resource_ids: List[str], start_date: datetime,
+                                          end_date: datetime) -> Dict[str, Any]:
+        logging.info(f"Querying costs for {len(resource_ids)} resources in batches")
+        
+        return await self._get_batched_resource_costs(resource_ids, start_date, end_date,
+                                                      self._new_resource_costs(start_date, end_date))
+    
+    async def get_budget_analysis(self, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
+        """Get budget vs actual spending analysis (actual costs and budgets are fetched concurrently)"""
+        scope = self.scope
+        
+        async def list_budgets(**kwargs):
+            with diagnostic_span('cost.budgets', scope=scope):
+                return [budget async for budget in self.cost_client.budgets.list(scope, **kwargs)]
+        
+        actual_costs, budget_list = await asyncio.gather(
+            self.get_subscription_costs(start_date, end_date, "Monthly"),
+            _cost_rate_limiter.call_async(list_budgets),
+            return_exceptions=True
+        )
+        
+        if isinstance(actual_costs, BaseException):
+            logging.error(f"Error in budget analysis: {str(actual_costs)}")
+            return error_result(actual_costs)
+        
+        budgets = []
+        budgets_error = None
+        if isinstance(budget_list, BaseException):
+            logging.warning(f"Could not fetch budgets: {str(budget_list)}")
+            budgets_error = error_result(budget_list)
+        else:
+            budgets = [self._budget_record(budget) for budget in budget_list]
+        
+        return self._budget_analysis_result(start_date, end_date, actual_costs, budgets, budgets_error)
+    
+    async def _get_batched_resource_costs(self, resource_ids: List[str], start_date: datetime,
+                                          end_date: datetime, results: Dict[str, Any]) -> Dict[str, Any]:
+        """Batched ResourceId queries, all chunks in flight at once; failing chunks are split in half"""
+        days = max(1, (end_date.date() - start_date.date()).days + 1)
+        chunk_size = max(1, min(self.MAX_RESOURCE_BATCH_SIZE, self.COST_QUERY_ROW_LIMIT // days))
+        chunks = [resource_ids[i:i + chunk_size] for i in range(0, len(resource_ids), chunk_size)]
+        
+        outcomes = await asyncio.gather(*(self._query_batch_adaptive(chunk, start_date, end_date) for chunk in chunks))
+        
+        costs_by_id = {}
+        failed_costs = {}
+        batch_queries = 0
+        for chunk_costs, chunk_failures, chunk_queries in outcomes:
+            costs_by_id.update(chunk_costs)
+            failed_costs.update(chunk_failures)
+            batch_queries += chunk_queries
+        
+        # A single-resource batch is already the per-resource query, so failures there are final
+        return self._assemble_resource_costs(resource_ids, costs_by_id, failed_costs, results,
+                                             batch_queries, 0)
+    
+    async def _query_batch_adaptive(self, resource_ids: List[str], start_date: datetime,
+                                    end_date: datetime) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]], int]:
+        """(costs by lower-cased ID, error entries by ID, queries issued) for one chunk"""
+        try:
+            costs = await self._query_resource_batch(resource_ids, start_date, end_date)
+            return costs, {}, 1
+        except CircuitOpenError as e:
+            # Splitting the batch cannot help while Cost Management is failing fast for this scope
+            return {}, {resource_id: {"resource_id": resource_id, **error_result(e)} for resource_id in resource_ids}, 1
+        except Exception as e:
+            if len(resource_ids) == 1:
+                logging.error(f"Cost query failed for resource {resource_ids[0]}: {str(e)}")
+                return {}, {resource_ids[0]: {"resource_id": resource_ids[0], **error_result(e)}}, 1
+            
+            middle = len(resource_ids) // 2
+            logging.warning(f"Batch cost query for {len(resource_ids)} resources failed ({str(e)}), retrying as two batches of {middle}")
+            halves = await asyncio.gather(
+                self._query_batch_adaptive(resource_ids[:middle], start_date, end_date),
+                self._query_batch_adaptive(resource_ids[middle:], start_date, end_date)
+            )
+            costs, failures, queries = {}, {}, 1
+            for half_costs, half_failures, half_queries in halves:
+                costs.update(half_costs)
+                failures.update(half_failures)
+                queries += half_queries
+            return costs, failures, queries
+    
+    async def get_resource_cost_totals(self, resource_ids: List[str], start_date: datetime,
+                                       end_date: datetime) -> Dict[str, Any]:
+        scope = self.scope
+        totals = {"costs": {}, "currency": None}
+        
+        try:
+            pages = self._usage_pages(scope, self._resource_totals_query(resource_ids, start_date, end_date))
+            async for page in pages:
+                self._add_resource_totals_page(totals, page)
+            totals.update(pages.summary())
+            return totals
+        except Exception as e:
+            logging.error(f"Error fetching resource cost totals: {str(e)}")
+            return error_result(e)
+    
+    async def _query_resource_batch(self, resource_ids: List[str], start_date: datetime,
+                                    end_date: datetime) -> Dict[str, Dict[str, Any]]:
+        scope = self.scope
+        pages = self._usage_pages(scope, self._resource_batch_query(resource_ids, start_date, end_date))
+        costs_by_id = {}
+        async for page in pages:
+            self._add_resource_batch_page(costs_by_id, page)
+        return self._checked_resource_batch(costs_by_id, pages)
+    
+    async def _get_individual_resource_costs(self, resource_ids: List[str], start_date: datetime,
+                                             end_date: datetime, results: Dict[str, Any]) -> Dict[str, Any]:
+        """Per-resource queries, all in flight at once; entries are added in request order"""
+        async def query(resource_id: str) -> Dict[str, Any]:
+            try:
+                pages = self._usage_pages(self.scope, self._individual_resource_query(resource_id, start_date, end_date))
+                daily_costs = []
+                async for result in pages:
+                    daily_costs.extend(self._daily_cost_rows(result))
+                return self._individual_cost_entry(resource_id, daily_costs, pages)
+            except Exception as e:
+                logging.error(f"Cost query failed for resource {resource_id}: {str(e)}")
+                return {"resource_id": resource_id, **error_result(e)}
+        
+        entries = await asyncio.gather(*(query(resource_id) for resource_id in resource_ids))
+        for index, entry in enumerate(entries):
+            self._add_individual_cost(results, entry, index, len(resource_ids))
+        return results
+
+
+def query_cost_management_direct(query_params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Main function for direct Cost Management API queries
+    
+    Parameters (exactly one scope parameter is required):
+    - subscription_id: Azure subscription ID
+    - subscription_ids: List of subscription IDs, queried concurrently and merged with per-scope subtotals
+    - management_group_id: Management group ID, answered by a single management-group scoped query
+    - billing_scope: Billing scope path (e.g. /providers/Microsoft.Billing/billingAccounts/{id}), single query
+    - query_type: Type of query (subscription, resource_group, service, top_resources, budget, location, rollup, specific_resources)
+    - start_date: Start date in ISO format (required)
+    - end_date: End date in ISO format (required)
+    - resource_group: Resource group name (for resource_group query)
+    - service_names: List of service names (for service query)
+    - resource_ids: List of resource IDs (for specific_resources query)
+    - top_n: Number of top resources (for top_resources query, default: 10)
+    - granularity: Data granularity (Daily, Monthly, None - default: Daily)
+    - use_cache: Serve repeated queries from the cost query result cache (default: true)
+    - output_format: 'rows' (default, one object per row) or 'columnar' (one array per column)
+    - group_totals: Columns to total cost by in columnar output, e.g. ["ServiceName", "ResourceLocation"]
+    - group_by: Rollup dimensions (service, location, resource_group - default: service, location)
+    - time_grains: Rollup time buckets (daily, weekly, monthly - default: monthly)
+    - diagnostics: Add a '_diagnostics' section with timing spans and counters for this request (default: false)
+
+    Multi-page results are read to the end by following next_link (up to COST_QUERY_MAX_PAGES
+    pages); `complete` in the response is false when a result had to be cut short.
+    """
+    with request_diagnostics('cost_analysis', query_params):
+        try:
+            scopes = _resolve_cost_scopes(query_params)
+            query_type, start_date, end_date = _parse_cost_query(query_params)
+            use_cache = _parse_flag(query_params, 'use_cache', True)
+        except ValueError as e:
+            return {'error': str(e)}
+        
+        # Initialize one analyzer per scope (they share the cached client, rate limiter and result cache)
+        analyzers = [
+            CostManagementAnalyzer(
+                subscription_id,
+                use_cache=use_cache,
+                output_format=query_params.get('output_format', 'rows'),
+                group_totals=query_params.get('group_totals'),
+                scope=scope
+            )
+            for subscription_id, scope in scopes
+        ]
+        
+        if len(analyzers) == 1:
+            result = _execute_cost_query(analyzers[0], query_type, query_params, start_date, end_date)
+        else:
+            try:
+                scoped_queries, unmatched_ids = _scoped_cost_queries(query_type, query_params, analyzers)
+            except ValueError as e:
+                return {'error': str(e)}
+            worker_count = max(1, min(COST_SCOPE_FANOUT_WORKERS, len(scoped_queries)))
+            with ContextThreadPoolExecutor(max_workers=worker_count, thread_name_prefix='cost-scope') as executor:
+                scope_results = list(executor.map(
+                    lambda scoped: _execute_cost_query(scoped[0], query_type, scoped[1], start_date, end_date),
+                    scoped_queries
+                ))
+            result = _merge_scope_results(query_type, query_params,
+                                          [analyzer for analyzer, _ in scoped_queries], scope_results, unmatched_ids)
+        
+        # Surface per-request cache effectiveness in the response metadata
+        if isinstance(result, dict):
+            result['cache'] = _combined_cache_stats(analyzers)
+        
+        attach_diagnostics(result, query_params)
+        return result
+
+
+def _resolve_cost_scopes(query_params: Dict[str, Any]) -> List[Tuple[Optional[str], str]]:
+    """(subscription_id, scope) pairs for the request; management group and billing scopes are single queries"""
+    given = [key for key in ('subscription_id', 'subscription_ids', 'management_group_id', 'billing_scope')
+             if query_params.get(key)]
+    if not given:
+        raise ValueError('subscription_id is required (or subscription_ids, management_group_id or billing_scope)')
+    if len(given) > 1:
+        raise ValueError(f"Specify only one scope parameter, got: {', '.join(given)}")
+    
+    if query_params.get('management_group_id'):
+        return [(None, f"/providers/Microsoft.Management/managementGroups/{query_params['management_group_id']}")]
+    
+    if query_params.get('billing_scope'):
+        billing_scope = query_params['billing_scope'].rstrip('/')
+        if not billing_scope.lower().startswith('/providers/microsoft.billing/'):
+            raise ValueError("billing_scope must start with /providers/Microsoft.Billing/")
+        return [(None, billing_scope)]
+    
+    subscription_ids = query_params.get('subscription_ids') or [query_params['subscription_id']]
+    if isinstance(subscription_ids, str):
+        subscription_ids = [subscription_ids]
+    return [(subscription_id, f"/subscriptions/{subscription_id}") for subscription_id in dict.fromkeys(subscription_ids)]
+
+
+def _scoped_cost_queries(query_type: str, query_params: Dict[str, Any], analyzers: List[CostManagementAnalyzer]
+                         ) -> Tuple[List[Tuple[CostManagementAnalyzer, Dict[str, Any]]], List[str]]:
+    """Per-scope parameters and the resource IDs outside every scope.
+
+    specific_resources sends each subscription only its own resource IDs and skips subscriptions
+    without any; ValueError when no resource ID belongs to any of the requested subscriptions.
+    """
+    if query_type != 'specific_resources' or not query_params.get('resource_ids'):
+        return [(analyzer, query_params) for analyzer in analyzers], []
+    
+    scoped_queries = []
+    matched = set()
+    for analyzer in analyzers:
+        prefix = f"/subscriptions/{analyzer.subscription_id}/".lower()
+        resource_ids = [resource_id for resource_id in query_params['resource_ids'] if resource_id.lower().startswith(prefix)]
+        if resource_ids:
+            scoped_queries.append((analyzer, dict(query_params, resource_ids=resource_ids)))
+            matched.update(resource_ids)
+    
+    unmatched_ids = [resource_id for resource_id in query_params['resource_ids'] if resource_id not in matched]
+    if not scoped_queries:
+        raise ValueError("None of the resource_ids belong to the requested subscription_ids")
+    return scoped_queries, unmatched_ids
+
+
+def _combined_cache_stats(analyzers: List[CostManagementAnalyzer]) -> Dict[str, Any]:
+    stats = [analyzer.cache_stats() for analyzer in analyzers]
+    return {
+        'enabled': all(entry['enabled'] for entry in stats),
+        'hits': sum(entry['hits'] for entry in stats),
+        'misses': sum(entry['misses'] for entry in stats)
+    }
+
+
+def _merge_scope_results(query_type: str, query_params: Dict[str, Any], analyzers: List[CostManagementAnalyzer],
+                         results: List[Dict[str, Any]], unmatched_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Merge per-subscription results into one response with per-scope subtotals (failed scopes mark it partial)"""
+    merged = _merge_cost_payloads(list(zip(analyzers, results)))
+    
+    if query_type == 'top_resources':
+        _truncate_top_rows(merged, int(query_params.get('top_n', 10)))
+    
+    merged['scopes'] = []
+    merged['errors'] = []
+    for analyzer, result in zip(analyzers, results):
+        subtotal = {'scope': analyzer.scope, 'subscription_id': analyzer.subscription_id}
+        error = result.get('error') if isinstance(result, dict) else 'No result'
+        if error:
+            subtotal['error'] = error
+            marker = {key: result[key] for key in CircuitOpenError.MARKER_FIELDS if key in result}
+            merged['errors'].append({'scope': analyzer.scope, 'error': error, **marker})
+        else:
+            subtotal['total_cost'] = result.get('total_cost', (result.get('actual_costs') or {}).get('total_cost', 0.0))
+        merged['scopes'].append(subtotal)
+    
+    # Resource IDs outside every requested subscription were never queried
+    for resource_id in unmatched_ids or []:
+        error = 'Resource is not in any of the requested subscription_ids'
+        merged.setdefault('resources', []).append({'resource_id': resource_id, 'error': error})
+        merged['errors'].append({'resource_id': resource_id, 'error': error})
+    
+    merged['scope_count'] = len(analyzers)
+    merged['partial'] = bool(merged['errors'])
+    return merged
+
+
+def _merge_cost_payloads(scoped_results: List[Tuple[CostManagementAnalyzer, Dict[str, Any]]]) -> Dict[str, Any]:
+    """Combine same-shaped query results: totals add up, rows/resources/budgets concatenate, views sum"""
+    ok = [(analyzer, result) for analyzer, result in scoped_results
+          if isinstance(result, dict) and not result.get('error')]
+    if not ok:
+        return {'error': 'All scopes failed', 'total_cost': 0.0}
+    
+    first = ok[0][1]
+    merged = {key: value for key, value in first.items()
+              if key not in ('subscription_id', 'scope', 'rows', 'data', 'resources', 'budgets', 'views',
+                             'actual_costs', 'totals_by', 'query_stats', 'row_count', 'total_cost', 'source',
+                             'complete', 'pages', 'page_error')}
+    merged['total_cost'] = sum(result.get('total_cost', 0.0) for _, result in ok)
+    merged['complete'] = all(result.get('complete', False) for _, result in ok)
+    if any('pages' in result for _, result in ok):
+        merged['pages'] = sum(result.get('pages', 0) for _, result in ok)
+    
+    currencies = list(dict.fromkeys(result.get('currency') for _, result in ok if result.get('currency')))
+    if len(currencies) > 1:
+        merged['currencies'] = currencies
+    
+    if 'rows' in first:
+        merged['rows'] = [dict(row, subscription_id=analyzer.subscription_id)
+                          for analyzer, result in ok for row in result.get('rows', [])]
+    
+    if 'data' in first:
+        # Columnar: concatenate every column and add the owning subscription as one more column
+        merged['columns'] = list(first['columns']) + ['SubscriptionId']
+        merged['data'] = {column: [] for column in merged['columns']}
+        for analyzer, result in ok:
+            for column in first['columns']:
+                merged['data'][column].extend(result['data'].get(column, [None] * result['row_count']))
+            merged['data']['SubscriptionId'].extend([analyzer.subscription_id] * result['row_count'])
+        merged['row_count'] = sum(result['row_count'] for _, result in ok)
+    
+    if 'totals_by' in first:
+        merged['totals_by'] = _sum_nested([result.get('totals_by', {}) for _, result in ok])
+    
+    if 'views' in first:
+        merged['views'] = _sum_nested([result['views'] for _, result in ok])
+        merged['source'] = {
+            'queries': sum(result['source']['queries'] for _, result in ok),
+            'rows': sum(result['source']['rows'] for _, result in ok),
+            'pages': sum(result['source']['pages'] for _, result in ok),
+            'windows': sum(result['source']['windows'] for _, result in ok),
+            'complete': all(result['source']['complete'] for _, result in ok)
+        }
+    
+    if 'resources' in first:
+        merged['resources'] = [entry for _, result in ok for entry in result['resources']]
+        merged['query_stats'] = _sum_nested([result.get('query_stats', {}) for _, result in ok])
+    
+    if 'budgets' in first:
+        merged['budgets'] = [dict(budget, subscription_id=analyzer.subscription_id)
+                             for analyzer, result in ok for budget in result['budgets']]
+        merged['actual_costs'] = _merge_cost_payloads([(analyzer, result['actual_costs']) for analyzer, result in ok])
+        merged['total_cost'] = merged['actual_costs'].get('total_cost', 0.0)
+    
+    return merged
+
+
+def _sum_nested(dicts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Key-wise sum of (possibly nested) dicts of numbers"""
+    total = {}
+    for entry in dicts:
+        for key, value in entry.items():
+            if isinstance(value, dict):
+                total[key] = _sum_nested([total.get(key, {}), value])
+            elif isinstance(value, (int, float)):
+                total[key] = total.get(key, 0) + value
+    return total
+
+
+def _truncate_top_rows(merged: Dict[str, Any], top_n: int) -> None:
+    """Re-rank merged top_resources across scopes and keep the overall top N"""
+    if 'rows' in merged:
+        merged['rows'] = heapq.nlargest(top_n, merged['rows'], key=lambda row: row['cost'])
+        merged['total_cost'] = sum(row['cost'] for row in merged['rows'])
+    elif 'data' in merged:
+        table = CostColumns(merged['columns'], list(zip(*(merged['data'][column] for column in merged['columns']))))
+        cost_column = table.cost_column()
+        if not cost_column:
+            return
+        costs = table.numeric(cost_column)
+        order = heapq.nlargest(top_n, range(table.row_count), key=lambda i: costs[i])
+        merged['data'] = {column: [values[i] for i in order] for column, values in table.data.items()}
+        merged['row_count'] = len(order)
+        merged['total_cost'] = float(sum(costs[i] for i in order))
+
+
+def _parse_flag(query_params: Dict[str, Any], name: str, default: bool) -> bool:
+    """Read a boolean request parameter sent either as a JSON bool or as a string like 'false'"""
+    value = query_params.get(name)
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in ('true', '1', 'yes', 'on'):
+        return True
+    if text in ('false', '0', 'no', 'off'):
+        return False
+    raise ValueError(f"Invalid {name}: {value}. Use true or false")
+
+
+def _parse_cost_query(query_params: Dict[str, Any]) -> Tuple[str, datetime, datetime]:
+    """Resolve the query type and date range of a cost request (ValueError carries the user-facing message)"""
+    # Auto-detect query_type if not provided based on parameters
+    query_type = query_params.get('query_type')
+    if not query_type:
+        if query_params.get('resource_ids'):
+            query_type = 'specific_resources'
+        elif query_params.get('resource_group'):
+            query_type = 'resource_group'
+        elif query_params.get('service_names'):
+            query_type = 'service'
+        elif query_params.get('top_n'):
+            query_type = 'top_resources'
+        else:
+            query_type = 'subscription'
+    
+    # Parse dates - handle automatic "last 30 days" calculation
+    try:
+        # Check if dates are provided
+        if 'start_date' in query_params and 'end_date' in query_params:
+            start_date_str = query_params['start_date']
+            end_date_str = query_params['end_date']
+            
+            # Handle different date formats
+            if 'T' not in start_date_str:
+                # Format: YYYY-MM-DD -> add time component
+                start_date = datetime.fromisoformat(start_date_str + 'T00:00:00')
+                end_date = datetime.fromisoformat(end_date_str + 'T23:59:59')
+            else:
+                # Format: YYYY-MM-DDTHH:MM:SS[Z]
+                start_date = datetime.fromisoformat(start_date_str.replace('Z', '+00:00'))
+                end_date = datetime.fromisoformat(end_date_str.replace('Z', '+00:00'))
+        else:
+            # Auto-calculate "last 30 days" in whole days, so repeated default queries share a cache key
+            today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+            start_date = today - timedelta(days=30)
+            end_date = today.replace(hour=23, minute=59, second=59)
+            
+            logging.info(f"Auto-calculated date range: {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}")
+            
+    except (KeyError, ValueError) as e:
+        raise ValueError(f'Invalid date format. Use ISO format (YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS): {str(e)}')
+    
+    output_format = query_params.get('output_format', 'rows')
+    if output_format not in CostManagementAnalyzer.OUTPUT_FORMATS:
+        raise ValueError(f"Invalid output_format: {output_format}. Valid formats: {', '.join(CostManagementAnalyzer.OUTPUT_FORMATS)}")
+    
+    return query_type, start_date, end_date
+
+
+async def query_cost_management_direct_async(query_params: Dict[str, Any]) -> Dict[str, Any]:
+    """query_cost_management_direct on the aio Cost Management client (same parameters and result shape)"""
+    with request_diagnostics('cost_analysis', query_params):
+        try:
+            scopes = _resolve_cost_scopes(query_params)
+            query_type, start_date, end_date = _parse_cost_query(query_params)
+            use_cache = _parse_flag(query_params, 'use_cache', True)
+        except ValueError as e:
+            return {'error': str(e)}
+        
+        # One credential and one aio client serve every scope of the request
+        async with AsyncDefaultAzureCredential() as aio_credential:
+            cost_policies = async_client_policies(retry_throttled=False)
+            async with AsyncCostManagementClient(aio_credential, **cost_policies) as cost_client:
+                CostManagementAnalyzer._add_client_type_header(cost_client)
+                analyzers = [
+                    AsyncCostManagementAnalyzer(
+                        subscription_id,
+                        use_cache=use_cache,
+                        output_format=query_params.get('output_format', 'rows'),
+                        group_totals=query_params.get('group_totals'),
+                        scope=scope,
+                        credential=aio_credential,
+                        cost_client=cost_client
+                    )
+                    for subscription_id, scope in scopes
+                ]
+                
+                if len(analyzers) == 1:
+                    result = await _execute_cost_query_async(analyzers[0], query_type, query_params, start_date, end_date)
+                else:
+                    try:
+                        scoped_queries, unmatched_ids = _scoped_cost_queries(query_type, query_params, analyzers)
+                    except ValueError as e:
+                        return {'error': str(e)}
+                    scope_results = await asyncio.gather(*(
+                        _execute_cost_query_async(analyzer, query_type, params, start_date, end_date)
+                        for analyzer, params in scoped_queries
+                    ))
+                    result = _merge_scope_results(query_type, query_params, [analyzer for analyzer, _ in scoped_queries],
+                                                  list(scope_results), unmatched_ids)
+        
+        if isinstance(result, dict):
+            result['cache'] = _combined_cache_stats(analyzers)
+        
+        attach_diagnostics(result, query_params)
+        return result
+
+
+async def _execute_cost_query_async(analyzer: 'AsyncCostManagementAnalyzer', query_type: str,
+                                    query_params: Dict[str, Any], start_date: datetime,
+                                    end_date: datetime) -> Dict[str, Any]:
+    """_execute_cost_query for the async analyzer, whose query methods are all coroutines"""
+    try:
+        method, args = _cost_query_call(query_type, query_params, start_date, end_date)
+    except ValueError as e:
+        return {'error': str(e)}
+    
+    try:
+        return await getattr(analyzer, method)(*args)
+    except Exception as e:
+        logging.error(f"Error executing cost query: {str(e)}")
+        return error_result(e)
+
+
+def _execute_cost_query(analyzer: CostManagementAnalyzer, query_type: str, query_params: Dict[str, Any],
+                        start_date: datetime, end_date: datetime) -> Dict[str, Any]:
+    """Dispatch a validated cost query to the matching CostManagementAnalyzer method"""
+    try:
+        method, args = _cost_query_call(query_type, query_params, start_date, end_date)
+    except ValueError as e:
+        return {'error': str(e)}
+    
+    try:
+        return getattr(analyzer, method)(*args)
+    except Exception as e:
+        logging.error(f"Error executing cost query: {str(e)}")
+        return error_result(e)
+
+
+def _cost_query_call(query_type: str, query_params: Dict[str, Any], start_date: datetime,
+                     end_date: datetime) -> Tuple[str, tuple]:
+    """(analyzer method name, arguments) for a query type; ValueError for missing or invalid parameters"""
+    if query_type == 'subscription':
+        granularity = query_params.get('granularity', 'Daily')
+        return 'get_subscription_costs', (start_date, end_date, granularity)
+    
+    elif query_type == 'resource_group':
+        resource_group = query_params.get('resource_group')
+        if not resource_group:
+            raise ValueError('resource_group is required for resource_group query')
+        granularity = query_params.get('granularity', 'Daily')
+        return 'get_resource_group_costs', (resource_group, start_date, end_date, granularity)
+    
+    elif query_type == 'service':
+        service_names = query_params.get('service_names')
+        if not service_names:
+            raise ValueError('service_names list is required for service query')
+        return 'get_resource_costs_by_service', (service_names, start_date, end_date)
+    
+    elif query_type == 'top_resources':
+        top_n = query_params.get('top_n', 10)
+        return 'get_top_cost_resources', (start_date, end_date, top_n)
+    
+    elif query_type == 'budget':
+        return 'get_budget_analysis', (start_date, end_date)
+    
+    elif query_type == 'location':
+        return 'get_cost_by_location', (start_date, end_date)
+    
+    elif query_type == 'rollup':
+        return 'get_cost_rollup', (start_date, end_date, query_params.get('group_by'), query_params.get('time_grains'))
+    
+    elif query_type == 'specific_resources':
+        resource_ids = query_params.get('resource_ids')
+        if not resource_ids:
+            raise ValueError('resource_ids list is required for specific_resources query')
+        logging.info(f"Executing specific_resources cost query for {len(resource_ids)} resources")
+        return 'get_specific_resources_cost', (resource_ids, start_date, end_date)
+    
+    raise ValueError(f'Invalid query_type: {query_type}. Valid types: subscription, resource_group, service, top_resources, budget, location, rollup, specific_resources')
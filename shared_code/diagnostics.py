@@ -0,0 +1,277 @@
+"""Per-request diagnostics (timing spans, counters) and the request's shared retry budget"""
+import contextvars
+import heapq
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from .settings import env_number
+
+try:
+    from opentelemetry import metrics as otel_metrics, trace as otel_trace
+except ImportError:  # optional: diagnostics are still logged without OpenTelemetry
+    otel_metrics = otel_trace = None
+
+# Per-request timing spans and counters, logged as one structured line per request (and exported
+# through OpenTelemetry when it is installed); requests can always opt in with "diagnostics": true
+REQUEST_DIAGNOSTICS_ENABLED = os.environ.get('REQUEST_DIAGNOSTICS_ENABLED', 'true').lower() == 'true'
+
+# Retries shared by all SDK calls of one request (each call also has its own limit, SDK_RETRY_ATTEMPTS)
+REQUEST_RETRY_BUDGET = env_number('REQUEST_RETRY_BUDGET', 50)
+
+
+class RequestDiagnostics:
+    """Timing spans and counters collected over one request.
+
+    The active instance lives in a ContextVar, so collector threads (ContextThreadPoolExecutor)
+    and asyncio tasks started by the request record into it without it being passed around.
+    Spans are aggregated per name (count, total, p50, p99, max); the slowest few keep their
+    attributes so a slow subscription or scope can be identified.
+    """
+
+    SLOWEST_SPANS = 10
+
+    def __init__(self, operation: str, retry_budget: Optional['RetryBudget'] = None):
+        self.operation = operation
+        self.retry_budget = retry_budget
+        self._started = time.perf_counter()
+        self._durations = {}
+        self._slowest = []
+        self._sequence = 0
+        self._counters = Counter()
+        self._lock = threading.Lock()
+
+    def record_span(self, name: str, duration_ms: float, attributes: Dict[str, Any]) -> None:
+        with self._lock:
+            self._durations.setdefault(name, []).append(duration_ms)
+            self._sequence += 1
+            entry = (duration_ms, self._sequence, name, attributes)
+            if len(self._slowest) < self.SLOWEST_SPANS:
+                heapq.heappush(self._slowest, entry)
+            elif duration_ms > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    def count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += value
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            summary = {
+                'operation': self.operation,
+                'elapsed_ms': round((time.perf_counter() - self._started) * 1000, 1),
+                'spans': {name: self._span_stats(durations) for name, durations in sorted(self._durations.items())},
+                'slowest_spans': [
+                    {'name': name, 'duration_ms': round(duration_ms, 1), **attributes}
+                    for duration_ms, _, name, attributes in sorted(self._slowest, reverse=True)
+                ],
+                'counters': dict(sorted(self._counters.items()))
+            }
+        if self.retry_budget is not None:
+            summary['retry_budget'] = self.retry_budget.stats()
+        return summary
+
+    @staticmethod
+    def _span_stats(durations: List[float]) -> Dict[str, Any]:
+        ordered = sorted(durations)
+
+        def percentile(fraction: float) -> float:
+            # Nearest-rank percentile
+            return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+        return {
+            'count': len(ordered),
+            'total_ms': round(sum(ordered), 1),
+            'p50_ms': round(percentile(0.5), 1),
+            'p99_ms': round(percentile(0.99), 1),
+            'max_ms': round(ordered[-1], 1)
+        }
+
+    def emit(self) -> None:
+        """Log the request's diagnostics as one structured line (Application Insights: parse_json on the message)"""
+        logging.info(f"Request diagnostics: {json.dumps(self.to_dict(), default=str)}")
+
+
+_request_diagnostics = contextvars.ContextVar('request_diagnostics', default=None)
+
+if otel_trace is not None:
+    _otel_tracer = otel_trace.get_tracer(__name__)
+    _otel_meter = otel_metrics.get_meter(__name__)
+    _otel_span_duration = _otel_meter.create_histogram(
+        'orphan_analyzer.span.duration', unit='ms', description='Duration of collectors, subscriptions, cost queries, retries and backoff sleeps')
+    _otel_counter = _otel_meter.create_counter(
+        'orphan_analyzer.operations', description='API calls, pages fetched, records produced and bytes serialized')
+
+
+@contextmanager
+def request_diagnostics(operation: str, query_params: Optional[Dict[str, Any]] = None):
+    """Collect diagnostics for the request (nested calls join the active collection; the outermost one emits it).
+
+    Also scopes the request's retry budget, which applies whether or not diagnostics are enabled.
+    """
+    active = _request_diagnostics.get()
+    if active is not None:
+        yield active
+        return
+
+    with request_retry_budget() as budget:
+        if not (REQUEST_DIAGNOSTICS_ENABLED or (query_params or {}).get('diagnostics')):
+            yield None
+            return
+
+        diagnostics = RequestDiagnostics(operation, retry_budget=budget)
+        token = _request_diagnostics.set(diagnostics)
+        try:
+            yield diagnostics
+        finally:
+            _request_diagnostics.reset(token)
+            diagnostics.emit()
+
+
+def attach_diagnostics(results: Dict[str, Any], query_params: Dict[str, Any]) -> None:
+    """Add the optional `_diagnostics` section when the request asked for it"""
+    diagnostics = _request_diagnostics.get()
+    if diagnostics is not None and query_params.get('diagnostics') and isinstance(results, dict):
+        results['_diagnostics'] = diagnostics.to_dict()
+
+
+@contextmanager
+def diagnostic_span(name: str, **attributes):
+    """Time a block as a span of the active request (and as an OpenTelemetry span when available)"""
+    diagnostics = _request_diagnostics.get()
+    if diagnostics is None and otel_trace is None:
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        if otel_trace is not None:
+            with _otel_tracer.start_as_current_span(name, attributes={k: str(v) for k, v in attributes.items()}):
+                yield
+        else:
+            yield
+    finally:
+        duration_ms = (time.perf_counter() - started) * 1000
+        if diagnostics is not None:
+            diagnostics.record_span(name, duration_ms, attributes)
+        if otel_trace is not None:
+            # Only the span name is a metric dimension, so p50/p99 charts per collector stay low-cardinality
+            _otel_span_duration.record(duration_ms, {'span': name})
+
+
+def count_diagnostic(name: str, value: int = 1) -> None:
+    """Add to a counter of the active request (API calls, pages, records, bytes serialized, ...)"""
+    diagnostics = _request_diagnostics.get()
+    if diagnostics is not None:
+        diagnostics.count(name, value)
+    if otel_trace is not None:
+        _otel_counter.add(value, {'counter': name})
+
+
+def diagnostic_response_hook(label: str) -> Dict[str, Any]:
+    """raw_response_hook kwargs counting each page an SDK list call fetches (empty when nothing collects them)"""
+    diagnostics = _request_diagnostics.get()
+    if diagnostics is None and otel_trace is None:
+        return {}
+
+    def on_response(pipeline_response):
+        for name in ('api_calls', 'pages', f'pages.{label}'):
+            if diagnostics is not None:
+                diagnostics.count(name)
+            if otel_trace is not None:
+                _otel_counter.add(1, {'counter': name})
+
+    return {'raw_response_hook': on_response}
+
+
+class ContextThreadPoolExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor whose tasks run in a copy of the submitter's context (request diagnostics, OpenTelemetry spans)"""
+
+    def submit(self, fn, *args, **kwargs):
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+class RetryBudget:
+    """Retries shared by every SDK call of one request.
+
+    Per-call retry limits alone multiply under concurrency (subscriptions x collectors x pages
+    can each retry a few times); once the request's budget is spent, failing calls surface their
+    error instead of backing off again. Also totals the time the request spent in backoff.
+    """
+
+    def __init__(self, max_retries: int):
+        self.max_retries = max(0, max_retries)
+        self.retries = 0
+        self.exhausted = 0
+        self.backoff_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def try_spend(self) -> bool:
+        """Take one retry from the budget; False once it is used up"""
+        with self._lock:
+            if self.retries >= self.max_retries:
+                self.exhausted += 1
+                return False
+            self.retries += 1
+            return True
+
+    def add_backoff(self, seconds: float) -> None:
+        with self._lock:
+            self.backoff_seconds += seconds
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'retries': self.retries,
+                'max_retries': self.max_retries,
+                'refused': self.exhausted,
+                'backoff_seconds': round(self.backoff_seconds, 3)
+            }
+
+
+_retry_budget = contextvars.ContextVar('retry_budget', default=None)
+
+
+@contextmanager
+def request_retry_budget(max_retries: Optional[int] = None):
+    """Scope a retry budget to the request (nested calls share the active budget)"""
+    active = _retry_budget.get()
+    if active is not None:
+        yield active
+        return
+
+    budget = RetryBudget(REQUEST_RETRY_BUDGET if max_retries is None else max_retries)
+    token = _retry_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _retry_budget.reset(token)
+        if budget.retries or budget.exhausted:
+            logging.info(f"Request retries: {json.dumps(budget.stats())}")
+
+
+def spend_retry() -> bool:
+    """Take a retry from the active request's budget (always allowed outside a request scope)"""
+    budget = _retry_budget.get()
+    if budget is None or budget.try_spend():
+        count_diagnostic('retries')
+        return True
+    count_diagnostic('retry_budget_exhausted')
+    if budget.exhausted == 1:
+        logging.warning(f"Retry budget of {budget.max_retries} exhausted for this request; failing calls are no longer retried")
+    return False
+
+
+def record_backoff(seconds: float) -> None:
+    """Add a backoff sleep to the request's retry budget and diagnostics"""
+    budget = _retry_budget.get()
+    if budget is not None:
+        budget.add_backoff(seconds)
+    count_diagnostic('backoff_ms', round(seconds * 1000))
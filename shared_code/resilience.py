@@ -0,0 +1,476 @@
+"""Retry policies, circuit breakers and the Cost Management rate limiter shared by every SDK client"""
+import asyncio
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, List, Optional
+
+from azure.core.exceptions import AzureError, ClientAuthenticationError, HttpResponseError
+from azure.core.pipeline.policies import AsyncHTTPPolicy, AsyncRetryPolicy, HTTPPolicy, RetryPolicy
+
+from .diagnostics import count_diagnostic, diagnostic_span, record_backoff, spend_retry
+from .settings import env_number
+
+# Retries of one SDK HTTP call (each page separately); REQUEST_RETRY_BUDGET caps them per request
+SDK_RETRY_ATTEMPTS = env_number('SDK_RETRY_ATTEMPTS', 4)
+SDK_RETRY_BACKOFF_FACTOR = env_number('SDK_RETRY_BACKOFF_FACTOR', 0.8, float)
+SDK_RETRY_BACKOFF_MAX = env_number('SDK_RETRY_BACKOFF_MAX', 60)
+
+# Process-wide circuit breakers per API family and scope: consecutive failed calls (429/5xx/connection
+# errors, after retries) that open one, and how long it fails fast before a single probe call is let through
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = env_number('CIRCUIT_BREAKER_FAILURE_THRESHOLD', 5)
+CIRCUIT_BREAKER_OPEN_SECONDS = env_number('CIRCUIT_BREAKER_OPEN_SECONDS', 30.0, float)
+
+
+class RetryBudgetMixin:
+    """Retry rules shared by the sync and aio retry policies.
+
+    Runs per HTTP request, so a failed list page is retried on its own rather than restarting
+    the list call. Honors Retry-After (and x-ms-retry-after-ms), takes each retry from the
+    request's RetryBudget and records the time slept. With retry_throttled=False, 429s are
+    raised to the caller instead (Cost Management: CostRateLimiter paces every caller on them).
+    """
+
+    def __init__(self, retry_throttled: bool = True, **kwargs):
+        kwargs.setdefault('retry_total', SDK_RETRY_ATTEMPTS)
+        kwargs.setdefault('retry_backoff_factor', SDK_RETRY_BACKOFF_FACTOR)
+        kwargs.setdefault('retry_backoff_max', SDK_RETRY_BACKOFF_MAX)
+        super().__init__(**kwargs)
+        self.retry_throttled = retry_throttled
+
+    def is_retry(self, settings, response) -> bool:
+        if not self.retry_throttled and response.http_response.status_code == 429:
+            return False
+        return super().is_retry(settings, response)
+
+    def increment(self, settings, response=None, error=None) -> bool:
+        return super().increment(settings, response=response, error=error) and spend_retry()
+
+    @contextmanager
+    def _backoff(self, response):
+        """Time one backoff sleep as a span and charge it to the request's budget"""
+        started = time.perf_counter()
+        with diagnostic_span('sdk.backoff', status=response.http_response.status_code if response is not None else None):
+            yield
+        record_backoff(time.perf_counter() - started)
+
+
+class BudgetedRetryPolicy(RetryBudgetMixin, RetryPolicy):
+    """azure-core RetryPolicy installed on every sync management client"""
+
+    def sleep(self, settings, transport, response=None) -> None:
+        with self._backoff(response):
+            super().sleep(settings, transport, response=response)
+
+
+class AsyncBudgetedRetryPolicy(RetryBudgetMixin, AsyncRetryPolicy):
+    """BudgetedRetryPolicy for the aio clients: same budget and backoff accounting, sleeps on the event loop"""
+
+    async def sleep(self, settings, transport, response=None) -> None:
+        with self._backoff(response):
+            await super().sleep(settings, transport, response=response)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an API family whose circuit breaker is open for the scope"""
+
+    def __init__(self, family: str, scope: str, retry_in: float):
+        self.family = family
+        self.scope = scope
+        self.retry_in = retry_in
+        wait = f"for another {retry_in:.1f}s" if retry_in > 0 else "while a probe call checks for recovery"
+        super().__init__(f"{family} API circuit is open for {scope} after repeated failures; failing fast {wait}")
+
+    MARKER_FIELDS = ('circuit_open', 'api_family', 'retry_after_seconds')
+
+    def marker(self) -> Dict[str, Any]:
+        """Fields added to error entries so callers can tell a skipped call from a failed one"""
+        return dict(zip(self.MARKER_FIELDS, (True, self.family, round(self.retry_in, 1))))
+
+
+def circuit_marker(error: BaseException) -> Dict[str, Any]:
+    return error.marker() if isinstance(error, CircuitOpenError) else {}
+
+
+def error_result(error: BaseException) -> Dict[str, Any]:
+    """{'error': ...} result for a failed query, marked when a circuit breaker skipped the call"""
+    return {'error': str(error), **circuit_marker(error)}
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker for one API family and scope.
+
+    Closed: calls pass; `failure_threshold` consecutive failures open it. Open: calls fail fast
+    with CircuitOpenError until `open_seconds` have passed. Half-open: one probe call is let
+    through - success closes the breaker, failure opens it again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, family: str, scope: str, failure_threshold: int, open_seconds: float):
+        self.family = family
+        self.scope = scope
+        self.failure_threshold = max(1, failure_threshold)
+        self.open_seconds = open_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_until = 0.0
+        self.rejected = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        """Let the call through, or raise CircuitOpenError"""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == self.OPEN and now >= self.opened_until:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            self.rejected += 1
+            retry_in = max(0.0, self.opened_until - now)
+        count_diagnostic('circuit_rejected')
+        raise CircuitOpenError(self.family, self.scope, retry_in)
+
+    def record_success(self) -> None:
+        with self._lock:
+            recovered = self.state != self.CLOSED
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+        if recovered:
+            logging.info(f"Circuit closed for {self.family} API on {self.scope}")
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == self.CLOSED and self.failures < self.failure_threshold:
+                return
+            self.state = self.OPEN
+            self.opened_until = time.monotonic() + self.open_seconds
+            self._probe_in_flight = False
+        count_diagnostic('circuit_opened')
+        logging.warning(f"Circuit opened for {self.family} API on {self.scope} after {self.failures} "
+                        f"consecutive failures; failing fast for {self.open_seconds:g}s")
+
+    def release(self) -> None:
+        """The call ended without telling anything about the API's health (auth failure, cancellation)"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'family': self.family,
+                'scope': self.scope,
+                'state': self.state,
+                'consecutive_failures': self.failures,
+                'rejected': self.rejected
+            }
+
+
+class CircuitBreakerRegistry:
+    """Process-wide breakers keyed by (API family, scope), shared by every request on the instance"""
+
+    # Resource provider (and resource type, where one provider serves several families) -> API family
+    API_FAMILIES = {
+        ('microsoft.costmanagement', 'budgets'): 'budgets',
+        ('microsoft.consumption', 'budgets'): 'budgets',
+        ('microsoft.costmanagement', None): 'cost_query',
+        ('microsoft.consumption', None): 'cost_query',
+        ('microsoft.advisor', None): 'advisor',
+        ('microsoft.network', None): 'network',
+        ('microsoft.compute', None): 'compute'
+    }
+
+    def __init__(self, failure_threshold: int, open_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, family: str, scope: str) -> CircuitBreaker:
+        key = (family, scope.lower())
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                breaker = CircuitBreaker(family, scope.lower(), self.failure_threshold, self.open_seconds)
+                self._breakers[key] = breaker
+            return breaker
+
+    def for_url(self, url: str) -> Optional[CircuitBreaker]:
+        """Breaker for an ARM request URL; None for APIs without one (subscriptions, Resource Graph, ...)"""
+        path = url.split('?', 1)[0]
+        marker = path.lower().rfind('/providers/')
+        if marker < 0:
+            return None
+        scope = path[:marker].split('://', 1)[-1]
+        scope = scope[scope.find('/'):] if '/' in scope else '/'
+        segments = path[marker + len('/providers/'):].lower().split('/')
+        provider = segments[0]
+        resource_type = segments[1] if len(segments) > 1 else None
+        family = self.API_FAMILIES.get((provider, resource_type)) or self.API_FAMILIES.get((provider, None))
+        return self.get(family, scope or '/') if family else None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._breakers.clear()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return [breaker.stats() for breaker in breakers]
+
+
+_circuit_breakers = CircuitBreakerRegistry(CIRCUIT_BREAKER_FAILURE_THRESHOLD, CIRCUIT_BREAKER_OPEN_SECONDS)
+
+
+def _is_breaker_failure(status_code: int) -> bool:
+    """Throttling and server errors count against a breaker; other 4xx mean the API itself is up"""
+    return status_code == 429 or status_code >= 500
+
+
+class CircuitBreakerMixin:
+    """Breaker bookkeeping shared by the sync and aio pipeline policies.
+
+    Runs outside the retry policy, so it sees each call's final outcome. Throttling, server
+    errors and connection failures count against the breaker; authentication failures and
+    cancellations release a probe without counting either way.
+    """
+
+    @staticmethod
+    def _breaker_for(request) -> Optional[CircuitBreaker]:
+        """The request's breaker after admitting the call (raises CircuitOpenError); None when unguarded"""
+        breaker = _circuit_breakers.for_url(request.http_request.url)
+        if breaker is not None:
+            breaker.before_call()
+        return breaker
+
+    @staticmethod
+    def _record_error(breaker: CircuitBreaker, error: BaseException) -> None:
+        if isinstance(error, AzureError) and not isinstance(error, ClientAuthenticationError):
+            breaker.record_failure()
+        else:
+            breaker.release()
+
+    @staticmethod
+    def _record_response(breaker: CircuitBreaker, response):
+        if _is_breaker_failure(response.http_response.status_code):
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return response
+
+
+class CircuitBreakerPolicy(CircuitBreakerMixin, HTTPPolicy):
+    """Per-call pipeline policy of the sync management clients"""
+
+    def send(self, request):
+        breaker = self._breaker_for(request)
+        if breaker is None:
+            return self.next.send(request)
+        try:
+            response = self.next.send(request)
+        except BaseException as error:
+            self._record_error(breaker, error)
+            raise
+        return self._record_response(breaker, response)
+
+
+class AsyncCircuitBreakerPolicy(CircuitBreakerMixin, AsyncHTTPPolicy):
+    """CircuitBreakerPolicy for the aio clients (the breakers are shared with the sync clients)"""
+
+    async def send(self, request):
+        breaker = self._breaker_for(request)
+        if breaker is None:
+            return await self.next.send(request)
+        try:
+            response = await self.next.send(request)
+        except BaseException as error:
+            self._record_error(breaker, error)
+            raise
+        return self._record_response(breaker, response)
+
+
+def client_policies(retry_throttled: bool = True) -> Dict[str, Any]:
+    """Pipeline keyword arguments for a sync management client: budgeted retries and circuit breakers"""
+    return {
+        'retry_policy': BudgetedRetryPolicy(retry_throttled=retry_throttled),
+        'per_call_policies': [CircuitBreakerPolicy()]
+    }
+
+
+def async_client_policies(retry_throttled: bool = True) -> Dict[str, Any]:
+    """client_policies() for an aio management client"""
+    return {
+        'retry_policy': AsyncBudgetedRetryPolicy(retry_throttled=retry_throttled),
+        'per_call_policies': [AsyncCircuitBreakerPolicy()]
+    }
+
+
+class CostRateLimiter:
+    """Shared token bucket with AIMD rate control for Cost Management calls.
+
+    Every query and budget call on the instance draws from one bucket. The refill rate grows
+    additively while the service reports spare quota and is halved on throttling; explicit
+    `Retry-After` / `x-ms-ratelimit-*-retry-after` headers pause all callers for that long.
+    """
+    
+    MIN_RATE = 0.05
+    RATE_INCREASE = 0.1
+    DEFAULT_THROTTLE_DELAY = 10.0
+    LOW_QUOTA_THRESHOLD = 2
+    
+    def __init__(self, rate: float, max_rate: float, burst: int, max_retries: int = 5):
+        self.rate = max(self.MIN_RATE, rate)
+        self.max_rate = max(self.rate, max_rate)
+        self.burst = max(1, burst)
+        self.max_retries = max_retries
+        self.tokens = float(self.burst)
+        self.blocked_until = 0.0
+        self.throttled_count = 0
+        self.waited_seconds = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self) -> float:
+        """Block until the shared budget allows another request; returns the time waited"""
+        waited = 0.0
+        while True:
+            delay = self._try_acquire(waited)
+            if delay is None:
+                return waited
+            with diagnostic_span('cost.backoff', delay_ms=round(delay * 1000)):
+                time.sleep(delay)
+            waited += delay
+    
+    async def acquire_async(self) -> float:
+        """Awaitable acquire(): waits on the event loop instead of blocking the thread"""
+        waited = 0.0
+        while True:
+            delay = self._try_acquire(waited)
+            if delay is None:
+                return waited
+            with diagnostic_span('cost.backoff', delay_ms=round(delay * 1000)):
+                await asyncio.sleep(delay)
+            waited += delay
+    
+    def _try_acquire(self, waited: float) -> Optional[float]:
+        """Take a token if the budget allows; otherwise return how long to wait before trying again"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            
+            if now < self.blocked_until:
+                return self.blocked_until - now
+            if self.tokens >= 1.0:
+                self.tokens -= 1.0
+                self.waited_seconds += waited
+                return None
+            return (1.0 - self.tokens) / self.rate
+    
+    def record_response(self, headers) -> None:
+        """Adapt to the rate-limit headers of a successful response"""
+        retry_after = self._retry_after(headers)
+        remaining = self._remaining_quota(headers)
+        
+        with self._lock:
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+            if remaining is not None and remaining <= self.LOW_QUOTA_THRESHOLD:
+                # Nearly out of quota: slow down before the service has to throttle us
+                self.rate = max(self.MIN_RATE, self.rate / 2)
+            else:
+                self.rate = min(self.max_rate, self.rate + self.RATE_INCREASE)
+    
+    def record_throttle(self, headers) -> float:
+        """Back off after a 429: halve the rate and pause all callers for the advertised delay"""
+        retry_after = self._retry_after(headers)
+        if retry_after is None:
+            retry_after = self.DEFAULT_THROTTLE_DELAY
+        with self._lock:
+            self.throttled_count += 1
+            self.rate = max(self.MIN_RATE, self.rate / 2)
+            self.tokens = 0.0
+            self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+        count_diagnostic('throttled')
+        record_backoff(retry_after)
+        logging.warning(f"Cost Management throttled the request; pausing {retry_after:.1f}s, rate now {self.rate:.2f} req/s")
+        return retry_after
+    
+    def call(self, operation, *args, **kwargs):
+        """Invoke an SDK operation within the shared budget, retrying only when the service throttles"""
+        def on_response(pipeline_response):
+            self.record_response(pipeline_response.http_response.headers)
+        
+        for attempt in range(self.max_retries + 1):
+            self.acquire()
+            try:
+                with self._attempt_span(attempt):
+                    return operation(*args, raw_response_hook=on_response, **kwargs)
+            except HttpResponseError as e:
+                if e.status_code != 429 or attempt >= self.max_retries or not spend_retry():
+                    raise
+                self.record_throttle(e.response.headers if e.response is not None else {})
+    
+    async def call_async(self, operation, *args, **kwargs):
+        """call() for aio SDK operations, sharing the same budget and throttling state"""
+        def on_response(pipeline_response):
+            self.record_response(pipeline_response.http_response.headers)
+        
+        for attempt in range(self.max_retries + 1):
+            await self.acquire_async()
+            try:
+                with self._attempt_span(attempt):
+                    return await operation(*args, raw_response_hook=on_response, **kwargs)
+            except HttpResponseError as e:
+                if e.status_code != 429 or attempt >= self.max_retries or not spend_retry():
+                    raise
+                self.record_throttle(e.response.headers if e.response is not None else {})
+    
+    @staticmethod
+    def _attempt_span(attempt: int):
+        """Count the API call; attempts after a 429 are also timed as retry spans"""
+        count_diagnostic('api_calls')
+        if attempt == 0:
+            return nullcontext()
+        return diagnostic_span('cost.retry', attempt=attempt)
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'rate_per_second': round(self.rate, 3),
+                'throttled_count': self.throttled_count,
+                'waited_seconds': round(self.waited_seconds, 3)
+            }
+    
+    @staticmethod
+    def _retry_after(headers) -> Optional[float]:
+        """Largest delay advertised by Retry-After or any x-ms-ratelimit-*-retry-after header"""
+        delays = []
+        for name, value in (headers or {}).items():
+            if name.lower().endswith('retry-after'):
+                try:
+                    delays.append(float(value))
+                except (TypeError, ValueError):
+                    continue
+        return max(delays) if delays else None
+    
+    @staticmethod
+    def _remaining_quota(headers) -> Optional[int]:
+        """Smallest remaining budget from x-ms-ratelimit-*-remaining headers (values like 'QueryResource:12')"""
+        remaining = []
+        for name, value in (headers or {}).items():
+            lower_name = name.lower()
+            if lower_name.startswith('x-ms-ratelimit') and 'remaining' in lower_name:
+                remaining.extend(int(number) for number in re.findall(r'\d+', str(value)))
+        return min(remaining) if remaining else None
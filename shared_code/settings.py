@@ -0,0 +1,18 @@
+"""App settings read from the environment"""
+import logging
+import os
+
+
+def env_number(name: str, default, cast=int):
+    """Numeric app setting; a malformed or negative value logs a warning and keeps the default"""
+    raw = os.environ.get(name, '').strip()
+    if not raw:
+        return default
+    try:
+        value = cast(raw)
+    except ValueError:
+        value = None
+    if value is None or not value >= 0:
+        logging.warning(f"Ignoring invalid app setting {name}={raw!r}; using the default {default}")
+        return default
+    return value
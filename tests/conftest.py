@@ -0,0 +1,48 @@
+"""
+Shared fixtures: function_app (and shared_code) imported from the repository root and the offline Azure fakes
+from benchmarks/fake_azure.py, so tests never reach Azure.
+"""
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.join(REPO_ROOT, 'benchmarks'))
+
+import function_app  # noqa: E402
+from shared_code import azure_clients, cost_analysis, resilience  # noqa: E402
+from fake_azure import FakeTransport, SyntheticTenant, installed  # noqa: E402
+
+
+@pytest.fixture
+def fresh_state():
+    """No cached clients or cost results, closed circuit breakers and a fresh rate limiter"""
+    azure_clients._client_cache.clear()
+    cost_analysis._cost_query_cache.clear()
+    resilience._circuit_breakers.clear()
+    original_limiter = cost_analysis._cost_rate_limiter
+    cost_analysis._cost_rate_limiter = resilience.CostRateLimiter(1000.0, 1000.0, 1000)
+    yield
+    cost_analysis._cost_rate_limiter = original_limiter
+    cost_analysis._cost_query_cache.clear()
+    resilience._circuit_breakers.clear()
+
+
+@pytest.fixture
+def tenant():
+    return SyntheticTenant(subscriptions=3, disks=60, public_ips=30, nics=30, vms=30,
+                           advisor_per_subscription=2, orphan_rate=0.5)
+
+
+@pytest.fixture
+def transport():
+    return FakeTransport()
+
+
+@pytest.fixture
+def fake_azure(fresh_state, tenant, transport):
+    """Install the fake SDK clients for the test; yields the transport for call counting"""
+    with installed(function_app, tenant, transport):
+        yield transport
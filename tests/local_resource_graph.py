@@ -0,0 +1,58 @@
+"""
+Offline stand-in for azure.mgmt.resourcegraph.ResourceGraphClient, used to exercise the
+Resource Graph backend of function_app without a tenant.
+"""
+import re
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+
+class LocalResourceGraphClient:
+    """Offline ResourceGraphClient serving registered rows to the Resource Graph backend.
+
+    Rows are registered per ARM resource type (or table name, such as 'resourcechanges') in the
+    projected shape the backend's queries return.
+    It evaluates the parts of the KQL the backend relies on - the resource type match, subscription
+    scoping and location/resourceGroup filters - and pages results with skip tokens like the real service.
+    """
+    
+    _TYPE_PATTERN = re.compile(r"type =~ '([^']+)'")
+    _COLUMN_FILTER_PATTERN = re.compile(r"\| where (location|resourceGroup) =~ '((?:[^'\\]|\\.)*)'")
+    
+    def __init__(self, rows_by_type: Dict[str, List[Dict[str, Any]]], page_size: Optional[int] = None):
+        self.rows_by_type = {resource_type.lower(): rows for resource_type, rows in rows_by_type.items()}
+        self.page_size = page_size
+        self.requests = []
+    
+    def resources(self, query_request):
+        self.requests.append(query_request)
+        
+        match = self._TYPE_PATTERN.search(query_request.query)
+        # Queries without a type filter (e.g. resourcechanges) are matched by table name
+        table = match.group(1) if match else query_request.query.split('\n', 1)[0].strip()
+        rows = self.rows_by_type.get(table.lower(), [])
+        if query_request.subscriptions:
+            scope = {sub.lower() for sub in query_request.subscriptions}
+            rows = [row for row in rows if (row.get('subscriptionId') or '').lower() in scope]
+        for column, value in self._COLUMN_FILTER_PATTERN.findall(query_request.query):
+            value = re.sub(r"\\(.)", r"\1", value).lower()
+            rows = [row for row in rows if (self._column(row, column) or '').lower() == value]
+        
+        options = query_request.options
+        offset = int(options.skip_token) if options and options.skip_token else 0
+        page_size = self.page_size or (options.top if options and options.top else len(rows)) or 1
+        page = rows[offset:offset + page_size]
+        next_offset = offset + len(page)
+        
+        return SimpleNamespace(
+            data=page,
+            count=len(page),
+            total_records=len(rows),
+            skip_token=str(next_offset) if next_offset < len(rows) else None
+        )
+    
+    @staticmethod
+    def _column(row: Dict[str, Any], column: str) -> Optional[str]:
+        if column == 'resourceGroup' and 'resourceGroup' not in row:
+            return row['id'].split('/')[4]
+        return row.get(column)
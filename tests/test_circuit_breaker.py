@@ -0,0 +1,174 @@
+from types import SimpleNamespace
+
+import pytest
+from azure.core.exceptions import AzureError, ClientAuthenticationError
+
+import function_app
+from shared_code import cost_analysis, resilience
+
+COST_QUERY_URL = ('https://management.azure.com/subscriptions/SUB-A/providers/Microsoft.CostManagement/query'
+                  '?api-version=2023-03-01')
+
+
+@pytest.fixture
+def breaker():
+    return resilience.CircuitBreaker('cost_query', '/subscriptions/sub-a', failure_threshold=2, open_seconds=60)
+
+
+def expire(breaker):
+    breaker.opened_until = 0.0
+
+
+def test_consecutive_failures_open_the_breaker(breaker):
+    breaker.record_failure()
+    assert breaker.state == breaker.CLOSED
+    breaker.before_call()
+
+    breaker.record_failure()
+    assert breaker.state == breaker.OPEN
+    with pytest.raises(resilience.CircuitOpenError) as error:
+        breaker.before_call()
+
+    assert error.value.marker() == {'circuit_open': True, 'api_family': 'cost_query', 'retry_after_seconds': 60.0}
+    assert breaker.stats()['rejected'] == 1
+
+
+def test_success_resets_the_failure_count(breaker):
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+
+    assert breaker.state == breaker.CLOSED
+
+
+def test_half_open_lets_one_probe_through_and_closes_on_success(breaker):
+    breaker.record_failure()
+    breaker.record_failure()
+    expire(breaker)
+
+    breaker.before_call()
+    assert breaker.state == breaker.HALF_OPEN
+    with pytest.raises(resilience.CircuitOpenError) as error:
+        breaker.before_call()
+    assert 'while a probe call checks for recovery' in str(error.value)
+
+    breaker.record_success()
+    assert breaker.state == breaker.CLOSED
+    breaker.before_call()
+
+
+def test_failed_probe_reopens_at_once(breaker):
+    breaker.record_failure()
+    breaker.record_failure()
+    expire(breaker)
+    breaker.before_call()
+
+    breaker.record_failure()
+
+    assert breaker.state == breaker.OPEN
+    with pytest.raises(resilience.CircuitOpenError):
+        breaker.before_call()
+
+
+def test_released_probe_can_be_retried(breaker):
+    breaker.record_failure()
+    breaker.record_failure()
+    expire(breaker)
+    breaker.before_call()
+
+    breaker.release()
+
+    breaker.before_call()
+    assert breaker.state == breaker.HALF_OPEN
+
+
+@pytest.mark.parametrize('url, family, scope', [
+    (COST_QUERY_URL, 'cost_query', '/subscriptions/sub-a'),
+    ('https://management.azure.com/subscriptions/sub-a/providers/Microsoft.Consumption/budgets', 'budgets',
+     '/subscriptions/sub-a'),
+    ('https://management.azure.com/subscriptions/sub-a/resourceGroups/rg/providers/Microsoft.Compute/disks',
+     'compute', '/subscriptions/sub-a/resourcegroups/rg'),
+    ('https://management.azure.com/providers/Microsoft.Management/managementGroups/mg/providers/'
+     'Microsoft.CostManagement/query', 'cost_query', '/providers/microsoft.management/managementgroups/mg'),
+])
+def test_registry_keys_breakers_by_api_family_and_scope(url, family, scope):
+    breaker = resilience.CircuitBreakerRegistry(5, 30).for_url(url)
+
+    assert (breaker.family, breaker.scope) == (family, scope)
+
+
+def test_registry_has_no_breaker_for_unlisted_apis():
+    registry = resilience.CircuitBreakerRegistry(5, 30)
+
+    assert registry.for_url('https://management.azure.com/subscriptions?api-version=2022-12-01') is None
+    assert registry.for_url(COST_QUERY_URL) is registry.for_url(COST_QUERY_URL.lower())
+
+
+class Pipeline:
+    """The next policy in the chain, answering with queued status codes (or raising)"""
+
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.sent = 0
+
+    def send(self, request):
+        self.sent += 1
+        answer = self.answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return SimpleNamespace(http_response=SimpleNamespace(status_code=answer))
+
+
+def send(policy, url=COST_QUERY_URL):
+    return policy.send(SimpleNamespace(http_request=SimpleNamespace(url=url)))
+
+
+def test_policy_opens_on_throttling_and_server_errors_only(fresh_state, monkeypatch):
+    monkeypatch.setattr(resilience, '_circuit_breakers', resilience.CircuitBreakerRegistry(2, 60))
+    policy = resilience.CircuitBreakerPolicy()
+    policy.next = Pipeline(404, 400, 429, AzureError('connection reset'))
+
+    send(policy)
+    send(policy)
+    send(policy)
+    with pytest.raises(AzureError):
+        send(policy)
+    with pytest.raises(resilience.CircuitOpenError):
+        send(policy)
+
+    assert policy.next.sent == 4
+    assert resilience._circuit_breakers.stats()[0]['state'] == 'open'
+
+
+def test_policy_ignores_authentication_failures(fresh_state, monkeypatch):
+    monkeypatch.setattr(resilience, '_circuit_breakers', resilience.CircuitBreakerRegistry(1, 60))
+    policy = resilience.CircuitBreakerPolicy()
+    policy.next = Pipeline(ClientAuthenticationError('expired token'), 200)
+
+    with pytest.raises(ClientAuthenticationError):
+        send(policy)
+    send(policy)
+
+    assert resilience._circuit_breakers.stats()[0]['state'] == 'closed'
+
+
+def test_open_scope_is_reported_in_multi_scope_cost_results(fake_azure, tenant, monkeypatch):
+    blocked_scope = f"/subscriptions/{tenant.subscription_ids[1]}"
+    limiter_call = cost_analysis._cost_rate_limiter.call
+
+    def call(operation, scope, *args, **kwargs):
+        if scope == blocked_scope:
+            raise resilience.CircuitOpenError('cost_query', scope, 12.0)
+        return limiter_call(operation, scope, *args, **kwargs)
+
+    monkeypatch.setattr(cost_analysis._cost_rate_limiter, 'call', call)
+    params = {'subscription_ids': tenant.subscription_ids[:2], 'query_type': 'subscription',
+              'start_date': '2025-01-01', 'end_date': '2025-01-31'}
+
+    result = function_app.query_cost_management_direct(params)
+
+    assert result['partial'] is True
+    error = resilience.CircuitOpenError('cost_query', blocked_scope, 12.0)
+    assert result['errors'] == [{'scope': blocked_scope, 'error': str(error), **error.marker()}]
+    assert result['scopes'][1]['error'] == str(error)
+    assert fake_azure.calls['cost.query.usage'] == 1
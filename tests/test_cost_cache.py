@@ -0,0 +1,153 @@
+import os
+import stat
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import function_app
+from shared_code import caching, cost_analysis
+
+
+def subscription_query(subscription_id, **params):
+    return dict({'subscription_id': subscription_id, 'query_type': 'subscription',
+                 'start_date': '2025-01-01', 'end_date': '2025-01-31'}, **params)
+
+
+@pytest.mark.parametrize('value, expected', [
+    (None, True), (True, True), (False, False), ('false', False), ('False', False), ('0', False),
+    ('no', False), ('true', True), ('1', True), (0, False)
+])
+def test_use_cache_flag_parses_strings_and_bools(value, expected):
+    params = {} if value is None else {'use_cache': value}
+
+    assert cost_analysis._parse_flag(params, 'use_cache', True) is expected
+
+
+def test_use_cache_string_false_bypasses_the_cache(fake_azure, tenant):
+    params = subscription_query(tenant.subscription_ids[0], use_cache='false')
+
+    first = function_app.query_cost_management_direct(params)
+    function_app.query_cost_management_direct(params)
+
+    assert 'error' not in first
+    assert fake_azure.calls['cost.query.usage'] == 2
+
+
+def test_invalid_use_cache_is_a_request_error(fake_azure, tenant):
+    result = function_app.query_cost_management_direct(subscription_query(tenant.subscription_ids[0], use_cache='maybe'))
+
+    assert result == {'error': 'Invalid use_cache: maybe. Use true or false'}
+    assert fake_azure.calls['cost.query.usage'] == 0
+
+
+def test_disk_tier_is_off_by_default():
+    assert caching.COST_CACHE_DIR == '' or 'COST_CACHE_DIR' in os.environ
+    assert caching.CostQueryCache(8, '').directory is None
+
+
+def test_disk_tier_is_private_to_the_app_user(tmp_path):
+    directory = tmp_path / 'cost-cache'
+    cache = caching.CostQueryCache(8, str(directory), max_disk_entries=8)
+
+    cache.set('key', {'rows': [[1.0]]}, ttl=60)
+
+    assert stat.S_IMODE(directory.stat().st_mode) == 0o700
+    assert stat.S_IMODE((directory / 'key.json').stat().st_mode) == 0o600
+    assert caching.CostQueryCache(8, str(directory)).get('key') == {'rows': [[1.0]]}
+
+
+def body(start, end, granularity='Daily'):
+    return {'type': 'ActualCost', 'timeframe': 'Custom', 'timePeriod': {'from': start, 'to': end},
+            'dataset': {'granularity': granularity, 'aggregation': {'totalCost': {'name': 'Cost', 'function': 'Sum'}}}}
+
+
+def test_fingerprint_is_canonical_and_scope_case_insensitive():
+    query = body('2025-01-01T00:00:00', '2025-01-31T23:59:59')
+    reordered = dict(reversed(list(query.items())))
+
+    key = caching.CostQueryCache.fingerprint('/subscriptions/SUB-A', query)
+
+    assert key == caching.CostQueryCache.fingerprint('/subscriptions/sub-a', reordered)
+    assert key != caching.CostQueryCache.fingerprint('/subscriptions/sub-b', query)
+    assert key != caching.CostQueryCache.fingerprint('/subscriptions/sub-a', query, page=1)
+    assert key != caching.CostQueryCache.fingerprint('/subscriptions/sub-a', body('2025-01-01T00:00:00',
+                                                                                         '2025-01-30T23:59:59'))
+
+
+def test_closed_periods_get_the_long_ttl_and_recent_ones_the_short_ttl():
+    today = datetime.now(timezone.utc).date()
+    settled = today - timedelta(days=caching.COST_CACHE_SETTLE_DAYS + 1)
+    unsettled = today - timedelta(days=caching.COST_CACHE_SETTLE_DAYS - 1)
+
+    assert caching.CostQueryCache.ttl_for(body('2024-01-01', f'{settled}T23:59:59')) == \
+        caching.COST_CACHE_CLOSED_TTL_SECONDS
+    assert caching.CostQueryCache.ttl_for(body('2024-01-01', f'{unsettled}T23:59:59')) == \
+        caching.COST_CACHE_OPEN_TTL_SECONDS
+    assert caching.CostQueryCache.ttl_for({'timePeriod': {'to': 'soon'}}) == caching.COST_CACHE_OPEN_TTL_SECONDS
+    assert caching.CostQueryCache.ttl_for({}) == caching.COST_CACHE_OPEN_TTL_SECONDS
+
+
+def test_expired_entries_are_misses():
+    cache = caching.CostQueryCache(8)
+    cache.set('fresh', {'rows': []}, ttl=60)
+    cache.set('stale', {'rows': []}, ttl=-1)
+
+    assert cache.get('fresh') == {'rows': []}
+    assert cache.get('stale') is None
+
+
+def test_memory_tier_evicts_the_least_recently_used_entry():
+    cache = caching.CostQueryCache(2)
+    cache.set('a', {'n': 1}, ttl=60)
+    cache.set('b', {'n': 2}, ttl=60)
+    cache.get('a')
+
+    cache.set('c', {'n': 3}, ttl=60)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == {'n': 1} and cache.get('c') == {'n': 3}
+
+
+def test_disk_tier_keeps_at_most_max_disk_entries(tmp_path):
+    cache = caching.CostQueryCache(8, str(tmp_path), max_disk_entries=3)
+
+    for index in range(5):
+        cache.set(f'key-{index}', {'n': index}, ttl=60)
+
+    assert len(list(tmp_path.glob('*.json'))) == 3
+
+
+def test_repeated_query_is_served_from_the_cache(fake_azure, tenant):
+    params = subscription_query(tenant.subscription_ids[0])
+
+    first = function_app.query_cost_management_direct(params)
+    second = function_app.query_cost_management_direct(params)
+
+    assert fake_azure.calls['cost.query.usage'] == 1
+    assert first['cache'] == {'enabled': True, 'hits': 0, 'misses': 1}
+    assert second['cache'] == {'enabled': True, 'hits': 1, 'misses': 0}
+    assert second['rows'] == first['rows'] and second['total_cost'] == first['total_cost']
+
+
+def test_refreshed_first_page_does_not_reuse_cached_follow_up_pages(fake_azure, tenant, monkeypatch):
+    import fake_azure as fakes
+    monkeypatch.setattr(fakes, 'COST_ROW_LIMIT', 10)
+    stored = []
+    cache_set = cost_analysis._cost_query_cache.set
+    monkeypatch.setattr(cost_analysis._cost_query_cache, 'set',
+                        lambda key, value, ttl: (stored.append(key), cache_set(key, value, ttl)))
+    params = subscription_query(tenant.subscription_ids[0])
+
+    first = function_app.query_cost_management_direct(params)
+    follow_ups = fake_azure.calls['cost.query.next_link']
+    function_app.query_cost_management_direct(params)
+    assert follow_ups > 0 and fake_azure.calls['cost.query.next_link'] == follow_ups
+
+    # Page 0 expires on its own; its follow-up pages must be fetched again rather than spliced in
+    expires_at, page_zero = cost_analysis._cost_query_cache._entries[stored[0]]
+    cost_analysis._cost_query_cache._entries[stored[0]] = (0, page_zero)
+    refreshed = function_app.query_cost_management_direct(params)
+
+    assert fake_azure.calls['cost.query.usage'] == 2
+    assert fake_azure.calls['cost.query.next_link'] == 2 * follow_ups
+    assert refreshed['rows'] == first['rows']
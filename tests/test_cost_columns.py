@@ -0,0 +1,38 @@
+import pytest
+
+from shared_code import cost_analysis
+
+ROWS = [
+    [1.0, 20250102, 'Storage'],
+    [2, 20250101, 'Compute'],
+    [None, 20250102, 'Storage'],
+    ['3.5', 20250101, 'Storage'],
+    [4.0, 20250103, None],
+]
+
+
+@pytest.fixture
+def table():
+    return cost_analysis.CostColumns(['Cost', 'UsageDate', 'ServiceName'], ROWS)
+
+
+def test_numeric_parses_strings_and_treats_empty_values_as_zero(table):
+    assert list(table.numeric('Cost')) == [1.0, 2.0, 0.0, 3.5, 4.0]
+    assert table.total('Cost') == pytest.approx(10.5)
+
+
+def test_group_sum_keeps_first_seen_order(table):
+    assert list(table.group_sum(['UsageDate'], 'Cost').items()) == [(20250102, 1.0), (20250101, 5.5), (20250103, 4.0)]
+
+
+def test_group_sum_over_several_columns_returns_tuples(table):
+    assert list(table.group_sum(['UsageDate', 'ServiceName'], 'Cost').items()) == [
+        ((20250102, 'Storage'), 1.0), ((20250101, 'Compute'), 2.0),
+        ((20250101, 'Storage'), 3.5), ((20250103, None), 4.0)]
+
+
+def test_group_sum_accepts_keys_that_do_not_sort_together(table):
+    sums = table.group_sum(['ServiceName'], 'Cost')
+
+    assert sums == {'Storage': 4.5, 'Compute': 2.0, None: 4.0}
+    assert all(type(total) is float for total in sums.values())
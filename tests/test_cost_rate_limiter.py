@@ -0,0 +1,108 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+from azure.core.exceptions import HttpResponseError
+from fake_azure import FakeTransport
+
+import function_app
+from shared_code import cost_analysis, resilience
+
+QUOTA_HEADER = 'x-ms-ratelimit-microsoft.costmanagement-qpu-remaining'
+
+
+@pytest.fixture
+def limiter():
+    return resilience.CostRateLimiter(rate=2.0, max_rate=2.25, burst=2)
+
+
+def test_spare_quota_raises_the_rate_additively_up_to_the_maximum(limiter):
+    limiter.record_response({QUOTA_HEADER: 'QueryResource:50'})
+    assert limiter.rate == pytest.approx(2.1)
+
+    limiter.record_response({QUOTA_HEADER: 'QueryResource:50'})
+    limiter.record_response({QUOTA_HEADER: 'QueryResource:50'})
+    assert limiter.rate == pytest.approx(2.25)
+
+
+def test_low_quota_halves_the_rate_down_to_the_floor(limiter):
+    limiter.record_response({QUOTA_HEADER: 'QueryResource:2, QueryTenant:40'})
+    assert limiter.rate == pytest.approx(1.0)
+
+    for _ in range(10):
+        limiter.record_response({QUOTA_HEADER: 'QueryResource:0'})
+    assert limiter.rate == resilience.CostRateLimiter.MIN_RATE
+
+
+def test_throttle_halves_the_rate_and_pauses_for_the_largest_retry_after(limiter):
+    delay = limiter.record_throttle({'Retry-After': '3', 'x-ms-ratelimit-microsoft.costmanagement-qpu-retry-after': '7'})
+
+    assert delay == 7.0
+    assert limiter.rate == pytest.approx(1.0)
+    assert limiter.tokens == 0.0
+    assert limiter.blocked_until - time.monotonic() == pytest.approx(7.0, abs=0.5)
+    assert limiter.stats()['throttled_count'] == 1
+
+
+def test_throttle_without_retry_after_uses_the_default_delay(limiter):
+    assert limiter.record_throttle({}) == resilience.CostRateLimiter.DEFAULT_THROTTLE_DELAY
+
+
+def test_retry_after_zero_means_retry_immediately(limiter):
+    assert limiter.record_throttle({'Retry-After': '0'}) == 0.0
+    assert limiter.blocked_until <= time.monotonic()
+
+
+def test_retry_after_on_a_success_pauses_later_callers(limiter):
+    limiter.record_response({'Retry-After': '5'})
+
+    assert limiter._try_acquire(0.0) == pytest.approx(5.0, abs=0.5)
+
+
+def test_bucket_allows_a_burst_then_paces_at_the_rate(limiter):
+    assert limiter._try_acquire(0.0) is None
+    assert limiter._try_acquire(0.0) is None
+    assert limiter._try_acquire(0.0) == pytest.approx(0.5, abs=0.05)
+
+
+def test_call_retries_a_429_after_its_retry_after():
+    limiter = resilience.CostRateLimiter(rate=1000.0, max_rate=1000.0, burst=10)
+    throttled = FakeTransport(retry_after=0).throttle_error()
+    answers = [throttled, throttled, 'result']
+
+    def operation(scope, raw_response_hook=None):
+        answer = answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        raw_response_hook(SimpleNamespace(http_response=SimpleNamespace(headers={})))
+        return f'{answer} for {scope}'
+
+    started = time.monotonic()
+    assert limiter.call(operation, '/subscriptions/a') == 'result for /subscriptions/a'
+    assert time.monotonic() - started < 1
+    assert limiter.stats()['throttled_count'] == 2
+
+
+def test_call_gives_up_after_max_retries():
+    limiter = resilience.CostRateLimiter(rate=1000.0, max_rate=1000.0, burst=10, max_retries=2)
+    attempts = []
+
+    def operation(raw_response_hook=None):
+        attempts.append(1)
+        raise FakeTransport(retry_after=0).throttle_error()
+
+    with pytest.raises(HttpResponseError):
+        limiter.call(operation)
+    assert len(attempts) == 3
+
+
+@pytest.mark.parametrize('transport', [FakeTransport(throttle_rate=0.3, retry_after=0)])
+def test_throttled_cost_queries_still_complete(fake_azure, tenant):
+    params = {'subscription_ids': tenant.subscription_ids, 'query_type': 'subscription',
+              'start_date': '2025-01-01', 'end_date': '2025-01-31'}
+
+    result = function_app.query_cost_management_direct(params)
+
+    assert result['partial'] is False
+    assert fake_azure.stats()['throttled'] > 0
+    assert cost_analysis._cost_rate_limiter.stats()['throttled_count'] == fake_azure.stats()['throttled']
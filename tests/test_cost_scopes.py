@@ -0,0 +1,110 @@
+import pytest
+
+import function_app
+from shared_code import cost_analysis
+
+
+def cost_query(**params):
+    """A January subscription query; the row data of one is [CostUSD, UsageDate, ServiceName, ...]"""
+    return dict({'query_type': 'subscription', 'start_date': '2025-01-01', 'end_date': '2025-01-31'}, **params)
+
+
+def test_multi_subscription_query_fans_out_one_query_per_subscription(fake_azure, tenant):
+    result = function_app.query_cost_management_direct(cost_query(subscription_ids=tenant.subscription_ids))
+
+    assert fake_azure.calls['cost.query.usage'] == tenant.subscription_count
+    assert [scope['subscription_id'] for scope in result['scopes']] == tenant.subscription_ids
+    assert result['scope_count'] == tenant.subscription_count and result['partial'] is False
+
+
+def test_subscription_ids_merge_rows_and_subtotals(fake_azure, tenant):
+    subscriptions = tenant.subscription_ids[:2]
+
+    merged = function_app.query_cost_management_direct(cost_query(subscription_ids=subscriptions))
+    singles = [function_app.query_cost_management_direct(cost_query(subscription_id=subscription_id))
+               for subscription_id in subscriptions]
+
+    assert merged['total_cost'] == pytest.approx(sum(single['total_cost'] for single in singles))
+    assert [scope['total_cost'] for scope in merged['scopes']] == pytest.approx([s['total_cost'] for s in singles])
+    assert len(merged['rows']) == sum(len(single['rows']) for single in singles)
+    assert {row['subscription_id'] for row in merged['rows']} == set(subscriptions)
+    assert merged['complete'] is True and merged['partial'] is False
+
+
+def test_columnar_merge_adds_the_subscription_column(fake_azure, tenant):
+    subscriptions = tenant.subscription_ids
+
+    merged = function_app.query_cost_management_direct(cost_query(subscription_ids=subscriptions,
+                                                                  output_format='columnar'))
+
+    assert merged['columns'][-1] == 'SubscriptionId'
+    assert all(len(values) == merged['row_count'] for values in merged['data'].values())
+    assert set(merged['data']['SubscriptionId']) == set(subscriptions)
+
+
+def test_top_resources_are_re_ranked_across_scopes(fake_azure, tenant):
+    params = cost_query(query_type='top_resources', top_n=5)
+
+    merged = function_app.query_cost_management_direct(dict(params, subscription_ids=tenant.subscription_ids))
+    singles = [function_app.query_cost_management_direct(dict(params, subscription_id=subscription_id))
+               for subscription_id in tenant.subscription_ids]
+
+    expected = sorted((row['cost'] for single in singles for row in single['rows']), reverse=True)[:5]
+    assert [row['cost'] for row in merged['rows']] == pytest.approx(expected)
+    assert merged['total_cost'] == pytest.approx(sum(expected))
+
+
+def test_failed_scope_marks_the_merge_partial(fake_azure, tenant, monkeypatch):
+    failing_scope = f"/subscriptions/{tenant.subscription_ids[0]}"
+    limiter_call = cost_analysis._cost_rate_limiter.call
+
+    def call(operation, scope, *args, **kwargs):
+        if scope == failing_scope:
+            raise RuntimeError('scope unavailable')
+        return limiter_call(operation, scope, *args, **kwargs)
+
+    monkeypatch.setattr(cost_analysis._cost_rate_limiter, 'call', call)
+
+    merged = function_app.query_cost_management_direct(cost_query(subscription_ids=tenant.subscription_ids[:2]))
+
+    assert merged['partial'] is True
+    assert merged['errors'] == [{'scope': failing_scope, 'error': 'scope unavailable'}]
+    assert merged['scopes'][0] == {'scope': failing_scope, 'subscription_id': tenant.subscription_ids[0],
+                                   'error': 'scope unavailable'}
+    assert merged['total_cost'] == pytest.approx(merged['scopes'][1]['total_cost'])
+
+
+def test_resource_ids_go_only_to_their_own_subscription(fake_azure, tenant):
+    first, second, third = tenant.subscription_ids
+    ids = {subscription_id: [resource_id for resource_id, *_ in tenant.iter_cost_resources(subscription_id)][:3]
+           for subscription_id in (first, second)}
+    stray = f"/subscriptions/{third}/resourceGroups/rg/providers/Microsoft.Compute/disks/elsewhere"
+
+    merged = function_app.query_cost_management_direct(cost_query(
+        query_type='specific_resources', subscription_ids=[first, second],
+        resource_ids=ids[first] + ids[second] + [stray]))
+
+    assert fake_azure.calls['cost.query.usage'] == 2
+    assert [entry['resource_id'] for entry in merged['resources']] == ids[first] + ids[second] + [stray]
+    assert merged['resources'][-1] == {'resource_id': stray,
+                                       'error': 'Resource is not in any of the requested subscription_ids'}
+    assert merged['errors'] == [{'resource_id': stray, 'error': 'Resource is not in any of the requested subscription_ids'}]
+    assert merged['partial'] is True
+
+
+def test_resource_ids_outside_every_subscription_are_an_error(fake_azure, tenant):
+    result = function_app.query_cost_management_direct(cost_query(
+        query_type='specific_resources', subscription_ids=tenant.subscription_ids[:2],
+        resource_ids=['/subscriptions/other/resourceGroups/rg']))
+
+    assert result == {'error': 'None of the resource_ids belong to the requested subscription_ids'}
+    assert fake_azure.calls['cost.query.usage'] == 0
+
+
+@pytest.mark.parametrize('params, message', [
+    ({}, 'subscription_id is required'),
+    ({'subscription_id': 'a', 'management_group_id': 'mg'}, 'Specify only one scope parameter'),
+    ({'billing_scope': '/subscriptions/a'}, 'billing_scope must start with'),
+])
+def test_scope_parameters_are_validated(params, message):
+    assert function_app.query_cost_management_direct(cost_query(**params))['error'].startswith(message)
@@ -0,0 +1,75 @@
+import pytest
+
+import function_app
+from shared_code import cost_analysis
+
+
+def cost_query(**params):
+    """A subscription query; the row data of one is [CostUSD, UsageDate, ServiceName, ...]"""
+    return dict({'query_type': 'subscription'}, **params)
+
+
+def windows(start, end, granularity='Daily', **extra):
+    body = dict({'timePeriod': {'from': start, 'to': end}, 'dataset': {'granularity': granularity}}, **extra)
+    return [window['timePeriod'] for window in function_app.CostManagementAnalyzer._split_time_period(body)]
+
+
+def test_long_ranges_split_into_calendar_months():
+    assert windows('2025-01-15T00:00:00', '2025-04-10T23:59:59') == [
+        {'from': '2025-01-15T00:00:00', 'to': '2025-01-31T23:59:59'},
+        {'from': '2025-02-01T00:00:00', 'to': '2025-02-28T23:59:59'},
+        {'from': '2025-03-01T00:00:00', 'to': '2025-03-31T23:59:59'},
+        {'from': '2025-04-01T00:00:00', 'to': '2025-04-10T23:59:59'},
+    ]
+
+
+def test_windows_cross_the_year_boundary():
+    assert [window['from'][:7] for window in windows('2024-11-01T00:00:00', '2025-02-28T23:59:59')] == [
+        '2024-11', '2024-12', '2025-01', '2025-02']
+
+
+@pytest.mark.parametrize('start, end, granularity, extra', [
+    ('2025-01-15T00:00:00', '2025-03-10T23:59:59', 'Daily', {}),   # shorter than COST_QUERY_SPLIT_MIN_DAYS
+    ('2025-01-01T00:00:00', '2025-06-30T23:59:59', 'None', {}),    # totals cannot be concatenated
+    ('2025-01-01T00:00:00', '2025-06-30T23:59:59', 'Daily', {'top': 10}),
+    ('2025-01-01T00:00:00', '2025-06-30T23:59:59', 'Monthly', {'dataset': {'granularity': 'Monthly',
+                                                                           'sorting': [{'name': 'Cost'}]}}),
+])
+def test_unsplittable_queries_run_as_one(start, end, granularity, extra):
+    assert windows(start, end, granularity, **extra) == [{'from': start, 'to': end}]
+
+
+def test_split_threshold_is_configurable(monkeypatch):
+    monkeypatch.setattr(cost_analysis, 'COST_QUERY_SPLIT_MIN_DAYS', 10)
+
+    assert len(windows('2025-01-20T00:00:00', '2025-02-05T23:59:59')) == 2
+
+
+def test_split_query_matches_the_unsplit_result(fake_azure, tenant, monkeypatch):
+    params = cost_query(subscription_id=tenant.subscription_ids[0], start_date='2025-01-01', end_date='2025-04-30',
+                        use_cache=False)
+
+    split = function_app.query_cost_management_direct(params)
+    assert fake_azure.calls['cost.query.usage'] == 4
+
+    monkeypatch.setattr(cost_analysis, 'COST_QUERY_SPLIT_MIN_DAYS', 1000)
+    whole = function_app.query_cost_management_direct(params)
+
+    assert split['windows'] == 4
+    assert split['total_cost'] == pytest.approx(whole['total_cost'])
+    assert len(split['rows']) == len(whole['rows'])
+    # Windows are concatenated in calendar order
+    months = [str(row['data'][1])[:6] for row in split['rows']]
+    assert months == sorted(months) and months[0] == '202501' and months[-1] == '202504'
+
+
+def test_extending_a_range_only_fetches_the_new_month(fake_azure, tenant):
+    params = cost_query(subscription_id=tenant.subscription_ids[0], start_date='2025-01-01')
+
+    function_app.query_cost_management_direct(dict(params, end_date='2025-04-30'))
+    fake_azure.reset()
+    extended = function_app.query_cost_management_direct(dict(params, end_date='2025-05-31'))
+
+    assert fake_azure.calls['cost.query.usage'] == 1
+    assert extended['cache'] == {'enabled': True, 'hits': 4, 'misses': 1}
+    assert {str(row['data'][1])[:6] for row in extended['rows']} == {'202501', '202502', '202503', '202504', '202505'}
@@ -0,0 +1,161 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+import function_app
+from shared_code import caching
+
+
+class ChangeFeedClient:
+    """Resource Graph stand-in answering only the resourcechanges query with fixed last-change times"""
+
+    def __init__(self, last_changes):
+        self.last_changes = last_changes
+        self.queries = []
+
+    def resources(self, request):
+        self.queries.append(request.query)
+        assert request.query.startswith('resourcechanges')
+        rows = [{'subscriptionId': sub_id, 'lastChange': changed_at.isoformat()}
+                for sub_id, changed_at in self.last_changes.items()]
+        return SimpleNamespace(data=rows, skip_token=None)
+
+
+def disk(subscription_id, name, sku='Standard_LRS', size=128):
+    return {
+        'resource_type': 'Managed Disk',
+        'resource_id': f"/subscriptions/{subscription_id}/resourceGroups/rg/providers/Microsoft.Compute/disks/{name}",
+        'name': name,
+        'subscription_id': subscription_id,
+        'sku': sku,
+        'disk_size_gb': size,
+        'age_days': 3
+    }
+
+
+def scan(subscription_id, resources, errors=None):
+    return {'subscriptions_analyzed': [subscription_id], 'resources': resources, 'errors': errors or []}
+
+
+@pytest.fixture
+def store():
+    return caching.InMemorySnapshotStore()
+
+
+def test_snapshot_stores_are_abstract():
+    with pytest.raises(TypeError):
+        function_app.InventorySnapshotStore()
+
+
+def test_first_scan_reports_everything_as_added(fake_azure, store):
+    analyzer = function_app.OrphanedResourceAnalyzer(resource_types=['Managed Disk'], snapshot_store=store)
+    sub_id = 'sub-a'
+
+    results = analyzer._record_snapshots(scan(sub_id, [disk(sub_id, 'd1'), disk(sub_id, 'd2')]),
+                                         datetime.now(timezone.utc))
+
+    assert [record['name'] for record in results['changes']['added']] == ['d1', 'd2']
+    assert results['changes']['resolved'] == [] and results['changes']['changed'] == []
+    assert set(store.load(analyzer._snapshot_key(sub_id))['entries']) == {
+        analyzer._record_key(disk(sub_id, 'd1')), analyzer._record_key(disk(sub_id, 'd2'))
+    }
+
+
+def test_rescan_diffs_added_resolved_and_changed(fake_azure, store):
+    analyzer = function_app.OrphanedResourceAnalyzer(resource_types=['Managed Disk'], snapshot_store=store)
+    sub_id = 'sub-a'
+    analyzer._record_snapshots(scan(sub_id, [disk(sub_id, 'd1'), disk(sub_id, 'd2'), disk(sub_id, 'd3')]),
+                               datetime.now(timezone.utc))
+
+    # d1 resized, d2 deleted, d3 only aged (ignored by the content hash), d4 new
+    second = scan(sub_id, [disk(sub_id, 'd1', size=256), dict(disk(sub_id, 'd3'), age_days=9), disk(sub_id, 'd4')])
+    changes = analyzer._record_snapshots(second, datetime.now(timezone.utc))['changes']
+
+    assert [record['name'] for record in changes['added']] == ['d4']
+    assert [record['name'] for record in changes['resolved']] == ['d2']
+    assert [record['name'] for record in changes['changed']] == ['d1']
+    assert changes['unchanged_count'] == 1
+
+
+def test_etag_change_counts_as_changed(fake_azure, store):
+    analyzer = function_app.OrphanedResourceAnalyzer(resource_types=['Managed Disk'], snapshot_store=store)
+    sub_id = 'sub-a'
+    analyzer._record_snapshots(scan(sub_id, [dict(disk(sub_id, 'd1'), etag='W/"1"')]), datetime.now(timezone.utc))
+
+    changes = analyzer._record_snapshots(scan(sub_id, [dict(disk(sub_id, 'd1'), etag='W/"2"')]),
+                                         datetime.now(timezone.utc))['changes']
+
+    assert [record['name'] for record in changes['changed']] == ['d1']
+
+
+def test_failed_subscription_is_neither_diffed_nor_saved(fake_azure, store):
+    analyzer = function_app.OrphanedResourceAnalyzer(resource_types=['Managed Disk'], snapshot_store=store)
+    sub_id = 'sub-a'
+    analyzer._record_snapshots(scan(sub_id, [disk(sub_id, 'd1'), disk(sub_id, 'd2')]), datetime.now(timezone.utc))
+    saved = store.load(analyzer._snapshot_key(sub_id))
+
+    partial = scan(sub_id, [disk(sub_id, 'd1')], errors=[{'subscription_id': sub_id, 'error': 'timeout'}])
+    changes = analyzer._record_snapshots(partial, datetime.now(timezone.utc))['changes']
+
+    assert changes['resolved'] == []
+    assert store.load(analyzer._snapshot_key(sub_id)) == saved
+
+
+def test_snapshots_are_keyed_by_query_scope(fake_azure, store):
+    disks = function_app.OrphanedResourceAnalyzer(resource_types=['Managed Disk'], snapshot_store=store)
+    nics = function_app.OrphanedResourceAnalyzer(resource_types=['Network Interface'], snapshot_store=store)
+    scoped = function_app.OrphanedResourceAnalyzer(resource_types=['Managed Disk'], location='eastus', snapshot_store=store)
+
+    assert len({disks._snapshot_key('sub-a'), nics._snapshot_key('sub-a'), scoped._snapshot_key('sub-a')}) == 3
+    assert disks._snapshot_key('SUB-A') == disks._snapshot_key('sub-a')
+
+
+def test_unchanged_subscriptions_are_served_from_their_snapshot(fake_azure, tenant, store):
+    first = function_app.OrphanedResourceAnalyzer(resource_types=['Managed Disk'], snapshot_store=store).analyze_all()
+    assert first['incremental']['reused_subscriptions'] == 0
+    assert len(first['changes']['added']) == len(first['resources']) > 0
+
+    # Only the second subscription changed since the snapshots were taken
+    changed_sub = tenant.subscription_ids[1]
+    graph = ChangeFeedClient({changed_sub: datetime.now(timezone.utc) + timedelta(minutes=1)})
+    fake_azure.reset()
+
+    second = function_app.OrphanedResourceAnalyzer(resource_types=['Managed Disk'], snapshot_store=store,
+                                                   graph_client=graph).analyze_all()
+
+    assert len(graph.queries) == 1
+    assert second['incremental'] == {'reused_subscriptions': 2, 'scanned_subscriptions': 1,
+                                     'change_detection': 'resource_changes'}
+    assert fake_azure.calls['compute.disks.list'] == 1
+    assert second['changes']['added'] == [] and second['changes']['resolved'] == []
+    assert second['changes']['unchanged_count'] == len(first['resources'])
+    assert sorted(r['resource_id'] for r in second['resources']) == sorted(r['resource_id'] for r in first['resources'])
+
+
+def test_change_feed_failure_falls_back_to_a_full_scan(fake_azure, tenant, store):
+    function_app.OrphanedResourceAnalyzer(resource_types=['Managed Disk'], snapshot_store=store).analyze_all()
+
+    class BrokenGraph:
+        def resources(self, request):
+            raise RuntimeError('Resource Graph unavailable')
+
+    fake_azure.reset()
+    result = function_app.OrphanedResourceAnalyzer(resource_types=['Managed Disk'], snapshot_store=store,
+                                                   graph_client=BrokenGraph()).analyze_all()
+
+    assert result['incremental']['reused_subscriptions'] == 0
+    assert result['incremental']['change_detection'] == 'unavailable'
+    assert fake_azure.calls['compute.disks.list'] == tenant.subscription_count
+
+
+def test_stale_snapshots_are_not_reused(fake_azure, store, monkeypatch):
+    function_app.OrphanedResourceAnalyzer(resource_types=['Managed Disk'], snapshot_store=store).analyze_all()
+    monkeypatch.setattr(function_app, 'ORPHAN_SNAPSHOT_MAX_AGE_HOURS', 0)
+    graph = ChangeFeedClient({})
+
+    result = function_app.OrphanedResourceAnalyzer(resource_types=['Managed Disk'], snapshot_store=store,
+                                                   graph_client=graph).analyze_all()
+
+    assert graph.queries == []
+    assert result['incremental']['reused_subscriptions'] == 0
@@ -0,0 +1,43 @@
+import pytest
+
+import function_app
+
+DISK_ID = '/subscriptions/sub-a/resourceGroups/rg/providers/Microsoft.Compute/disks/disk-1'
+IP_ID = '/subscriptions/sub-a/resourceGroups/rg/providers/Microsoft.Network/publicIPAddresses/ip-1'
+
+
+def summary_of(*resources):
+    summary = function_app.SummaryAccumulator()
+    for resource in resources:
+        summary.add(resource)
+    return summary.to_dict()
+
+
+def costed_orphan(resource_id, savings, resource_type='Managed Disk'):
+    return {'resource_type': resource_type, 'resource_id': resource_id, 'cost': savings / 12, 'potential_savings': savings}
+
+
+def advice(resource_id, savings):
+    return {'resource_type': 'Advisor Recommendation', 'resource_id': resource_id, 'potential_savings': savings}
+
+
+def test_orphans_and_advisor_savings_add_up_for_different_resources():
+    summary = summary_of(costed_orphan(DISK_ID, 120.0), advice(IP_ID, 40.0))
+
+    assert summary['total_potential_savings'] == pytest.approx(160.0)
+
+
+@pytest.mark.parametrize('advisor_first', [True, False])
+def test_orphan_already_covered_by_advisor_is_not_counted_twice(advisor_first):
+    records = [costed_orphan(DISK_ID, 120.0), advice(DISK_ID.upper(), 100.0)]
+
+    summary = summary_of(*(reversed(records) if advisor_first else records))
+
+    assert summary['total_potential_savings'] == pytest.approx(100.0)
+    assert summary['orphan_cost'] == pytest.approx(10.0)
+
+
+def test_uncosted_orphans_add_no_savings():
+    summary = summary_of({'resource_type': 'Managed Disk', 'resource_id': DISK_ID}, advice(IP_ID, 40.0))
+
+    assert summary['total_potential_savings'] == pytest.approx(40.0)
@@ -0,0 +1,112 @@
+import base64
+import json
+
+import pytest
+
+import function_app
+
+
+@pytest.fixture(autouse=True)
+def scan_store(monkeypatch):
+    store = function_app.ScanResultStore(ttl_seconds=60, max_entries=4)
+    monkeypatch.setattr(function_app, '_scan_result_store', store)
+    return store
+
+
+def all_pages(first):
+    pages = [first]
+    while pages[-1]['page']['next_cursor']:
+        pages.append(function_app.query_resources({'cursor': pages[-1]['page']['next_cursor']}))
+    return pages
+
+
+def decode(cursor):
+    return json.loads(base64.urlsafe_b64decode(cursor))
+
+
+def encode(position):
+    return base64.urlsafe_b64encode(json.dumps(position).encode('utf-8')).decode('ascii')
+
+
+def test_cursors_walk_the_scan_once_without_rescanning(fake_azure):
+    first = function_app.query_resources({'page_size': 10})
+    calls_after_scan = sum(fake_azure.calls.values())
+
+    pages = all_pages(first)
+
+    total = first['page']['total_resources']
+    assert len(pages) == -(-total // 10)
+    assert [page['page']['offset'] for page in pages] == list(range(0, total, 10))
+    resource_ids = [record['resource_id'] for page in pages for record in page['resources']]
+    assert len(resource_ids) == len(set(resource_ids)) == total
+    assert sum(fake_azure.calls.values()) == calls_after_scan
+
+
+@pytest.mark.parametrize('order', ['asc', 'desc'])
+def test_ordered_pages_sort_missing_values_last(fake_azure, order):
+    pages = all_pages(function_app.query_resources({'page_size': 7, 'order_by': 'estimated_monthly_cost',
+                                                    'order': order}))
+
+    costs = [record.get('estimated_monthly_cost') for page in pages for record in page['resources']]
+    priced = [cost for cost in costs if cost is not None]
+    assert costs == priced + [None] * (len(costs) - len(priced))
+    assert priced == sorted(priced, reverse=order == 'desc')
+    assert all(page['page']['order'] == order for page in pages)
+
+
+def test_first_page_keeps_the_scan_metadata(fake_azure):
+    page = function_app.query_resources({'page_size': 5})
+
+    assert page['page']['returned'] == len(page['resources']) == 5
+    assert page['summary']['total_resources'] == page['page']['total_resources']
+    assert decode(page['page']['next_cursor'])['offset'] == 5
+
+
+def test_invalid_order_is_rejected(fake_azure):
+    with pytest.raises(ValueError, match='Invalid order'):
+        function_app.query_resources({'page_size': 5, 'order': 'sideways'})
+
+
+@pytest.mark.parametrize('change', [{'offset': -1}, {'offset': '5'}, {'page_size': 0}, {'order': 'up'},
+                                    {'order_by': ['name']}])
+def test_tampered_cursors_are_rejected(fake_azure, change):
+    cursor = function_app.query_resources({'page_size': 5})['page']['next_cursor']
+
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        function_app.query_resources({'cursor': encode(dict(decode(cursor), **change))})
+
+
+@pytest.mark.parametrize('cursor', ['not-base64!', encode({'offset': 0}), encode(['list'])])
+def test_malformed_cursors_are_rejected(cursor):
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        function_app.query_resources({'cursor': cursor})
+
+
+def test_cursor_of_an_evicted_scan_asks_for_a_new_query(fake_azure, monkeypatch):
+    cursor = function_app.query_resources({'page_size': 5})['page']['next_cursor']
+    monkeypatch.setattr(function_app, '_scan_result_store', function_app.ScanResultStore(ttl_seconds=60, max_entries=4))
+
+    with pytest.raises(ValueError, match='Cursor has expired'):
+        function_app.query_resources({'cursor': cursor})
+
+
+@pytest.mark.parametrize('order_by', ['tags', 'resource_id; drop', 'created_date'])
+def test_unorderable_fields_are_rejected_before_scanning(fake_azure, order_by):
+    with pytest.raises(ValueError, match=f'Invalid order_by: {order_by}'):
+        function_app.query_resources({'page_size': 5, 'order_by': order_by})
+
+    assert fake_azure.stats()['api_calls'] == 0
+
+
+def test_cursor_with_an_unorderable_field_is_rejected(fake_azure):
+    cursor = function_app.query_resources({'page_size': 5})['page']['next_cursor']
+
+    with pytest.raises(ValueError, match='Invalid cursor: Invalid order_by: tags'):
+        function_app.query_resources({'cursor': encode(dict(decode(cursor), order_by='tags'))})
+
+
+@pytest.mark.parametrize('order_by', function_app.ScanResultStore.ORDERABLE_FIELDS)
+def test_every_orderable_field_sorts_a_mixed_scan(fake_azure, order_by):
+    page = function_app.query_resources({'page_size': 5, 'order_by': order_by, 'include_cost': True})
+
+    assert page['page']['order_by'] == order_by
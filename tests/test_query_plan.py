@@ -0,0 +1,23 @@
+import function_app
+
+
+def test_single_subscription_and_type_filters_are_pushed_into_the_scan(fake_azure, tenant):
+    subscription_id = tenant.subscription_ids[1]
+
+    results = function_app.query_resources({'subscription_id': subscription_id, 'resource_types': ['Managed Disk']})
+
+    assert fake_azure.calls['compute.disks.list'] == 1
+    assert fake_azure.stats()['api_calls'] == 1
+    assert {record['subscription_id'] for record in results['resources']} == {subscription_id}
+    assert {record['resource_type'] for record in results['resources']} == {'Managed Disk'}
+
+
+def test_location_filter_is_applied_inside_the_collectors(fake_azure, tenant):
+    everything = function_app.query_resources({'resource_types': ['Managed Disk']})
+    location = everything['resources'][0]['location']
+
+    scoped = function_app.query_resources({'resource_types': ['Managed Disk'], 'location': location.upper()})
+
+    assert scoped['resources']
+    assert sorted(r['resource_id'] for r in scoped['resources']) == sorted(
+        r['resource_id'] for r in everything['resources'] if r['location'] == location)
@@ -0,0 +1,66 @@
+import logging
+
+import pytest
+
+import function_app
+from shared_code.settings import env_number
+
+
+@pytest.mark.parametrize('params, message', [
+    ({'max_workers': 'abc'}, "max_workers must be a positive integer, got 'abc'"),
+    ({'max_workers': 0}, 'max_workers must be a positive integer, got 0'),
+    ({'max_workers': 2.5}, 'max_workers must be a positive integer, got 2.5'),
+    ({'collector_timeout': '-1'}, "collector_timeout must be a positive number, got '-1'"),
+    ({'page_size': 'ten'}, "page_size must be a positive integer, got 'ten'"),
+    ({'cost_days': True}, 'cost_days must be a positive integer, got True'),
+])
+def test_bad_numeric_settings_fail_before_scanning(fake_azure, params, message):
+    with pytest.raises(ValueError) as error:
+        function_app.query_resources(params)
+
+    assert str(error.value) == message
+    assert sum(fake_azure.calls.values()) == 0
+
+
+def test_numeric_settings_accept_strings(fake_azure):
+    analyzer = function_app.OrphanedResourceAnalyzer(max_workers='4', collector_timeout='2.5')
+
+    assert analyzer.max_workers == 4 and analyzer.collector_timeout == 2.5
+    assert function_app.OrphanedResourceAnalyzer().max_workers == function_app.DEFAULT_SUBSCRIPTION_SCAN_WORKERS
+
+
+def test_jobs_reject_bad_settings_at_submission():
+    store = function_app.InMemoryJobStore()
+
+    with pytest.raises(ValueError, match='max_workers must be a positive integer'):
+        function_app.start_analysis_job({'max_workers': 'abc'}, job_store=store)
+
+
+def test_analyze_handler_returns_400_for_bad_max_workers(fake_azure):
+    import azure.functions as func
+    handler = next(function.get_user_function() for function in function_app.app.get_functions()
+                   if function.get_trigger().route == 'analyze')
+    request = func.HttpRequest('POST', 'http://localhost/api/analyze', body=b'{"max_workers": "abc"}')
+
+    response = handler(request)
+
+    assert response.status_code == 400
+    assert 'max_workers must be a positive integer' in response.get_body().decode()
+
+
+@pytest.mark.parametrize('raw, expected', [('12', 12), (' 7 ', 7), ('', 5), ('abc', 5), ('-3', 5), ('1.5', 5)])
+def test_env_numbers_fall_back_to_the_default(monkeypatch, caplog, raw, expected):
+    monkeypatch.setenv('TEST_SETTING', raw)
+
+    with caplog.at_level(logging.WARNING):
+        assert env_number('TEST_SETTING', 5) == expected
+
+    assert bool(caplog.records) == (raw.strip() not in ('', '12', '7'))
+
+
+def test_env_float_settings(monkeypatch):
+    monkeypatch.setenv('TEST_SETTING', '0.25')
+
+    assert env_number('TEST_SETTING', 1.0, float) == 0.25
+    monkeypatch.setenv('TEST_SETTING', 'nan')
+    assert env_number('TEST_SETTING', 1.0, float) == 1.0
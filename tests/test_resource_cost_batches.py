@@ -0,0 +1,58 @@
+import pytest
+
+import function_app
+
+
+def resource_ids(tenant, index=0):
+    return [resource_id for resource_id, *_ in tenant.iter_cost_resources(tenant.subscription_ids[index])]
+
+
+def year_query(tenant, ids):
+    return {'subscription_id': tenant.subscription_ids[0], 'resource_ids': ids,
+            'start_date': '2025-01-01', 'end_date': '2025-12-31'}
+
+
+def test_resource_costs_are_batched_to_fit_one_result_page(fake_azure, tenant):
+    ids = resource_ids(tenant)
+
+    result = function_app.query_cost_management_direct(year_query(tenant, ids))
+
+    # 365 daily rows per resource: 5000 // 365 = 13 resources per batch
+    expected_batches = -(-len(ids) // 13)
+    assert result['query_stats'] == {'batch_queries': expected_batches, 'individual_queries': 0}
+    assert fake_azure.calls['cost.query.usage'] == expected_batches
+    assert [entry['resource_id'] for entry in result['resources']] == ids
+    assert result['complete'] is True
+    assert all(len(entry['daily_costs']) == 365 for entry in result['resources'])
+
+
+def test_failing_batches_are_retried_at_half_size(fake_azure, tenant, monkeypatch):
+    ids = resource_ids(tenant)
+    original = function_app.CostManagementAnalyzer._query_resource_batch
+
+    def limited_batch(self, chunk, start_date, end_date):
+        if len(chunk) > 10:
+            raise RuntimeError('result truncated')
+        return original(self, chunk, start_date, end_date)
+
+    monkeypatch.setattr(function_app.CostManagementAnalyzer, '_query_resource_batch', limited_batch)
+
+    result = function_app.query_cost_management_direct(year_query(tenant, ids))
+
+    # One failed batch of 13, then every later batch stays at 6
+    assert result['query_stats'] == {'batch_queries': 1 + -(-len(ids) // 6), 'individual_queries': 0}
+    assert [entry['resource_id'] for entry in result['resources']] == ids
+    assert result['complete'] is True
+
+
+@pytest.mark.parametrize('index', [0, 2])
+def test_batched_costs_match_individual_totals(fake_azure, tenant, index):
+    ids = resource_ids(tenant, index)[:5]
+    params = {'subscription_id': tenant.subscription_ids[index], 'start_date': '2025-03-01', 'end_date': '2025-03-31'}
+
+    batched = function_app.query_cost_management_direct(dict(params, resource_ids=ids))
+    single = [function_app.query_cost_management_direct(dict(params, resource_ids=[resource_id], use_cache=False))
+              for resource_id in ids]
+
+    assert [entry['total_cost'] for entry in batched['resources']] == pytest.approx(
+        [result['resources'][0]['total_cost'] for result in single])
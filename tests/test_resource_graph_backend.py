@@ -0,0 +1,187 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import function_app
+from local_resource_graph import LocalResourceGraphClient
+
+SUB_A = '00000000-0000-4000-8000-00000000000a'
+SUB_B = '00000000-0000-4000-8000-00000000000b'
+
+
+def arm_id(subscription_id, resource_group, provider, name):
+    return f"/subscriptions/{subscription_id}/resourceGroups/{resource_group}/providers/{provider}/{name}"
+
+
+def disk_row(index, subscription_id=SUB_A, location='eastus', resource_group='rg-data'):
+    return {
+        'id': arm_id(subscription_id, resource_group, 'Microsoft.Compute/disks', f'disk-{index}'),
+        'name': f'disk-{index}',
+        'location': location,
+        'subscriptionId': subscription_id,
+        'tags': None,
+        'diskSizeGB': 128,
+        'sku': 'Premium_LRS'
+    }
+
+
+@pytest.fixture
+def analyzer(fake_azure):
+    return function_app.OrphanedResourceAnalyzer(backend='resource_graph')
+
+
+def backend_for(analyzer, rows_by_type, page_size=None):
+    client = LocalResourceGraphClient(rows_by_type, page_size=page_size)
+    return function_app.ResourceGraphOrphanBackend(client, analyzer), client
+
+
+def test_query_follows_skip_tokens_until_the_last_page(analyzer):
+    backend, client = backend_for(analyzer, {'microsoft.compute/disks': [disk_row(i) for i in range(5)]}, page_size=2)
+
+    records = backend.collect('disks', [SUB_A])
+
+    assert [record['name'] for record in records] == [f'disk-{i}' for i in range(5)]
+    assert [request.options.skip_token for request in client.requests] == [None, '2', '4']
+    assert all(request.options.top == backend.PAGE_SIZE for request in client.requests)
+
+
+def test_query_chunks_subscriptions(analyzer, monkeypatch):
+    monkeypatch.setattr(function_app.ResourceGraphOrphanBackend, 'MAX_SUBSCRIPTIONS_PER_QUERY', 2)
+    subscriptions = [SUB_A, SUB_B, '00000000-0000-4000-8000-00000000000c']
+    rows = [disk_row(i, subscription_id=sub) for i, sub in enumerate(subscriptions)]
+    backend, client = backend_for(analyzer, {'microsoft.compute/disks': rows})
+
+    records = backend.collect('disks', subscriptions)
+
+    assert len(records) == 3
+    assert [request.subscriptions for request in client.requests] == [subscriptions[:2], subscriptions[2:]]
+
+
+def test_scoped_query_pushes_down_escaped_filters(fake_azure):
+    analyzer = function_app.OrphanedResourceAnalyzer(backend='resource_graph', location='EastUS',
+                                                     resource_group="rg-o'brien")
+    rows = [disk_row(0), disk_row(1, location='westeurope'), disk_row(2, resource_group="rg-o'brien")]
+    backend, _ = backend_for(analyzer, {'microsoft.compute/disks': rows})
+
+    query = backend.scoped_query('disks')
+
+    assert "| where resourceGroup =~ 'rg-o\\'brien'" in query
+    assert "| where location =~ 'eastus'" in query
+    assert query.startswith('Resources\n')
+    assert [record['name'] for record in backend.collect('disks', [SUB_A])] == ['disk-2']
+
+
+def test_public_ip_query_excludes_every_attachment_the_sdk_path_checks():
+    query = function_app.ResourceGraphOrphanBackend.QUERIES['public_ips']
+
+    assert 'isnull(properties.ipConfiguration)' in query
+    assert 'isnull(properties.natGateway)' in query
+    assert 'array_length(properties.loadBalancerFrontendIpConfigurations), 0) == 0' in query
+
+
+def test_map_public_ips(analyzer):
+    backend, _ = backend_for(analyzer, {})
+    row = {'id': arm_id(SUB_A, 'rg-net', 'Microsoft.Network/publicIPAddresses', 'pip-1'), 'name': 'pip-1',
+           'location': 'eastus', 'subscriptionId': SUB_A, 'tags': {'env': 'dev'}, 'sku': '', 'allocationMethod': 'Static'}
+
+    record = backend._map_public_ips(row)
+
+    assert record['resource_type'] == 'Public IP'
+    assert record['resource_group'] == 'rg-net'
+    assert record['sku'] == 'Basic'
+    assert record['allocation_method'] == 'Static'
+    assert record['tags'] == {'env': 'dev'}
+
+
+def test_map_disks(analyzer):
+    backend, _ = backend_for(analyzer, {})
+
+    record = backend._map_disks(dict(disk_row(0), sku=None))
+
+    assert record['resource_type'] == 'Managed Disk'
+    assert record['disk_size_gb'] == 128
+    assert record['sku'] == 'Unknown'
+    assert record['tags'] == {}
+
+
+def test_map_snapshots_computes_age(analyzer):
+    backend, _ = backend_for(analyzer, {})
+    created = datetime.now(timezone.utc) - timedelta(days=40)
+    row = {'id': arm_id(SUB_A, 'rg', 'Microsoft.Compute/snapshots', 'snap'), 'name': 'snap', 'location': 'eastus',
+           'subscriptionId': SUB_A, 'diskSizeGB': 64, 'sku': '', 'timeCreated': created.strftime('%Y-%m-%dT%H:%M:%S.%fZ')}
+
+    record = backend._map_snapshots(row)
+
+    assert record['age_days'] == 40
+    assert record['sku'] == 'Standard_LRS'
+    assert datetime.fromisoformat(record['created_date']) == created
+
+
+@pytest.mark.parametrize('time_created', ['', None, 'not-a-date'])
+def test_map_snapshots_tolerates_missing_or_bad_timestamps(analyzer, time_created):
+    backend, _ = backend_for(analyzer, {})
+    row = {'id': arm_id(SUB_A, 'rg', 'Microsoft.Compute/snapshots', 'snap'), 'name': 'snap', 'location': 'eastus',
+           'subscriptionId': SUB_A, 'diskSizeGB': 64, 'sku': 'Standard_ZRS', 'timeCreated': time_created}
+
+    record = backend._map_snapshots(row)
+
+    assert record['age_days'] is None and record['created_date'] is None
+    assert record['sku'] == 'Standard_ZRS'
+
+
+def test_map_nics(analyzer):
+    backend, _ = backend_for(analyzer, {})
+    row = {'id': arm_id(SUB_A, 'rg', 'Microsoft.Network/networkInterfaces', 'nic'), 'name': 'nic',
+           'location': 'eastus', 'subscriptionId': SUB_A, 'tags': None}
+
+    record = backend._map_nics(row)
+
+    assert record['resource_type'] == 'Network Interface'
+    assert record['tags'] == {}
+
+
+def test_map_vms_without_ahb_applies_the_eligibility_rules(analyzer):
+    backend, _ = backend_for(analyzer, {})
+    base = {'id': arm_id(SUB_A, 'rg', 'Microsoft.Compute/virtualMachines', 'vm'), 'name': 'vm',
+            'location': 'eastus', 'subscriptionId': SUB_A, 'vmSize': 'Standard_D4s_v5'}
+    windows_server = dict(base, osType='Windows', publisher='MicrosoftWindowsServer', offer='WindowsServer',
+                          imageSku='2022-datacenter')
+    linux = dict(base, osType='Linux', publisher='Canonical', offer='UbuntuServer', imageSku='22_04-lts')
+
+    record = backend._map_vms_without_ahb(windows_server)
+
+    assert record['resource_type'] == 'VM without AHB'
+    assert record['vm_size'] == 'Standard_D4s_v5'
+    assert backend._map_vms_without_ahb(linux) is None
+
+
+def test_map_advisor(analyzer):
+    backend, _ = backend_for(analyzer, {})
+    row = {'id': '/subscriptions/a/providers/Microsoft.Advisor/recommendations/rec-1', 'name': 'rec-1',
+           'subscriptionId': SUB_A, 'category': 'Cost', 'impact': 'High', 'risk': '', 'problem': 'Idle VM',
+           'solution': 'Shut down', 'impactedValue': 'vm-1', 'impactedResourceId': '/subscriptions/a/vm-1',
+           'extendedProperties': {'annualSavingsAmount': '1200.5'}, 'lastUpdated': '2025-01-01T00:00:00Z'}
+
+    record = backend._map_advisor(row)
+
+    assert record['recommendation_id'] == row['id']
+    assert record['potential_savings'] == 1200.5
+    assert record['risk'] is None
+    assert record['resource_id'] == '/subscriptions/a/vm-1'
+
+
+def test_analyzer_uses_the_graph_backend_end_to_end(fake_azure, tenant):
+    subscription_id = tenant.subscription_ids[0]
+    client = LocalResourceGraphClient({
+        'microsoft.compute/disks': [disk_row(i, subscription_id=subscription_id) for i in range(3)]
+    }, page_size=2)
+    analyzer = function_app.OrphanedResourceAnalyzer(backend='resource_graph', graph_client=client,
+                                                     resource_types=['Managed Disk'])
+
+    results = analyzer.analyze_all()
+
+    assert results['backend'] == 'resource_graph'
+    assert len(results['resources']) == 3
+    assert results['resources'][0]['subscription_name'] == 'Synthetic 0'
+    # The SDK list calls are never made when the graph answers
+    assert fake_azure.calls['compute.disks.list'] == 0
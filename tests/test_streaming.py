@@ -0,0 +1,100 @@
+import json
+import threading
+import time
+
+import pytest
+
+import function_app
+
+
+def test_hung_collector_times_out_inside_a_page(fake_azure):
+    release = threading.Event()
+    analyzer = function_app.OrphanedResourceAnalyzer(resource_types=['Managed Disk'], collector_timeout=0.3)
+
+    def hung_disks(subscription_id=None, clients=None):
+        yield {'resource_type': 'Managed Disk', 'subscription_id': subscription_id, 'resource_id': f'{subscription_id}/d0'}
+        release.wait(30)  # a page that never comes back
+        yield {'resource_type': 'Managed Disk', 'subscription_id': subscription_id, 'resource_id': f'{subscription_id}/d1'}
+
+    analyzer.iter_orphaned_disks = hung_disks
+    started = time.monotonic()
+    try:
+        items = list(analyzer.iter_analysis())
+    finally:
+        release.set()
+
+    assert time.monotonic() - started < 5
+    resources = [item for kind, item in items if kind == 'resource']
+    errors = [item for kind, item in items if kind == 'error']
+    assert len(resources) == len(errors) == 3
+    assert all(error['error'] == 'Collector timed out after 0.3s' and error['collector'] == 'disks' for error in errors)
+
+
+@pytest.mark.parametrize('params', [{'mode': 'delta'}, {'include_cost': True}])
+def test_invalid_stream_requests_fail_before_streaming(params):
+    with pytest.raises(ValueError):
+        function_app.stream_query_resources(params)
+
+
+def test_stream_summary_lists_errors_like_the_json_response(fake_azure):
+    analyzer = function_app.OrphanedResourceAnalyzer(resource_types=['Managed Disk', 'Network Interface'])
+
+    def failing_nics(subscription_id=None, clients=None):
+        raise RuntimeError('nic listing failed')
+        yield
+
+    analyzer.iter_orphaned_nics = failing_nics
+    lines = [json.loads(line) for line in function_app._stream_records(analyzer, {})]
+
+    summary = lines[-1]
+    assert summary['record_type'] == 'summary'
+    assert summary['partial'] is True
+    assert [error['error'] for error in summary['errors']] == ['nic listing failed'] * 3
+    assert summary['errors'] == [{key: value for key, value in line.items() if key != 'record_type'}
+                                 for line in lines if line['record_type'] == 'error']
+    assert summary['summary']['total_resources'] == sum(line['record_type'] == 'resource' for line in lines)
+
+
+def test_hung_collector_does_not_leave_reader_threads_behind(fake_azure):
+    release = threading.Event()
+    closed = []
+    analyzer = function_app.OrphanedResourceAnalyzer(resource_types=['Managed Disk'], collector_timeout=0.2)
+
+    def hung_disks(subscription_id=None, clients=None):
+        try:
+            release.wait(30)
+            yield {'resource_type': 'Managed Disk', 'subscription_id': subscription_id, 'resource_id': f'{subscription_id}/d0'}
+        finally:
+            closed.append(subscription_id)
+
+    analyzer.iter_orphaned_disks = hung_disks
+    before = threading.active_count()
+    try:
+        items = list(analyzer.iter_analysis())
+    finally:
+        release.set()
+
+    assert [kind for kind, _ in items] == ['error'] * 3
+    deadline = time.monotonic() + 5
+    while len(closed) < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(closed) == 3
+    assert not [thread for thread in threading.enumerate() if thread.name.startswith('orphan-read')]
+    assert threading.active_count() <= before + 3
+
+
+def test_stream_falls_back_to_the_sdk_when_resource_graph_fails(fake_azure, tenant, monkeypatch):
+    def unavailable(self, name, subscription_ids):
+        raise RuntimeError('graph unavailable')
+        yield
+
+    monkeypatch.setattr(function_app.ResourceGraphOrphanBackend, 'iter_collect', unavailable)
+    analyzer = function_app.OrphanedResourceAnalyzer(backend='resource_graph', graph_client=object())
+    lines = [json.loads(line) for line in function_app._stream_records(analyzer, {})]
+
+    expected = function_app.query_resources({'backend': 'sdk'})
+    summary = lines[-1]
+    assert summary['backend'] == 'sdk' and summary['backend_fallback_reason'] == 'graph unavailable'
+    assert summary['errors'] == [] and summary['partial'] is False
+    assert sorted(line['resource_id'] for line in lines if line['record_type'] == 'resource') == \
+        sorted(resource['resource_id'] for resource in expected['resources'])
@@ -0,0 +1,44 @@
+import function_app
+
+COLLECTOR_OPERATIONS = ('compute.disks.list', 'compute.snapshots.list', 'compute.virtual_machines.list',
+                        'network.public_ip_addresses.list', 'network.network_interfaces.list',
+                        'advisor.recommendations.list')
+
+
+def test_tenant_wide_scan_lists_every_subscription_once_per_collector(fake_azure, tenant):
+    results = function_app.query_resources({})
+
+    assert fake_azure.calls['subscription.subscriptions.list'] == 1
+    assert all(fake_azure.calls[operation] == tenant.subscription_count for operation in COLLECTOR_OPERATIONS)
+    analyzed = sorted(results['subscriptions_analyzed'], key=lambda entry: entry['subscription_id'])
+    assert [entry['subscription_id'] for entry in analyzed] == tenant.subscription_ids
+    assert sum(entry['resources_found'] for entry in analyzed) == len(results['resources'])
+    assert results['errors'] == []
+
+
+def test_worker_count_does_not_change_the_result(fake_azure):
+    serial = function_app.query_resources({'max_workers': 1})
+    parallel = function_app.query_resources({'max_workers': 8})
+
+    assert sorted(r['resource_id'] for r in serial['resources']) == sorted(r['resource_id'] for r in parallel['resources'])
+    assert serial['summary'] == parallel['summary']
+
+
+def test_subscription_that_cannot_be_scanned_marks_the_result_partial(fake_azure, tenant, monkeypatch):
+    broken, failing = tenant.subscription_ids[:2]
+    initialize = function_app.OrphanedResourceAnalyzer._initialize_clients_for_subscription
+
+    def initialize_clients(self, subscription_id):
+        if subscription_id == failing:
+            raise RuntimeError('subscription disabled')
+        return None if subscription_id == broken else initialize(self, subscription_id)
+
+    monkeypatch.setattr(function_app.OrphanedResourceAnalyzer, '_initialize_clients_for_subscription',
+                        initialize_clients)
+
+    results = function_app.query_resources({})
+
+    assert results['partial'] is True
+    assert [(error['subscription_id'], error['error']) for error in results['errors']] == [
+        (broken, 'Failed to initialize clients'), (failing, 'subscription disabled')]
+    assert [entry['subscription_id'] for entry in results['subscriptions_analyzed']] == tenant.subscription_ids[2:]
@@ -0,0 +1,150 @@
+"""
+Rebuild pricing/price_table.json, the offline price index used to estimate orphan waste.
+
+Input is an export of the Azure Retail Prices API (https://prices.azure.com/api/retail/prices):
+the API's JSON pages ({"Items": [...]}), a JSON list of items, or a CSV with the same column
+names. Export the managed disk and public IP meters, e.g. with the filters
+    serviceName eq 'Storage' and endswith(productName, 'Managed Disks')
+    serviceName eq 'Virtual Network' and productName eq 'IP Addresses'
+
+Usage:
+    python tools/refresh_price_table.py disks.json ips.json --version 2025-10
+"""
+import argparse
+import csv
+import json
+import os
+import re
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+HOURS_PER_MONTH = 730
+
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'pricing', 'price_table.json')
+
+# Managed disk product -> SKU family used in disk.sku.name (Premium_LRS, StandardSSD_ZRS, ...)
+DISK_FAMILIES = {
+    'Premium SSD Managed Disks': 'Premium',
+    'Standard SSD Managed Disks': 'StandardSSD',
+    'Standard HDD Managed Disks': 'Standard'
+}
+# Snapshot SKUs are Standard_* (billed on the HDD meters) or Premium_*
+SNAPSHOT_FAMILIES = {
+    'Premium SSD Managed Disks': 'Premium',
+    'Standard HDD Managed Disks': 'Standard'
+}
+
+DISK_METER = re.compile(r'^([PES]\d+) (LRS|ZRS) Disk$')
+SNAPSHOT_METER = re.compile(r'^(LRS|ZRS) Snapshot$')
+
+
+def load_items(path: str) -> List[Dict[str, Any]]:
+    """Price items from one exported file (JSON pages, JSON list or CSV)"""
+    if path.lower().endswith('.csv'):
+        with open(path, 'r', encoding='utf-8-sig', newline='') as sheet:
+            return list(csv.DictReader(sheet))
+
+    with open(path, 'r', encoding='utf-8') as sheet:
+        payload = json.load(sheet)
+    if isinstance(payload, dict):
+        return payload.get('Items', [])
+    # A list of items, or a list of saved API pages
+    items = []
+    for entry in payload:
+        items.extend(entry.get('Items', []) if 'Items' in entry else [entry])
+    return items
+
+
+def price_entry(item: Dict[str, Any]) -> Optional[Tuple[str, str, str, float]]:
+    """(service, sku, tier, monthly price) for a disk, snapshot or public IP meter, else None"""
+    product = item.get('productName', '')
+    meter = item.get('meterName', '')
+    unit = item.get('unitOfMeasure', '')
+    price = float(item.get('retailPrice') or item.get('unitPrice') or 0)
+
+    disk_meter = DISK_METER.match(meter)
+    if product in DISK_FAMILIES and disk_meter and unit == '1/Month':
+        tier, redundancy = disk_meter.groups()
+        return 'disk', f"{DISK_FAMILIES[product]}_{redundancy}", tier, price
+
+    snapshot_meter = SNAPSHOT_METER.match(meter)
+    if product in SNAPSHOT_FAMILIES and snapshot_meter and unit.endswith('GB/Month'):
+        return 'snapshot', f"{SNAPSHOT_FAMILIES[product]}_{snapshot_meter.group(1)}", 'per_gb', price
+
+    # Unassociated dynamic IPs are free, so only static meters are kept
+    if (product == 'IP Addresses' and 'Static Public IP' in meter and 'IPv6' not in meter
+            and item.get('skuName') in ('Basic', 'Standard') and unit == '1 Hour'):
+        return 'public_ip', item['skuName'], 'Static', price * HOURS_PER_MONTH
+
+    return None
+
+
+def build_prices(items: List[Dict[str, Any]], currency: str, fallback_region: Optional[str]) -> List[Dict[str, Any]]:
+    """Price table entries from retail price items (consumption prices in one currency only)"""
+    prices = {}
+    for item in items:
+        if item.get('type', 'Consumption') != 'Consumption' or item.get('currencyCode', currency) != currency:
+            continue
+        if float(item.get('tierMinimumUnits') or 0) > 0:
+            continue
+
+        entry = price_entry(item)
+        if entry is None:
+            continue
+
+        service, sku, tier, monthly = entry
+        region = (item.get('armRegionName') or '').lower()
+        if not region or region == 'global':
+            region = '*'
+        prices[(service, region, sku, tier)] = monthly
+
+    # Region-independent fallback entries for regions missing from the export
+    if fallback_region:
+        for (service, region, sku, tier), monthly in list(prices.items()):
+            if region == fallback_region.lower():
+                prices.setdefault((service, '*', sku, tier), monthly)
+
+    return [
+        {'service': service, 'region': region, 'sku': sku, 'tier': tier, 'monthly': round(monthly, 4)}
+        for (service, region, sku, tier), monthly in sorted(prices.items())
+    ]
+
+
+def iter_sources(paths: List[str]) -> Iterator[Dict[str, Any]]:
+    for path in paths:
+        yield from load_items(path)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('price_sheets', nargs='+', help='Exported Retail Prices API files (.json or .csv)')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='Price table to write (default: pricing/price_table.json)')
+    parser.add_argument('--version', default=datetime.now(timezone.utc).strftime('%Y-%m-%d'),
+                        help='Version label stored in the table (default: today)')
+    parser.add_argument('--currency', default='USD', help='Currency to keep (default: USD)')
+    parser.add_argument('--fallback-region', default='eastus',
+                        help="Region copied to the '*' fallback entries (default: eastus; empty to skip)")
+    args = parser.parse_args()
+
+    prices = build_prices(list(iter_sources(args.price_sheets)), args.currency, args.fallback_region or None)
+    if not prices:
+        raise SystemExit('No disk, snapshot or public IP prices found in the given price sheets')
+
+    table = {
+        'version': args.version,
+        'currency': args.currency,
+        'source': 'Azure Retail Prices export: ' + ', '.join(os.path.basename(path) for path in args.price_sheets),
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+        'prices': prices
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as table_file:
+        json.dump(table, table_file, indent=1)
+        table_file.write('\n')
+
+    print(f"Wrote {len(prices)} prices (version {args.version}) to {args.output}")
+
+
+if __name__ == '__main__':
+    main()